@@ -18,13 +18,12 @@ tracer = trace.get_tracer(__name__)
 span_processor = BatchSpanProcessor(OTLPSpanExporter())
 trace.get_tracer_provider().add_span_processor(span_processor)
 import time
-from uuid import uuid4
-from inspect import signature
 
 from typing import Optional, AsyncGenerator, Dict, Any, List
 from autogen_agentchat.ui import Console
 from autogen_agentchat.agents import CodeExecutorAgent
 from autogen_agentchat.teams import MagenticOneGroupChat
+from autogen_agentchat.conditions import TimeoutTermination
 from autogen_ext.agents.file_surfer import FileSurfer
 from autogen_ext.agents.magentic_one import MagenticOneCoderAgent
 from autogen_ext.agents.web_surfer import MultimodalWebSurfer
@@ -33,7 +32,7 @@ from autogen_ext.code_executors.azure import ACADynamicSessionsCodeExecutor
 from autogen_ext.code_executors.docker import DockerCommandLineCodeExecutor
 
 from autogen_ext.models.ollama import OllamaChatCompletionClient
-from autogen_core import AgentId, AgentProxy, DefaultTopicId
+from autogen_core import DefaultTopicId
 from autogen_core import SingleThreadedAgentRuntime
 from autogen_core import CancellationToken
 
@@ -51,6 +50,7 @@ from ag_mo_code_executor_agent import MagenticOneCodeExecutorAgent
 from ag_mo_web_surfer_agent import MagenticOneWebSurferAgent
 
 from ag_mo_proxy_agent import MagenticOneProxyAgent
+from agent_proxy import wrap_with_proxy
 from ag_mo_orchestrator_agent import MagenticOneOrchestratorAgent
 
 import re
@@ -58,120 +58,15 @@ import uuid
 # Helper function to make a valid Python identifier from a name
 def make_valid_identifier(name: str) -> str:
     return re.sub(r'\W|^(?=\d)', '_', name)
-def _wrap_with_proxy(agent):
-    """
-    Attach a unique AgentId (id/name + key) to every agent so that
-    message.source is never 'unknown'.
+def _orchestrator_client(client):
+    """The client for orchestration calls: queued ahead of the worker agents when it is a wrapped client."""
+    with_priority = getattr(client, "with_priority", None)
+    return with_priority("high") if callable(with_priority) else client
 
-    The signatures of *both* AgentId and AgentProxy vary across
-    autogen‑core releases.  We therefore:
-
-    1.  Build an AgentId using the first signature that works.
-    2.  Inspect AgentProxy.__init__ and create the proxy with
-        the appropriate argument names/positions.
-
-    If the object is already an AgentProxy we simply return it.
-    """
-    if isinstance(agent, AgentProxy):
-        return agent  # already wrapped
-
-    new_key = str(uuid4())
-
-    # ---- Step 1: build a compatible AgentId ---------------------------------
-    agent_id = None
-    for kwargs in (
-        {"name": agent.name, "key": new_key},
-        {"id": agent.name, "key": new_key},
-        {},  # fallback to positional signature tried below
-    ):
-        try:
-            agent_id = AgentId(**kwargs) if kwargs else AgentId(agent.name, new_key)
-            break
-        except TypeError:
-            continue
-
-    if agent_id is None:
-        raise RuntimeError("Unable to construct AgentId with the current autogen‑core version.")
-
-    # ---- Step 2: wrap with AgentProxy ---------------------------------------
-    sig = signature(AgentProxy)  # reflect current signature
-    param_names = list(sig.parameters)
-
-    try:
-        if {"agent_id", "agent"}.issubset(param_names):
-            proxy = AgentProxy(agent_id=agent_id, agent=agent)
-            proxy.name = getattr(agent, "name", str(agent_id))
-            # Expose the underlying agent's produced_message_types so GroupChat can inspect it
-            if not hasattr(proxy, "produced_message_types"):
-                proxy.produced_message_types = getattr(agent, "produced_message_types", [])
-            # --- propagate commonly‑used attributes so GroupChat can inspect them ---
-            for _attr in ("name", "description", "produced_message_types"):
-                if hasattr(agent, _attr) and not hasattr(proxy, _attr):
-                    try:
-                        setattr(proxy, _attr, getattr(agent, _attr))
-                    except Exception:
-                        # silently skip if the proxy implementation forbids setting
-                        pass
-            # --- forward lifecycle / stream handlers the team code expects ---
-            for _method in ("on_reset", "on_messages_stream", "on_message"):
-                if hasattr(agent, _method) and not hasattr(proxy, _method):
-                    try:
-                        setattr(proxy, _method, getattr(agent, _method))
-                    except Exception:
-                        pass
-            proxy._tracer = tracer
-            return proxy
-        elif {"id", "agent"}.issubset(param_names):
-            proxy = AgentProxy(id=agent_id, agent=agent)
-            proxy.name = getattr(agent, "name", str(agent_id))
-            # Expose the underlying agent's produced_message_types so GroupChat can inspect it
-            if not hasattr(proxy, "produced_message_types"):
-                proxy.produced_message_types = getattr(agent, "produced_message_types", [])
-            # --- propagate commonly‑used attributes so GroupChat can inspect them ---
-            for _attr in ("name", "description", "produced_message_types"):
-                if hasattr(agent, _attr) and not hasattr(proxy, _attr):
-                    try:
-                        setattr(proxy, _attr, getattr(agent, _attr))
-                    except Exception:
-                        # silently skip if the proxy implementation forbids setting
-                        pass
-            # --- forward lifecycle / stream handlers the team code expects ---
-            for _method in ("on_reset", "on_messages_stream", "on_message"):
-                if hasattr(agent, _method) and not hasattr(proxy, _method):
-                    try:
-                        setattr(proxy, _method, getattr(agent, _method))
-                    except Exception:
-                        pass
-            proxy._tracer = tracer
-            return proxy
-        elif len(param_names) >= 2:
-            # assume first two positional parameters are (agent_id/id, agent)
-            proxy = AgentProxy(agent_id, agent)
-            proxy.name = getattr(agent, "name", str(agent_id))
-            # Expose the underlying agent's produced_message_types so GroupChat can inspect it
-            if not hasattr(proxy, "produced_message_types"):
-                proxy.produced_message_types = getattr(agent, "produced_message_types", [])
-            # --- propagate commonly‑used attributes so GroupChat can inspect them ---
-            for _attr in ("name", "description", "produced_message_types"):
-                if hasattr(agent, _attr) and not hasattr(proxy, _attr):
-                    try:
-                        setattr(proxy, _attr, getattr(agent, _attr))
-                    except Exception:
-                        # silently skip if the proxy implementation forbids setting
-                        pass
-            # --- forward lifecycle / stream handlers the team code expects ---
-            for _method in ("on_reset", "on_messages_stream", "on_message"):
-                if hasattr(agent, _method) and not hasattr(proxy, _method):
-                    try:
-                        setattr(proxy, _method, getattr(agent, _method))
-                    except Exception:
-                        pass
-            proxy._tracer = tracer
-            return proxy
-    except TypeError:
-        pass
-
-    raise RuntimeError("Unable to construct AgentProxy with the current autogen‑core version.")
+def _agent_client(client, agent_name):
+    """The client for one agent: its calls are charged to the agent in the usage accounts when it is a wrapped client."""
+    with_agent = getattr(client, "with_agent", None)
+    return with_agent(agent_name) if callable(with_agent) else client
 
 def generate_session_name():
     import random
@@ -180,7 +75,7 @@ def generate_session_name():
     return f"{random.choice(adjectives)}-{random.choice(nouns)}-{random.randint(1000,9999)}"
 
 class MagenticOneHelper:
-    def __init__(self, logs_dir: str = None, save_screenshots: bool = False, run_locally: bool = False, user_id: str = None, client: Optional[Any] = None) -> None:
+    def __init__(self, logs_dir: str = None, save_screenshots: bool = False, run_locally: bool = False, user_id: str = None, client: Optional[Any] = None, executor_pool: Optional[Any] = None, template: Optional[Any] = None) -> None:
         self.logs_dir = logs_dir or os.getcwd()
         self.runtime: Optional[SingleThreadedAgentRuntime] = None
         self.save_screenshots = save_screenshots
@@ -191,10 +86,18 @@ class MagenticOneHelper:
         self.provider = None
         self.client = client
         self.max_rounds = 50
-        self.max_time = 25 * 60
+        # wall-clock budget of a run in seconds; the team terminates once it is spent
+        self.max_time = float(os.getenv("RUN_MAX_TIME", 25 * 60))
         self.max_stalls_before_replan = 5
         self.return_final_answer = True
         self.start_page = "https://www.bing.com"
+        self.executors: List[Any] = []
+        # optional ExecutorPool of pre-started containers; executors leased from it are released, not stopped
+        self.executor_pool = executor_pool
+        self.leased_executors: List[Any] = []
+        # optional TeamTemplate (team_cache) holding the parts of the agents shared across sessions
+        self.template = template
+        self.team = None
         if not os.path.exists(self.logs_dir):
             os.makedirs(self.logs_dir)
 
@@ -219,149 +122,197 @@ class MagenticOneHelper:
         except Exception as e:
             raise RuntimeError(f"Agent initialization failed: {e}") from e
 
-    async def setup_agents(self, agents, client, logs_dir):
-        agent_list = []
-        for agent in agents:
-            if agent["type"] == "MagenticOne" and agent["name"] == "Coder":
-                with tracer.start_as_current_span("init_agent_Coder"):
-                    agent_list.append(_wrap_with_proxy(MagenticOneCoderAgent("Coder", model_client=client)))
-            elif agent["type"] == "MagenticOne" and agent["name"] == "Executor":
-                with tracer.start_as_current_span("init_agent_Executor"):
-                    if self.run_locally:
-                        executor = CodeExecutorAgent("Executor", code_executor=await DockerCommandLineCodeExecutor(work_dir=logs_dir).start())
-                    else:
-                        endpoint = os.getenv("POOL_MANAGEMENT_ENDPOINT")
-                        if not endpoint:
-                            executor = CodeExecutorAgent("Executor", code_executor=await DockerCommandLineCodeExecutor(work_dir=logs_dir).start())
-                        else:
-                            executor = CodeExecutorAgent("Executor", code_executor=ACADynamicSessionsCodeExecutor(pool_management_endpoint=endpoint, credential=DefaultAzureCredential(), work_dir=tempfile.mkdtemp()))
-                    agent_list.append(_wrap_with_proxy(executor))
-            elif agent["type"] == "MagenticOne" and agent["name"] == "WebSurfer":
-                with tracer.start_as_current_span("init_agent_WebSurfer"):
-                    # Ensure 'function_calling' key is present in model_info for compatibility
-                    if getattr(client, "model_info", None) is not None:
-                        if "function_calling" not in client.model_info:
-                            client.model_info["function_calling"] = True
-                    agent_list.append(_wrap_with_proxy(MultimodalWebSurfer("WebSurfer", model_client=client)))
-            elif agent["type"] == "MagenticOne" and agent["name"] == "FileSurfer":
-                with tracer.start_as_current_span("init_agent_FileSurfer"):
-                    file_surfer = FileSurfer("FileSurfer", model_client=client)
-                    file_surfer._browser.set_path(os.path.join(os.getcwd(), "data"))
-                    agent_list.append(file_surfer)
-            # --- Insert MCPAgent and RAGAgent blocks here ---
-            elif agent["type"] == "MagenticOne" and agent["name"] == "MCPAgent":
-                with tracer.start_as_current_span(f"init_agent_{agent['name']}"):
-                    model_name = self.model or os.getenv("DEFAULT_MODEL", "llama3")
-                    custom_client = OllamaChatCompletionClient(model=model_name)
-                    custom_agent = await MagenticOneCustomMCPAgent.create(
+    async def _start_docker_executor(self, work_dir):
+        if self.executor_pool is not None:
+            # pooled executors come with their own, empty work dir; close() copies it back into work_dir
+            executor = await self.executor_pool.acquire()
+            self.leased_executors.append((executor, work_dir))
+            return executor
+        executor = DockerCommandLineCodeExecutor(work_dir=work_dir)
+        await executor.start()
+        # tracked so close() can stop the container when the run ends or is cancelled
+        self.executors.append(executor)
+        return executor
+
+    async def close(self) -> None:
+        """Return leased executors to the pool and stop the ones started for this run."""
+        leased, self.leased_executors = self.leased_executors, []
+        for executor, work_dir in leased:
+            await self.executor_pool.release(executor, save_to=work_dir)
+        executors, self.executors = self.executors, []
+        for executor in executors:
+            try:
+                await executor.stop()
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Failed to stop code executor: {e}")
+
+    async def _create_mcp_agent(self, index, agent):
+        model_name = self.model or os.getenv("DEFAULT_MODEL", "llama3")
+        system_message = agent["system_message"] + "\n\n in case of email use this address as TO: " + self.user_id
+        if self.template is None:
+            custom_client = OllamaChatCompletionClient(model=model_name)
+            return await MagenticOneCustomMCPAgent.create(
+                agent["name"],
+                custom_client,
+                system_message,
+                agent["description"],
+                self.user_id
+            )
+        # the model client and the MCP tool adapters are shared by every session of this team
+        custom_client = await self.template.part(index, "model_client", lambda: OllamaChatCompletionClient(model=model_name))
+        adapters = await self.template.part(index, "mcp_adapters", MagenticOneCustomMCPAgent.create_adapters)
+        return MagenticOneCustomMCPAgent(
+            agent["name"],
+            custom_client,
+            system_message,
+            agent["description"],
+            adapters,
+            user_id=self.user_id
+        )
+
+    async def _build_agent(self, index, agent, client, logs_dir):
+        if agent["type"] == "MagenticOne" and agent["name"] == "Coder":
+            return wrap_with_proxy(MagenticOneCoderAgent("Coder", model_client=client), tracer=tracer)
+        elif agent["type"] == "MagenticOne" and agent["name"] == "Executor":
+            if self.run_locally:
+                executor = CodeExecutorAgent("Executor", code_executor=await self._start_docker_executor(logs_dir))
+            else:
+                endpoint = os.getenv("POOL_MANAGEMENT_ENDPOINT")
+                if not endpoint:
+                    executor = CodeExecutorAgent("Executor", code_executor=await self._start_docker_executor(logs_dir))
+                else:
+                    executor = CodeExecutorAgent("Executor", code_executor=ACADynamicSessionsCodeExecutor(pool_management_endpoint=endpoint, credential=DefaultAzureCredential(), work_dir=tempfile.mkdtemp()))
+            return wrap_with_proxy(executor, tracer=tracer)
+        elif agent["type"] == "MagenticOne" and agent["name"] == "WebSurfer":
+            # Ensure 'function_calling' key is present in model_info for compatibility
+            if getattr(client, "model_info", None) is not None:
+                if "function_calling" not in client.model_info:
+                    client.model_info["function_calling"] = True
+            return wrap_with_proxy(MultimodalWebSurfer("WebSurfer", model_client=client), tracer=tracer)
+        elif agent["type"] == "MagenticOne" and agent["name"] == "FileSurfer":
+            file_surfer = FileSurfer("FileSurfer", model_client=client)
+            file_surfer._browser.set_path(os.path.join(os.getcwd(), "data"))
+            return file_surfer
+        # --- Insert MCPAgent and RAGAgent blocks here ---
+        elif agent["type"] == "MagenticOne" and agent["name"] == "MCPAgent":
+            custom_agent = await self._create_mcp_agent(index, agent)
+            return wrap_with_proxy(custom_agent, tracer=tracer)
+        elif agent["type"] == "MagenticOne" and agent["name"] == "RAGAgent":
+            return wrap_with_proxy(MagenticOneRAGAgent(
+                agent["name"],
+                model_client=client,
+                index_name=agent.get("index_name", "default"),
+                description=agent["description"],
+                AZURE_SEARCH_SERVICE_ENDPOINT=os.getenv("AZURE_SEARCH_SERVICE_ENDPOINT")
+            ), tracer=tracer)
+        elif agent["type"] == "Custom":
+            return wrap_with_proxy(MagenticOneCustomAgent(agent["name"], client, agent["system_message"], agent["description"]), tracer=tracer)
+        elif agent["type"] == "CustomMCP":
+            custom_agent = await self._create_mcp_agent(index, agent)
+            print(f'{agent["name"]} (custom MCP) added!')
+            return wrap_with_proxy(custom_agent, tracer=tracer)
+        elif agent["type"] == "RAG":
+            return wrap_with_proxy(MagenticOneRAGAgent(agent["name"], model_client=client, index_name=agent["index_name"], description=agent["description"], AZURE_SEARCH_SERVICE_ENDPOINT=os.getenv("AZURE_SEARCH_SERVICE_ENDPOINT")), tracer=tracer)
+        # --- Custom agent types ---
+        elif agent["type"] == "MagenticOne" and agent["name"] == "CodeExecutor":
+            if self.run_locally:
+                executor_agent = CodeExecutorAgent(
+                    agent["name"],
+                    code_executor=await self._start_docker_executor(logs_dir)
+                )
+            else:
+                endpoint = os.getenv("POOL_MANAGEMENT_ENDPOINT")
+                if not endpoint:
+                    executor_agent = CodeExecutorAgent(
                         agent["name"],
-                        custom_client,
-                        agent["system_message"] + "\n\n in case of email use this address as TO: " + self.user_id,
-                        agent["description"],
-                        self.user_id
+                        code_executor=await self._start_docker_executor(logs_dir)
                     )
-                    agent_list.append(_wrap_with_proxy(custom_agent))
-            elif agent["type"] == "MagenticOne" and agent["name"] == "RAGAgent":
-                with tracer.start_as_current_span(f"init_agent_{agent['name']}"):
-                    agent_list.append(_wrap_with_proxy(MagenticOneRAGAgent(
-                        agent["name"],
-                        model_client=client,
-                        index_name=agent.get("index_name", "default"),
-                        description=agent["description"],
-                        AZURE_SEARCH_SERVICE_ENDPOINT=os.getenv("AZURE_SEARCH_SERVICE_ENDPOINT")
-                    )))
-            elif agent["type"] == "Custom":
-                with tracer.start_as_current_span(f"init_agent_{agent['name']}"):
-                    agent_list.append(_wrap_with_proxy(MagenticOneCustomAgent(agent["name"], client, agent["system_message"], agent["description"])))
-            elif agent["type"] == "CustomMCP":
-                with tracer.start_as_current_span(f"init_agent_{agent['name']}"):
-                    model_name = self.model or os.getenv("DEFAULT_MODEL", "llama3")
-                    custom_client = OllamaChatCompletionClient(model=model_name)
-                    custom_agent = await MagenticOneCustomMCPAgent.create(
+                else:
+                    from azure.identity import DefaultAzureCredential
+                    executor_agent = CodeExecutorAgent(
                         agent["name"],
-                        custom_client,
-                        agent["system_message"] + "\n\n in case of email use this address as TO: " + self.user_id,
-                        agent["description"],
-                        self.user_id
-                    )
-                    agent_list.append(_wrap_with_proxy(custom_agent))
-                    print(f'{agent["name"]} (custom MCP) added!')
-            elif agent["type"] == "RAG":
-                with tracer.start_as_current_span(f"init_agent_{agent['name']}"):
-                    agent_list.append(_wrap_with_proxy(MagenticOneRAGAgent(agent["name"], model_client=client, index_name=agent["index_name"], description=agent["description"], AZURE_SEARCH_SERVICE_ENDPOINT=os.getenv("AZURE_SEARCH_SERVICE_ENDPOINT"))))
-            # --- Custom agent types ---
-            elif agent["type"] == "MagenticOne" and agent["name"] == "CodeExecutor":
-                with tracer.start_as_current_span(f"init_agent_{agent['name']}"):
-                    if self.run_locally:
-                        executor_agent = CodeExecutorAgent(
-                            agent["name"],
-                            code_executor=await DockerCommandLineCodeExecutor(work_dir=logs_dir).start()
+                        code_executor=ACADynamicSessionsCodeExecutor(
+                            pool_management_endpoint=endpoint,
+                            credential=DefaultAzureCredential(),
+                            work_dir=tempfile.mkdtemp()
                         )
-                    else:
-                        endpoint = os.getenv("POOL_MANAGEMENT_ENDPOINT")
-                        if not endpoint:
-                            executor_agent = CodeExecutorAgent(
-                                agent["name"],
-                                code_executor=await DockerCommandLineCodeExecutor(work_dir=logs_dir).start()
-                            )
-                        else:
-                            from azure.identity import DefaultAzureCredential
-                            executor_agent = CodeExecutorAgent(
-                                agent["name"],
-                                code_executor=ACADynamicSessionsCodeExecutor(
-                                    pool_management_endpoint=endpoint,
-                                    credential=DefaultAzureCredential(),
-                                    work_dir=tempfile.mkdtemp()
-                                )
-                            )
-                    agent_list.append(_wrap_with_proxy(executor_agent))
-            elif agent["type"] == "MagenticOne" and agent["name"] == "ProxyAgent":
-                with tracer.start_as_current_span(f"init_agent_{agent['name']}"):
-                    try:
-                        proxy_agent = MagenticOneProxyAgent(name=agent["name"], model_client=client)
-                    except TypeError:
-                        try:
-                            proxy_agent = MagenticOneProxyAgent(agent["name"], client)
-                        except TypeError:
-                            # fallback to minimal arguments if only name is supported
-                            proxy_agent = MagenticOneProxyAgent(agent["name"])
-                    agent_list.append(_wrap_with_proxy(proxy_agent))
-            elif agent["type"] == "MagenticOne" and agent["name"] == "Orchestrator":
-                with tracer.start_as_current_span(f"init_agent_{agent['name']}"):
-                    try:
-                        agent_list.append(_wrap_with_proxy(MagenticOneOrchestratorAgent(
-                            name=agent["name"],
-                            model_client=client,
-                            system_message=agent.get("system_message", ""),
-                            description=agent.get("description", "")
-                        )))
-                    except TypeError:
-                        # fallback to minimal arguments but always provide model_client if supported
-                        try:
-                            agent_list.append(_wrap_with_proxy(MagenticOneOrchestratorAgent(agent["name"], model_client=client)))
-                        except TypeError:
-                            agent_list.append(_wrap_with_proxy(MagenticOneOrchestratorAgent(agent["name"])))
-            elif agent["type"] == "UserProxyAgent":
-                with tracer.start_as_current_span(f"init_agent_{agent['name']}"):
-                    from autogen_agentchat.agents import UserProxyAgent
+                    )
+            return wrap_with_proxy(executor_agent, tracer=tracer)
+        elif agent["type"] == "MagenticOne" and agent["name"] == "ProxyAgent":
+            try:
+                proxy_agent = MagenticOneProxyAgent(name=agent["name"], model_client=client)
+            except TypeError:
+                try:
+                    proxy_agent = MagenticOneProxyAgent(agent["name"], client)
+                except TypeError:
+                    # fallback to minimal arguments if only name is supported
+                    proxy_agent = MagenticOneProxyAgent(agent["name"])
+            return wrap_with_proxy(proxy_agent, tracer=tracer)
+        elif agent["type"] == "MagenticOne" and agent["name"] == "Orchestrator":
+            try:
+                return wrap_with_proxy(MagenticOneOrchestratorAgent(
+                    name=agent["name"],
+                    model_client=_orchestrator_client(client),
+                    system_message=agent.get("system_message", ""),
+                    description=agent.get("description", "")
+                ), tracer=tracer)
+            except TypeError:
+                # fallback to minimal arguments but always provide model_client if supported
+                try:
+                    return wrap_with_proxy(MagenticOneOrchestratorAgent(agent["name"], model_client=_orchestrator_client(client)), tracer=tracer)
+                except TypeError:
+                    return wrap_with_proxy(MagenticOneOrchestratorAgent(agent["name"]), tracer=tracer)
+        elif agent["type"] == "UserProxyAgent":
+            from autogen_agentchat.agents import UserProxyAgent
+            try:
+                user_agent = UserProxyAgent(name=agent["name"], model_client=client)
+            except TypeError:
+                try:
+                    user_agent = UserProxyAgent(agent["name"], client)
+                except TypeError:
                     try:
-                        user_agent = UserProxyAgent(name=agent["name"], model_client=client)
+                        user_agent = UserProxyAgent(name=agent["name"])
                     except TypeError:
-                        try:
-                            user_agent = UserProxyAgent(agent["name"], client)
-                        except TypeError:
-                            try:
-                                user_agent = UserProxyAgent(name=agent["name"])
-                            except TypeError:
-                                user_agent = UserProxyAgent()
-                                user_agent.name = agent["name"]
-                    agent_list.append(_wrap_with_proxy(user_agent))
-            else:
-                raise ValueError("Unknown Agent!")
-        return agent_list
+                        user_agent = UserProxyAgent()
+                        user_agent.name = agent["name"]
+            return wrap_with_proxy(user_agent, tracer=tracer)
+        else:
+            raise ValueError("Unknown Agent!")
+
+    async def _init_agent(self, index, agent, client, logs_dir):
+        with tracer.start_as_current_span(f"init_agent_{agent['name']}") as span:
+            started = time.perf_counter()
+            try:
+                return await self._build_agent(index, agent, _agent_client(client, agent["name"]), logs_dir)
+            except Exception as e:
+                span.record_exception(e)
+                raise
+            finally:
+                span.set_attribute("agent.init_seconds", time.perf_counter() - started)
+
+    async def setup_agents(self, agents, client, logs_dir):
+        """
+        Build all agents concurrently (executor starts, MCP handshakes and the like are
+        independent I/O) and return them in the configured order. Every failure is
+        collected and reported together.
+        """
+        results = await asyncio.gather(
+            *(self._init_agent(index, agent, client, logs_dir) for index, agent in enumerate(agents)),
+            return_exceptions=True
+        )
+        failures = [
+            f"{agent.get('name', '?')}: {result}"
+            for agent, result in zip(agents, results)
+            if isinstance(result, BaseException)
+        ]
+        if failures:
+            # executors of the agents that did start are released by close()
+            raise RuntimeError("; ".join(failures))
+        return list(results)
 
     def main(self, task):
-        team = MagenticOneGroupChat(participants=self.agents, model_client=self.client, max_turns=self.max_rounds, max_stalls=self.max_stalls_before_replan, emit_team_events=False)
+        termination = TimeoutTermination(self.max_time) if self.max_time else None
+        team = MagenticOneGroupChat(participants=self.agents, model_client=_orchestrator_client(_agent_client(self.client, "MagenticOneOrchestrator")), termination_condition=termination, max_turns=self.max_rounds, max_stalls=self.max_stalls_before_replan, emit_team_events=False)
         self.team = team
         cancellation_token = CancellationToken()
         with tracer.start_as_current_span("team_execution"):
@@ -379,6 +330,7 @@ async def main(agents, task, run_locally, provider_name, model) -> None:
         print(f"Error: {e}")
     finally:
         await team.shutdown()
+        await helper.close()
 
 if __name__ == "__main__":
     import argparse
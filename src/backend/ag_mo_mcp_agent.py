@@ -86,6 +86,23 @@ class MagenticOneCustomMCPAgent(AssistantAgent):
                 raise RuntimeError("The configured model does not support function calling required for tools.")
 
         logger.info("Creating MagenticOneCustomMCPAgent...")
+        adapters = await cls.create_adapters()
+
+        return cls(
+            name,
+            model_client,
+            system_message,
+            description,
+            adapters,
+            user_id=user_id
+        )
+
+    @classmethod
+    async def create_adapters(cls):
+        """
+        Connect to the MCP server and build the tool adapters. The adapters hold no
+        per-session state, so one set can back many agents (see team_cache).
+        """
         logger.debug(f"MCP_SERVER_URI: {os.environ.get('MCP_SERVER_URI')}")
         logger.debug(f"MCP_SERVER_API_KEY: {os.environ.get('MCP_SERVER_API_KEY')}")
 
@@ -132,15 +149,4 @@ class MagenticOneCustomMCPAgent(AssistantAgent):
         logger.debug(f"  Data List Tables Adapter: {adapter_data_list_tables}")
         logger.debug(f"  Mailer Adapter: {adapter_mailer}")
         logger.debug(f"Server mode used: {server_mode}")
-
-        from autogen_core.model_context import BufferedChatCompletionContext
-        model_context = BufferedChatCompletionContext(buffer_size=5)
-
-        return cls(
-            name,
-            model_client,
-            system_message,
-            description,
-            [adapter_data_provider, adapter_data_list_tables, adapter_mailer],
-            user_id=user_id
-        )
+        return [adapter_data_provider, adapter_data_list_tables, adapter_mailer]
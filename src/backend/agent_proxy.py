@@ -0,0 +1,85 @@
+# File: agent_proxy.py
+"""
+Wrapping agents in an AgentProxy with a unique AgentId.
+
+The signatures of *both* AgentId and AgentProxy vary across autogen-core
+releases. The compatible way to construct each is resolved once, at import
+time, into a factory. ``ForwardingAgentProxy`` forwards every attribute the
+proxy does not define itself (name, description, produced_message_types,
+on_messages_stream, on_reset, ...) to the wrapped agent on access, instead of
+copying attributes one by one for every agent of every session.
+"""
+
+from inspect import signature
+from typing import Any, Callable, Optional
+from uuid import uuid4
+
+from autogen_core import AgentId, AgentProxy
+
+
+class ForwardingAgentProxy(AgentProxy):
+    """AgentProxy that falls back to the wrapped agent for attributes it does not have."""
+
+    _tracer = None
+
+    def __getattr__(self, name: str) -> Any:
+        # only reached when normal lookup fails; guard against recursion before _wrapped is set
+        if name == "_wrapped":
+            raise AttributeError(name)
+        try:
+            return getattr(self._wrapped, name)
+        except AttributeError:
+            if name == "produced_message_types":
+                # GroupChat inspects it on every participant
+                return []
+            raise
+
+    @property
+    def wrapped_agent(self) -> Any:
+        return self._wrapped
+
+
+def _resolve_agent_id_factory() -> Callable[[str, str], AgentId]:
+    candidates = (
+        lambda name, key: AgentId(name=name, key=key),
+        lambda name, key: AgentId(id=name, key=key),
+        lambda name, key: AgentId(name, key),
+    )
+    for factory in candidates:
+        try:
+            factory("probe", "probe")
+            return factory
+        except TypeError:
+            continue
+    raise RuntimeError("Unable to construct AgentId with the current autogen‑core version.")
+
+
+def _resolve_proxy_factory() -> Callable[[AgentId, Any], AgentProxy]:
+    param_names = list(signature(AgentProxy).parameters)
+    if {"agent_id", "agent"}.issubset(param_names):
+        return lambda agent_id, agent: ForwardingAgentProxy(agent_id=agent_id, agent=agent)
+    if {"id", "agent"}.issubset(param_names):
+        return lambda agent_id, agent: ForwardingAgentProxy(id=agent_id, agent=agent)
+    if len(param_names) >= 2:
+        # assume first two positional parameters are (agent_id/id, agent)
+        return lambda agent_id, agent: ForwardingAgentProxy(agent_id, agent)
+    raise RuntimeError("Unable to construct AgentProxy with the current autogen‑core version.")
+
+
+make_agent_id = _resolve_agent_id_factory()
+make_proxy = _resolve_proxy_factory()
+
+
+def wrap_with_proxy(agent: Any, tracer: Optional[Any] = None) -> AgentProxy:
+    """
+    Attach a unique AgentId (name + key) to an agent so that message.source is
+    never 'unknown'. Agents that already are an AgentProxy are returned as is.
+    """
+    if isinstance(agent, AgentProxy):
+        return agent  # already wrapped
+    proxy = make_proxy(make_agent_id(agent.name, str(uuid4())), agent)
+    # AgentProxy keeps the AgentId in its own attributes; the agent goes next to it
+    object.__setattr__(proxy, "_wrapped", agent)
+    if tracer is not None:
+        proxy._tracer = tracer
+    return proxy
@@ -0,0 +1,99 @@
+# File: benchmarks/bench_agent_proxy.py
+"""
+Microbenchmark: wrapping agents in AgentProxy.
+
+Compares the per-call strategy ``_wrap_with_proxy`` used before (probe the AgentId
+signatures with try/except, ``inspect.signature(AgentProxy)`` and copy attributes
+onto the proxy on every call) with ``agent_proxy.wrap_with_proxy`` (strategy
+resolved once at import, attributes forwarded lazily).
+
+    python benchmarks/bench_agent_proxy.py --agents 9 --sessions 2000
+"""
+
+import os
+import sys
+import time
+import argparse
+from inspect import signature
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autogen_core import AgentId, AgentProxy
+
+from agent_proxy import wrap_with_proxy
+
+
+class _Agent:
+    def __init__(self, name):
+        self.name = name
+        self.description = f"{name} agent"
+        self.produced_message_types = []
+
+    async def on_messages_stream(self, messages, cancellation_token):
+        yield None
+
+    async def on_reset(self, cancellation_token):
+        pass
+
+
+def legacy_wrap_with_proxy(agent):
+    """The previous implementation, condensed: same probing and copying per call."""
+    if isinstance(agent, AgentProxy):
+        return agent
+    new_key = str(uuid4())
+    agent_id = None
+    for kwargs in ({"name": agent.name, "key": new_key}, {"id": agent.name, "key": new_key}, {}):
+        try:
+            agent_id = AgentId(**kwargs) if kwargs else AgentId(agent.name, new_key)
+            break
+        except TypeError:
+            continue
+    param_names = list(signature(AgentProxy).parameters)
+    if {"agent_id", "agent"}.issubset(param_names):
+        proxy = AgentProxy(agent_id=agent_id, agent=agent)
+    elif {"id", "agent"}.issubset(param_names):
+        proxy = AgentProxy(id=agent_id, agent=agent)
+    else:
+        proxy = AgentProxy(agent_id, agent)
+    proxy.name = getattr(agent, "name", str(agent_id))
+    if not hasattr(proxy, "produced_message_types"):
+        proxy.produced_message_types = getattr(agent, "produced_message_types", [])
+    for _attr in ("name", "description", "produced_message_types"):
+        if hasattr(agent, _attr) and not hasattr(proxy, _attr):
+            setattr(proxy, _attr, getattr(agent, _attr))
+    for _method in ("on_reset", "on_messages_stream", "on_message"):
+        if hasattr(agent, _method) and not hasattr(proxy, _method):
+            setattr(proxy, _method, getattr(agent, _method))
+    proxy._tracer = None
+    return proxy
+
+
+def bench(wrap, agents: int, sessions: int) -> float:
+    names = [f"Agent{i}" for i in range(agents)]
+    started = time.perf_counter()
+    for _ in range(sessions):
+        for name in names:
+            proxy = wrap(_Agent(name))
+            # what GroupChat reads from every participant
+            proxy.name, proxy.description, proxy.produced_message_types
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--agents", type=int, default=9, help="agents per team")
+    parser.add_argument("--sessions", type=int, default=2000, help="teams to build")
+    args = parser.parse_args()
+
+    # warm up both paths
+    bench(legacy_wrap_with_proxy, args.agents, 10)
+    bench(wrap_with_proxy, args.agents, 10)
+
+    total = args.agents * args.sessions
+    legacy = bench(legacy_wrap_with_proxy, args.agents, args.sessions)
+    cached = bench(wrap_with_proxy, args.agents, args.sessions)
+    print(f"{total} agents wrapped")
+    print(f"legacy  : {legacy * 1e6 / total:8.2f} us/agent  {legacy * 1e3 / args.sessions:8.3f} ms/team")
+    print(f"cached  : {cached * 1e6 / total:8.2f} us/agent  {cached * 1e3 / args.sessions:8.3f} ms/team")
+    print(f"speedup : {legacy / cached:8.2f}x")
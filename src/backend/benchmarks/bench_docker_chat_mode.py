@@ -0,0 +1,86 @@
+# File: benchmarks/bench_docker_chat_mode.py
+"""
+Benchmark: DockerProvider chat-completions mode vs the flattened-prompt path.
+
+Replays a growing multi-turn conversation behind a long, fixed system prompt
+against a running llama.cpp server (Docker Model Runner), once per mode, and
+reports the latency of each turn and how many prompt tokens the server had to
+evaluate. llama.cpp reports that count in ``timings.prompt_n``, next to the
+tokens it reused from its KV cache (``timings.cache_n``). With a stable prefix
+the evaluated count stays near the size of the newest message.
+
+    python benchmarks/bench_docker_chat_mode.py --model ai/smollm2 --turns 8
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autogen_core.models import AssistantMessage, SystemMessage, UserMessage
+
+from providers.docker_provider import DockerProvider
+from providers.http_pool import http_clients
+
+SYSTEM_PROMPT = (
+    "You are the orchestrator of a team of agents. Break the task into steps, "
+    "pick the agent best suited for each step and keep track of progress. "
+) * 40
+
+
+async def run_mode(mode: str, args) -> dict:
+    provider = DockerProvider(base_url=args.base_url, default_model=args.model, api_mode=mode, cache_prompt=not args.no_cache_prompt)
+    messages = [SystemMessage(content=SYSTEM_PROMPT)]
+    latencies, evaluated, cached = [], [], []
+    for turn in range(args.turns):
+        messages.append(UserMessage(content=f"Step {turn}: summarize what the team should do next.", source="user"))
+        url, body = provider.build_request(messages, max_tokens=args.max_tokens, temperature=0)
+        client = http_clients.client_for(url)
+        started = time.perf_counter()
+        res = await client.post(url, content=body, headers={"Content-Type": "application/json"})
+        latencies.append(time.perf_counter() - started)
+        res.raise_for_status()
+        data = res.json()
+        timings = data.get("timings") or {}
+        evaluated.append(timings.get("prompt_n", (data.get("usage") or {}).get("prompt_tokens", 0)))
+        cached.append(timings.get("cache_n", 0))
+        choice = data["choices"][0]
+        reply = (choice.get("message") or {}).get("content") or choice.get("text") or ""
+        messages.append(AssistantMessage(content=reply.strip(), source="orchestrator"))
+    return {"latencies": latencies, "evaluated": evaluated, "cached": cached}
+
+
+def report(mode: str, result: dict):
+    latencies = result["latencies"]
+    # the first turn fills the cache in both modes
+    warm = latencies[1:] or latencies
+    print(f"{mode:12s} first {latencies[0] * 1e3:8.1f} ms  warm mean {statistics.mean(warm) * 1e3:8.1f} ms"
+          f"  prompt tokens evaluated/turn {statistics.mean(result['evaluated']):8.1f}"
+          f"  reused/turn {statistics.mean(result['cached']):8.1f}")
+
+
+async def main(args):
+    try:
+        results = {}
+        for mode in ("completions", "chat"):
+            results[mode] = await run_mode(mode, args)
+            report(mode, results[mode])
+        legacy = statistics.mean(results["completions"]["latencies"][1:] or results["completions"]["latencies"])
+        chat = statistics.mean(results["chat"]["latencies"][1:] or results["chat"]["latencies"])
+        print(f"warm speedup {legacy / chat:6.2f}x")
+    finally:
+        await http_clients.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://localhost:12434/engines/llama.cpp/v1")
+    parser.add_argument("--model", required=True, help="model served by the runner, e.g. ai/smollm2")
+    parser.add_argument("--turns", type=int, default=8)
+    parser.add_argument("--max-tokens", type=int, default=64)
+    parser.add_argument("--no-cache-prompt", action="store_true", help="do not send cache_prompt in either mode")
+    asyncio.run(main(parser.parse_args()))
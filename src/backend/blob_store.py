@@ -0,0 +1,183 @@
+# File: blob_store.py
+"""
+Content-addressed storage for images found in agent messages.
+
+Screenshots (MultiModalMessage) and Executor base64 PNGs used to travel inline
+as data URIs into the conversation file, the Mongo document and every SSE
+frame. They are now stored once, keyed by the SHA-256 of their bytes, and
+messages carry only a ``/blobs/<sha256>`` reference served by the API.
+
+BLOB_STORE selects the backend: "local" (default, files under BLOB_DIR) or
+"gridfs" (the MongoDB database used by the API).
+"""
+
+import os
+import re
+import ast
+import base64
+import asyncio
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BLOB_STORE = os.getenv("BLOB_STORE", "local").lower()
+BLOB_DIR = os.getenv("BLOB_DIR", "./data/blobs")
+BLOB_URL_PREFIX = "/blobs/"
+
+_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+_DATA_URI_RE = re.compile(r"^data:(?P<mime>[\w.+-]+/[\w.+-]+)?(?:;[^,]*)?;base64,(?P<data>.*)$", re.DOTALL)
+_EXECUTOR_IMAGE_RE = re.compile(r"\{[^{}]*'type': 'image'[^{}]*'base64_data':[^{}]*\}")
+
+
+def is_blob_hash(value: str) -> bool:
+    return bool(_HASH_RE.match(value or ""))
+
+
+def sniff_content_type(data: bytes) -> str:
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def extract_executor_image(content: str) -> Tuple[str, Optional[str]]:
+    """
+    Split an Executor result containing a ``{'type': 'image', 'format': 'png', 'base64_data': ...}``
+    dict into (text without the dict, PNG data URI). Returns (content, None) if there is no image.
+    """
+    try:
+        if isinstance(content, str) and "'type': 'image'" in content and "'base64_data':" in content:
+            match = _EXECUTOR_IMAGE_RE.search(content)
+            if match:
+                img_dict_str = match.group(0)
+                img_dict = ast.literal_eval(img_dict_str)
+                if (
+                    isinstance(img_dict, dict)
+                    and img_dict.get('type') == 'image'
+                    and img_dict.get('format') == 'png'
+                    and 'base64_data' in img_dict
+                ):
+                    return content.replace(img_dict_str, "").strip(), f"data:image/png;base64,{img_dict['base64_data']}"
+    except Exception:
+        pass
+    return content, None
+
+
+class BlobStore(ABC):
+    """Base class: subclasses implement _exists/_write/_read."""
+
+    @abstractmethod
+    async def _exists(self, blob_hash: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def _write(self, blob_hash: str, data: bytes, content_type: str):
+        ...
+
+    @abstractmethod
+    async def _read(self, blob_hash: str) -> Optional[Tuple[bytes, str]]:
+        ...
+
+    async def put(self, data: bytes, content_type: Optional[str] = None) -> str:
+        blob_hash = hashlib.sha256(data).hexdigest()
+        if not await self._exists(blob_hash):
+            await self._write(blob_hash, data, content_type or sniff_content_type(data))
+        return blob_hash
+
+    async def get(self, blob_hash: str) -> Optional[Tuple[bytes, str]]:
+        if not is_blob_hash(blob_hash):
+            return None
+        return await self._read(blob_hash)
+
+    async def offload(self, value: Optional[str]) -> Optional[str]:
+        """Replace a base64 data URI with a ``/blobs/<sha256>`` reference; other values pass through."""
+        if not value or not value.startswith("data:"):
+            return value
+        match = _DATA_URI_RE.match(value)
+        if not match:
+            return value
+        try:
+            data = base64.b64decode(match.group("data"), validate=False)
+        except (ValueError, TypeError):
+            return value
+        try:
+            blob_hash = await self.put(data, match.group("mime"))
+        except Exception as e:
+            # never lose the image because the blob backend is unavailable
+            logger.error(f"Failed to offload blob: {e}")
+            return value
+        return f"{BLOB_URL_PREFIX}{blob_hash}"
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs as files under ``root/<first two hex chars>/<sha256>``; the content type is sniffed on read."""
+
+    def __init__(self, root: str = BLOB_DIR):
+        self.root = root
+
+    def _path(self, blob_hash: str) -> str:
+        return os.path.join(self.root, blob_hash[:2], blob_hash)
+
+    async def _exists(self, blob_hash: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self._path(blob_hash))
+
+    def _write_sync(self, blob_hash: str, data: bytes):
+        path = self._path(blob_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    async def _write(self, blob_hash: str, data: bytes, content_type: str):
+        await asyncio.to_thread(self._write_sync, blob_hash, data)
+
+    def _read_sync(self, blob_hash: str) -> Optional[Tuple[bytes, str]]:
+        path = self._path(blob_hash)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            data = f.read()
+        return data, sniff_content_type(data)
+
+    async def _read(self, blob_hash: str) -> Optional[Tuple[bytes, str]]:
+        return await asyncio.to_thread(self._read_sync, blob_hash)
+
+
+class GridFSBlobStore(BlobStore):
+    """Blobs in a GridFS bucket of the API's MongoDB database, stored under their hash as filename."""
+
+    def __init__(self, database, bucket_name: str = "DyoPods_blobs"):
+        from gridfs import AsyncGridFSBucket
+        self.bucket = AsyncGridFSBucket(database, bucket_name=bucket_name)
+
+    async def _exists(self, blob_hash: str) -> bool:
+        return bool(await self.bucket.find({"filename": blob_hash}).limit(1).to_list(length=1))
+
+    async def _write(self, blob_hash: str, data: bytes, content_type: str):
+        await self.bucket.upload_from_stream(blob_hash, data, metadata={"content_type": content_type})
+
+    async def _read(self, blob_hash: str) -> Optional[Tuple[bytes, str]]:
+        files = await self.bucket.find({"filename": blob_hash}).limit(1).to_list(length=1)
+        if not files:
+            return None
+        stream = await self.bucket.open_download_stream(files[0]._id)
+        data = await stream.read()
+        content_type = (files[0].metadata or {}).get("content_type") or sniff_content_type(data)
+        return data, content_type
+
+
+def create_blob_store(db=None, backend: str = BLOB_STORE) -> BlobStore:
+    if backend == "gridfs":
+        if db is None:
+            raise ValueError("GridFS blob store requires a MongoDB database.")
+        return GridFSBlobStore(db.database)
+    return LocalBlobStore()
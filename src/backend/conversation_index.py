@@ -0,0 +1,262 @@
+# File: conversation_index.py
+"""
+Persistent sidecar index over the conversation store.
+
+Keeps one small entry per conversation (user_id, session_id, timestamp,
+message_count, byte_offset) so listings and pagination never open the
+conversation files themselves. The index is kept up to date incrementally by
+``crud`` and persisted as an append-only ``_index.jsonl`` op log next to the
+conversations. On startup the op log is replayed and reconciled with the files
+on disk: a file whose size matches the recorded ``byte_offset`` is trusted,
+a larger one is scanned only from that offset, anything else (including a file
+replaced by compaction, detected through its inode) is rescanned.
+"""
+
+import os
+import json
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from conversation_store import JsonlConversationStore, LEGACY_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "_index.jsonl"
+ENTRY_FIELDS = ("user_id", "session_id", "timestamp", "message_count", "byte_offset", "path", "inode")
+
+
+class ConversationIndex:
+    def __init__(self, store: JsonlConversationStore):
+        self.store = store
+        self.entries: Dict[Tuple[str, str], dict] = {}
+        self._by_path: Dict[str, Tuple[str, str]] = {}
+        # keys newest first; entries are looked up in self.entries, so replacing one keeps it valid
+        self._sorted: Optional[List[Tuple[str, str]]] = None
+        self._ops_since_compaction = 0
+        self._handle = None
+        self._lock = threading.RLock()
+        self.loaded = False
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.store.ensure_data_dir(), INDEX_FILENAME)
+
+    # ---- persistence ---------------------------------------------------------
+    def _log(self, op: dict):
+        if self._handle is None:
+            self._handle = open(self.index_path, "a", encoding="utf-8")
+        # no fsync: the index is always recoverable from the conversation files
+        self._handle.write(json.dumps(op, separators=(",", ":")) + "\n")
+        self._handle.flush()
+        self._ops_since_compaction += 1
+        if self._ops_since_compaction > max(1024, 4 * len(self.entries)):
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the op log as one ``put`` per live entry."""
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self.entries.values():
+                f.write(json.dumps({"op": "put", **entry}, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, self.index_path)
+        self._ops_since_compaction = 0
+
+    def _replay(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                key = (op.get("user_id"), op.get("session_id"))
+                if op.get("op") == "put":
+                    self._set({k: op.get(k) for k in ENTRY_FIELDS})
+                elif op.get("op") == "del":
+                    self._drop(key)
+
+    # ---- in-memory bookkeeping ----------------------------------------------
+    def _set(self, entry: dict):
+        key = (entry["user_id"], entry["session_id"])
+        previous = self.entries.get(key)
+        if previous is None or previous.get("timestamp") != entry.get("timestamp"):
+            self._sorted = None
+        if previous is not None and previous.get("path") != entry.get("path"):
+            self._by_path.pop(previous.get("path"), None)
+        self.entries[key] = entry
+        self._by_path[entry["path"]] = key
+
+    def _drop(self, key: Tuple[str, str]):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self._by_path.pop(entry.get("path"), None)
+            self._sorted = None
+
+    # ---- scanning ------------------------------------------------------------
+    def _scan(self, path: str, entry: Optional[dict] = None) -> Optional[dict]:
+        """Build or extend an entry by reading ``path`` from the recorded offset."""
+        stat = os.stat(path)
+        size = stat.st_size
+        if path.endswith(LEGACY_SUFFIX):
+            conversation = self.store.read_path(path)
+            if conversation is None:
+                return None
+            return {
+                "user_id": conversation.get("user_id"),
+                "session_id": conversation.get("session_id"),
+                "timestamp": conversation.get("timestamp"),
+                "message_count": len(conversation.get("messages") or []),
+                "byte_offset": size,
+                "path": path,
+                "inode": stat.st_ino,
+            }
+        if (
+            entry is not None
+            and entry.get("path") == path
+            and entry.get("inode") == stat.st_ino
+            and entry.get("byte_offset", 0) <= size
+        ):
+            entry = dict(entry)
+            offset = entry["byte_offset"]
+        else:
+            entry = {"user_id": None, "session_id": None, "timestamp": None, "message_count": 0, "path": path, "inode": stat.st_ino}
+            offset = 0
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                offset += len(raw)
+                try:
+                    record = json.loads(raw)
+                except json.JSONDecodeError:
+                    continue
+                kind = record.get("kind")
+                if kind == "header":
+                    entry.update(user_id=record.get("user_id"), session_id=record.get("session_id"), timestamp=record.get("timestamp"))
+                elif kind == "snapshot":
+                    conversation = record.get("conversation") or {}
+                    entry.update(
+                        user_id=conversation.get("user_id"),
+                        session_id=conversation.get("session_id"),
+                        timestamp=conversation.get("timestamp"),
+                        message_count=len(conversation.get("messages") or []),
+                    )
+                elif kind == "message":
+                    entry["message_count"] += 1
+        entry["byte_offset"] = offset
+        if entry["user_id"] is None or entry["session_id"] is None:
+            return None
+        return entry
+
+    def load(self):
+        """Replay the persisted index and reconcile it with the files on disk."""
+        with self._lock:
+            self.entries.clear()
+            self._by_path.clear()
+            self._sorted = None
+            self._replay()
+            known = dict(self._by_path)
+            on_disk = set(self.store.paths())
+            for path in on_disk:
+                key = known.get(path)
+                entry = self.entries.get(key) if key else None
+                try:
+                    stat = os.stat(path)
+                    if entry is not None and entry.get("byte_offset") == stat.st_size and entry.get("inode") == stat.st_ino:
+                        continue
+                    scanned = self._scan(path, entry)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Failed to index conversation {path}: {e}")
+                    continue
+                if scanned is not None:
+                    self._set(scanned)
+            for path, key in known.items():
+                if path not in on_disk:
+                    self._drop(key)
+            self._compact()
+            self.loaded = True
+            logger.info(f"Conversation index loaded with {len(self.entries)} entries.")
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    # ---- incremental updates -------------------------------------------------
+    def record_append(self, header: dict, appended: int):
+        """Account for ``appended`` messages just written to a conversation."""
+        with self._lock:
+            if not self.loaded:
+                # the first load already sees the write
+                self.load()
+                return
+            user_id, session_id = header["user_id"], header["session_id"]
+            path = self.store.path_for(user_id, session_id)
+            entry = self.entries.get((user_id, session_id))
+            stat = os.stat(path)
+            if entry is None or entry.get("path") != path or entry.get("inode") != stat.st_ino:
+                entry = self._scan(path)
+                if entry is None:
+                    return
+            else:
+                entry = dict(entry)
+                entry["message_count"] += appended
+                entry["byte_offset"] = stat.st_size
+            self._set(entry)
+            self._log({"op": "put", **entry})
+
+    def record_delete(self, user_id: str, session_id: str):
+        with self._lock:
+            self._ensure_loaded()
+            self._drop((user_id, session_id))
+            self._log({"op": "del", "user_id": user_id, "session_id": session_id})
+
+    def close(self):
+        with self._lock:
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+
+    # ---- queries -------------------------------------------------------------
+    def _ordered(self) -> List[dict]:
+        if self._sorted is None:
+            self._sorted = sorted(self.entries, key=lambda k: str(self.entries[k].get("timestamp") or ""), reverse=True)
+        return [self.entries[key] for key in self._sorted]
+
+    def get(self, user_id: str, session_id: str) -> Optional[dict]:
+        with self._lock:
+            self._ensure_loaded()
+            return self.entries.get((user_id, session_id))
+
+    def paths(self, user_id: Optional[str] = None) -> List[str]:
+        with self._lock:
+            self._ensure_loaded()
+            return [e["path"] for e in self._ordered() if user_id is None or e["user_id"] == user_id]
+
+    def page(self, user_id: Optional[str] = None, page: int = 1, page_size: int = 20) -> Tuple[List[dict], Dict]:
+        """Entries of one page, newest first, and the page numbers."""
+        with self._lock:
+            self._ensure_loaded()
+            items = self._ordered()
+            if user_id is not None:
+                items = [e for e in items if e["user_id"] == user_id]
+        total_count = len(items)
+        total_pages = (total_count + page_size - 1) // page_size if total_count > 0 else 1
+        page = max(1, min(page, total_pages))
+        skip = (page - 1) * page_size
+        return items[skip:skip + page_size], {"total_count": total_count, "page": page, "total_pages": total_pages}
+
+    def list(self, user_id: Optional[str] = None, page: int = 1, page_size: int = 20) -> Dict:
+        entries, pages = self.page(user_id=user_id, page=page, page_size=page_size)
+        return {
+            "conversations": [
+                {k: e.get(k) for k in ("user_id", "session_id", "timestamp", "message_count")}
+                for e in entries
+            ],
+            **pages,
+        }
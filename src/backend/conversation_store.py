@@ -0,0 +1,321 @@
+# File: conversation_store.py
+"""
+Append-only JSONL storage engine for conversations.
+
+Every conversation lives in ``{user_id}_{session_id}.jsonl``. The first record
+is a small header, each following record is a single message, so saving a
+message is one appended line instead of a read-modify-write of the whole file.
+The ``crud.get_conversation`` shape is rebuilt lazily when the file is read.
+
+Record kinds:
+    {"kind": "header", "id": ..., "user_id": ..., "session_id": ..., "agents": ..., ...}
+    {"kind": "message", "message": {...}}
+    {"kind": "snapshot", "conversation": {...}}   # written by compaction
+
+fsync is batched: a file is synced every ``CONVERSATION_FSYNC_BATCH`` records or
+``CONVERSATION_FSYNC_INTERVAL`` seconds, whichever comes first, and on shutdown.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JSONL_SUFFIX = ".jsonl"
+LEGACY_SUFFIX = ".json"
+
+FSYNC_BATCH = int(os.getenv("CONVERSATION_FSYNC_BATCH", "32"))
+FSYNC_INTERVAL = float(os.getenv("CONVERSATION_FSYNC_INTERVAL", "1.0"))
+MAX_OPEN_FILES = int(os.getenv("CONVERSATION_MAX_OPEN_FILES", "64"))
+
+HEADER_FIELDS = ("id", "user_id", "session_id", "agents", "run_mode_locally", "timestamp", "team_id")
+
+
+def _dumps(record: dict) -> str:
+    return json.dumps(record, separators=(",", ":"), default=str) + "\n"
+
+
+class _OpenLog:
+    """An append handle plus its fsync bookkeeping."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.handle = open(path, "a", encoding="utf-8")
+        if self.handle.tell() > 0:
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # terminate a torn record so the next append starts on a fresh line
+                    self.handle.write("\n")
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def sync(self):
+        self.handle.flush()
+        if self.unsynced:
+            os.fsync(self.handle.fileno())
+            self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        try:
+            self.sync()
+        finally:
+            self.handle.close()
+
+
+class JsonlConversationStore:
+    """Append-only conversation store rooted at ``data_dir``."""
+
+    def __init__(self, data_dir: str, fsync_batch: int = FSYNC_BATCH, fsync_interval: float = FSYNC_INTERVAL, max_open_files: int = MAX_OPEN_FILES):
+        self.data_dir = data_dir
+        self.fsync_batch = max(1, fsync_batch)
+        self.fsync_interval = fsync_interval
+        self.max_open_files = max(1, max_open_files)
+        self._open: "OrderedDict[str, _OpenLog]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    # ---- paths ---------------------------------------------------------------
+    def ensure_data_dir(self) -> str:
+        os.makedirs(self.data_dir, exist_ok=True)
+        return self.data_dir
+
+    def path_for(self, user_id: str, session_id: str) -> str:
+        return os.path.join(self.ensure_data_dir(), f"{user_id}_{session_id}{JSONL_SUFFIX}")
+
+    def legacy_path_for(self, user_id: str, session_id: str) -> str:
+        return os.path.join(self.ensure_data_dir(), f"{user_id}_{session_id}{LEGACY_SUFFIX}")
+
+    # ---- writing -------------------------------------------------------------
+    def _handle(self, path: str) -> _OpenLog:
+        log = self._open.pop(path, None)
+        if log is None:
+            log = _OpenLog(path)
+        self._open[path] = log
+        while len(self._open) > self.max_open_files:
+            _, evicted = self._open.popitem(last=False)
+            evicted.close()
+        return log
+
+    def _release(self, path: str):
+        log = self._open.pop(path, None)
+        if log is not None:
+            log.close()
+
+    def _write(self, path: str, records: Iterable[dict]):
+        log = self._handle(path)
+        count = 0
+        for record in records:
+            log.handle.write(_dumps(record))
+            count += 1
+        log.unsynced += count
+        if log.unsynced >= self.fsync_batch or time.monotonic() - log.last_sync >= self.fsync_interval:
+            log.sync()
+        else:
+            log.handle.flush()
+
+    def _migrate_legacy(self, user_id: str, session_id: str, path: str):
+        """Convert a pre-JSONL ``.json`` conversation into the append-only format."""
+        legacy = self.legacy_path_for(user_id, session_id)
+        if os.path.exists(path) or not os.path.exists(legacy):
+            return
+        with open(legacy, "r", encoding="utf-8") as f:
+            conversation = json.load(f)
+        self._rewrite(path, conversation)
+        os.remove(legacy)
+        logger.info(f"Migrated legacy conversation {legacy} to {path}")
+
+    def append(self, user_id: str, session_id: str, messages: List[dict], header: Optional[dict] = None) -> dict:
+        """
+        Append ``messages`` to a conversation, creating it from ``header`` if needed.
+        Returns the conversation header.
+        """
+        path = self.path_for(user_id, session_id)
+        with self._lock:
+            self._migrate_legacy(user_id, session_id, path)
+            records = []
+            if not os.path.exists(path) or os.path.getsize(path) == 0:
+                header = {"kind": "header", **{k: (header or {}).get(k) for k in HEADER_FIELDS}}
+                header["user_id"] = user_id
+                header["session_id"] = session_id
+                records.append(header)
+            else:
+                header = None
+            records.extend({"kind": "message", "message": m} for m in messages)
+            self._write(path, records)
+        if header is None:
+            header = self.read_header(user_id, session_id) or {}
+        return {k: header.get(k) for k in HEADER_FIELDS}
+
+    def flush(self):
+        """fsync every open conversation file."""
+        with self._lock:
+            for log in self._open.values():
+                log.sync()
+
+    def close(self):
+        with self._lock:
+            while self._open:
+                _, log = self._open.popitem(last=False)
+                log.close()
+
+    # ---- reading -------------------------------------------------------------
+    @staticmethod
+    def _iter_records(path: str) -> Iterator[dict]:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    # torn tail from an interrupted write; ignore it
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping corrupt record in {path}")
+
+    @staticmethod
+    def _build(records: Iterable[dict]) -> Optional[dict]:
+        conversation = None
+        for record in records:
+            kind = record.get("kind")
+            if kind == "header":
+                conversation = {k: record.get(k) for k in HEADER_FIELDS}
+                conversation["messages"] = []
+            elif kind == "snapshot":
+                conversation = dict(record["conversation"])
+                conversation["messages"] = list(conversation.get("messages") or [])
+            elif kind == "message" and conversation is not None:
+                conversation["messages"].append(record.get("message"))
+        if conversation is None:
+            return None
+        # keep the historical key order of the .json files
+        built = {
+            "id": conversation.get("id"),
+            "user_id": conversation.get("user_id"),
+            "session_id": conversation.get("session_id"),
+            "messages": conversation["messages"],
+            "agents": conversation.get("agents"),
+            "run_mode_locally": conversation.get("run_mode_locally"),
+            "timestamp": conversation.get("timestamp"),
+        }
+        if conversation.get("team_id") is not None:
+            built["team_id"] = conversation["team_id"]
+        return built
+
+    def _flush_path(self, path: str):
+        log = self._open.get(path)
+        if log is not None:
+            log.handle.flush()
+
+    def read_path(self, path: str) -> Optional[dict]:
+        if path.endswith(LEGACY_SUFFIX):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        with self._lock:
+            self._flush_path(path)
+        return self._build(self._iter_records(path))
+
+    def read(self, user_id: str, session_id: str) -> Optional[dict]:
+        path = self.path_for(user_id, session_id)
+        if os.path.exists(path):
+            return self.read_path(path)
+        legacy = self.legacy_path_for(user_id, session_id)
+        if os.path.exists(legacy):
+            return self.read_path(legacy)
+        return None
+
+    def read_header(self, user_id: str, session_id: str) -> Optional[dict]:
+        path = self.path_for(user_id, session_id)
+        if not os.path.exists(path):
+            return None
+        for record in self._iter_records(path):
+            if record.get("kind") == "header":
+                return record
+            if record.get("kind") == "snapshot":
+                return {k: record["conversation"].get(k) for k in HEADER_FIELDS}
+            break
+        return None
+
+    def paths(self) -> List[str]:
+        """All conversation files, JSONL and legacy. Names starting with ``_`` are reserved for sidecars."""
+        self.ensure_data_dir()
+        return [
+            os.path.join(self.data_dir, fname)
+            for fname in os.listdir(self.data_dir)
+            if not fname.startswith("_") and (fname.endswith(JSONL_SUFFIX) or fname.endswith(LEGACY_SUFFIX))
+        ]
+
+    # ---- deleting / compacting -----------------------------------------------
+    def delete(self, user_id: str, session_id: str) -> bool:
+        deleted = False
+        with self._lock:
+            for path in (self.path_for(user_id, session_id), self.legacy_path_for(user_id, session_id)):
+                self._release(path)
+                if os.path.exists(path):
+                    os.remove(path)
+                    deleted = True
+        return deleted
+
+    def _rewrite(self, path: str, conversation: dict):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(_dumps({"kind": "snapshot", "conversation": conversation}))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def compact(self, path: str) -> bool:
+        """
+        Collapse a conversation log into a single snapshot record.
+        Torn or corrupt records are dropped. New messages can still be appended afterwards.
+        """
+        with self._lock:
+            self._release(path)
+            conversation = self.read_path(path)
+            if conversation is None:
+                return False
+            target = path[: -len(LEGACY_SUFFIX)] + JSONL_SUFFIX if path.endswith(LEGACY_SUFFIX) else path
+            self._rewrite(target, conversation)
+            if target != path:
+                os.remove(path)
+        return True
+
+    def compact_older_than(self, seconds: float) -> Dict[str, int]:
+        """Compact every conversation that has not been written for ``seconds``."""
+        cutoff = time.time() - seconds
+        stats = {"scanned": 0, "compacted": 0, "failed": 0}
+        for path in self.paths():
+            stats["scanned"] += 1
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    continue
+                if self.compact(path):
+                    stats["compacted"] += 1
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to compact {path}: {e}")
+                stats["failed"] += 1
+        return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    from crud import DATA_DIR
+
+    parser = argparse.ArgumentParser(description="Conversation store maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compact_parser = subparsers.add_parser("compact", help="Compact old conversation logs")
+    compact_parser.add_argument("--older-than-days", type=float, default=7.0)
+    compact_parser.add_argument("--data-dir", type=str, default=DATA_DIR)
+
+    args = parser.parse_args()
+    if args.command == "compact":
+        store = JsonlConversationStore(args.data_dir)
+        stats = store.compact_older_than(args.older_than_days * 24 * 3600)
+        print(f"Scanned {stats['scanned']} conversations, compacted {stats['compacted']}, failed {stats['failed']}.")
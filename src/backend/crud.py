@@ -1,94 +1,114 @@
 # File: crud.py
-import os, json, uuid
+import os, json, uuid, atexit
 from datetime import datetime
 from typing import List
 
+from conversation_store import JsonlConversationStore
+from conversation_index import ConversationIndex
+
 DATA_DIR = "./data/conversations"
 
+store = JsonlConversationStore(DATA_DIR)
+index = ConversationIndex(store)
+atexit.register(store.close)
+atexit.register(index.close)
+
 def ensure_data_dir():
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
-    return DATA_DIR
+    return store.ensure_data_dir()
 
 def get_conversation_filepath(user_id: str, session_id: str) -> str:
-    ensure_data_dir()
-    return os.path.join(DATA_DIR, f"{user_id}_{session_id}.json")
-
-# Save a message to a conversation JSON file.
-def save_message(id: str, user_id: str, session_id: str, message: dict, agents: dict, run_mode_locally: bool, timestamp: str):
-    filepath = get_conversation_filepath(user_id, session_id)
-    if os.path.exists(filepath):
-        with open(filepath, "r") as f:
-            conversation = json.load(f)
-    else:
-        conversation = {
-            "id": str(id),
-            "user_id": user_id,
-            "session_id": session_id,
-            "messages": [],
-            "agents": agents,
-            "run_mode_locally": run_mode_locally,
-            "timestamp": timestamp
-        }
-    # Append message with timestamp
-    # message["id"] = str(uuid.uuid4())
-    # message["timestamp"] = datetime.now().isoformat()
-    conversation["messages"].append(message)
-    with open(filepath, "w") as f:
-        json.dump(conversation, f, indent=2)
-    return conversation
+    return store.path_for(user_id, session_id)
+
+# Append a message to a conversation log. Returns the conversation header (without messages).
+def save_message(user_id: str, session_id: str, message: dict, id: str = None, agents: dict = None, run_mode_locally: bool = None, timestamp: str = None, team_id: str = None):
+    header = conversation_header(id=id, agents=agents, run_mode_locally=run_mode_locally, timestamp=timestamp, team_id=team_id)
+    return save_messages(user_id, session_id, [message], header=header)
+
+# The fields a conversation file starts with.
+def conversation_header(id: str = None, agents: dict = None, run_mode_locally: bool = None, timestamp: str = None, team_id: str = None) -> dict:
+    return {
+        "id": str(id or uuid.uuid4()),
+        "agents": agents,
+        "run_mode_locally": run_mode_locally,
+        "timestamp": timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "team_id": team_id,
+    }
+
+# Append several messages of one conversation in a single write.
+def save_messages(user_id: str, session_id: str, messages: List[dict], header: dict = None):
+    conversation_header = store.append(user_id, session_id, messages, header=header)
+    index.record_append(conversation_header, len(messages))
+    return conversation_header
 
 # Retrieve a single conversation.
 def get_conversation(user_id: str, session_id: str):
-    filepath = get_conversation_filepath(user_id, session_id)
-    if os.path.exists(filepath):
-        with open(filepath, "r") as f:
-            return json.load(f)
-    return None
+    return store.read(user_id, session_id)
 
 def extract_session_id(filepath: str) -> str:
     filename = os.path.basename(filepath)
     session_id = filename.split('_', 1)[-1].rsplit('.', 1)[0]
     return session_id
 
-# List all conversations.
-def get_all_conversations() -> List[dict]:
-    ensure_data_dir()
+# Rebuild the sidecar index from its op log and the files on disk (called on startup).
+def load_index():
+    index.load()
+
+# Page through conversation metadata without opening the conversation files.
+def list_conversations(user_id: str = None, page: int = 1, page_size: int = 20) -> dict:
+    return index.list(user_id=user_id, page=page, page_size=page_size)
+
+def _conversation_paths(user_id: str = None, page: int = None, page_size: int = 20) -> List[str]:
+    if page is None:
+        return index.paths(user_id=user_id)
+    # only the files of the requested page are opened
+    entries, _ = index.page(user_id=user_id, page=page, page_size=page_size)
+    return [e["path"] for e in entries]
+
+# List all conversations (one page of them when `page` is given).
+def get_all_conversations(page: int = None, page_size: int = 20) -> List[dict]:
     conversations = []
-    for fname in os.listdir(DATA_DIR):
-        if fname.endswith(".json"):
-            path = os.path.join(DATA_DIR, fname)
-            try:
-                with open(path, "r") as f:
-                    conversations.append(json.load(f))
-            except json.JSONDecodeError:
-                print(f"Error decoding JSON from file {path}")
-                conversations.append({
-                        "id": "DUMMY-b666-4943-9c3d-ec9482751601",
-                        "user_id": "user123",
-                        "session_id": extract_session_id(path),
-                        "messages": [],
-                        "agents": [],
-                        "run_mode_locally": "false",
-                        "timestamp": "ERROR"
-
-                    })
+    for path in _conversation_paths(page=page, page_size=page_size):
+        try:
+            conversation = store.read_path(path)
+            if conversation is not None:
+                conversations.append(conversation)
+        except FileNotFoundError:
+            # deleted or migrated since it was indexed
+            continue
+        except json.JSONDecodeError:
+            print(f"Error decoding JSON from file {path}")
+            conversations.append({
+                    "id": "DUMMY-b666-4943-9c3d-ec9482751601",
+                    "user_id": "user123",
+                    "session_id": extract_session_id(path),
+                    "messages": [],
+                    "agents": [],
+                    "run_mode_locally": "false",
+                    "timestamp": "ERROR"
+
+                })
     return conversations
 
-# List conversations for a particular user.
-def get_user_conversations(user_id: str):
-    ensure_data_dir()
+# List conversations for a particular user (one page of them when `page` is given).
+def get_user_conversations(user_id: str, page: int = None, page_size: int = 20):
     conversations = []
-    for fname in os.listdir(DATA_DIR):
-        if fname.startswith(user_id+"_") and fname.endswith(".json"):
-            path = os.path.join(DATA_DIR, fname)
-            with open(path, "r") as f:
-                conversations.append(json.load(f))
+    for path in _conversation_paths(user_id=user_id, page=page, page_size=page_size):
+        try:
+            conversation = store.read_path(path)
+        except FileNotFoundError:
+            continue
+        if conversation is not None:
+            conversations.append(conversation)
     return conversations
 
 def delete_conversation(user_id: str, session_id: str) -> bool:
-    filepath = get_conversation_filepath(user_id, session_id)
-    if os.path.exists(filepath):
-        os.remove(filepath)
-        return True
-    return False
\ No newline at end of file
+    deleted = store.delete(user_id, session_id)
+    index.record_delete(user_id, session_id)
+    return deleted
+
+# Collapse logs not written for `older_than_days` into a single snapshot record each.
+def compact_conversations(older_than_days: float = 7.0) -> dict:
+    stats = store.compact_older_than(older_than_days * 24 * 3600)
+    # compacted files have new sizes; reconcile rescans only those
+    index.load()
+    return stats
@@ -1,9 +1,11 @@
 import os
-from pymongo import MongoClient
+import base64
+from pymongo import MongoClient, AsyncMongoClient, ASCENDING, DESCENDING, UpdateOne
 from typing import Optional, List, Dict
 from autogen_agentchat.base import TaskResult
 from autogen_agentchat.messages import MultiModalMessage, TextMessage, ToolCallExecutionEvent, ToolCallRequestEvent, SelectSpeakerEvent, ToolCallSummaryMessage
 from schemas import AutoGenMessage
+from blob_store import extract_executor_image
 import uuid
 from dotenv import load_dotenv
 import time
@@ -11,14 +13,71 @@ import glob
 import json
 from bson import ObjectId  # Import ObjectId for serialization
 
+def client_options() -> Dict:
+    """Connection pool size and timeouts shared by the sync and async clients."""
+    return {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000")),
+        "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+        "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000")),
+    }
+
+# Index provisioning: created once at startup, idempotent
+CONVERSATION_INDEXES = [
+    ([("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], "user_id_timestamp"),
+    ([("user_id", ASCENDING), ("session_id", ASCENDING)], "user_id_session_id"),
+    ([("timestamp", DESCENDING), ("_id", DESCENDING)], "timestamp"),
+]
+TEAM_INDEXES = [
+    ([("team_id", ASCENDING)], "team_id"),
+]
+MESSAGE_INDEXES = [
+    ([("user_id", ASCENDING), ("session_id", ASCENDING), ("_id", ASCENDING)], "user_id_session_id_id"),
+]
+# one DyoPods_usage document per (scope, key, provider, model, day)
+USAGE_INDEXES = [
+    ([("scope", ASCENDING), ("key", ASCENDING), ("provider", ASCENDING), ("model", ASCENDING), ("day", ASCENDING)], "usage_group"),
+    ([("scope", ASCENDING), ("day", DESCENDING)], "scope_day"),
+]
+CONVERSATION_SORT = [("timestamp", DESCENDING), ("_id", DESCENDING)]
+# "snapshot" inserts the whole transcript when a run finishes; "incremental" upserts the
+# session document at /start and $pushes events while the run streams.
+MONGO_WRITE_MODE = os.getenv("MONGO_WRITE_MODE", "snapshot").lower()
+# Where incremental messages go: "embedded" in the session document, or "collection"
+# (one document per message in DyoPods_messages) for very long runs.
+MONGO_MESSAGE_STORAGE = os.getenv("MONGO_MESSAGE_STORAGE", "embedded").lower()
+ESTIMATED_COUNT_CAP = int(os.getenv("MONGO_ESTIMATED_COUNT_CAP", "10000"))
+
+def encode_cursor(document: dict) -> str:
+    """Opaque keyset token for the position right after ``document``."""
+    raw = json.dumps({"t": document.get("timestamp"), "id": str(document["_id"])})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(token: str) -> Dict:
+    """Query fragment selecting the documents after an ``encode_cursor`` token."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token.encode()))
+        timestamp, object_id = data["t"], ObjectId(data["id"])
+    except Exception as e:
+        raise ValueError(f"Invalid pagination cursor: {token}") from e
+    return {"$or": [
+        {"timestamp": {"$lt": timestamp}},
+        {"timestamp": timestamp, "_id": {"$lt": object_id}},
+    ]}
+
 class MongoDB:
+    client_class = MongoClient
+
     def __init__(self):
         load_dotenv("./.env", override=True)
         # Get MongoDB connection details
         MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongo:27017/")
         MONGO_DATABASE = os.getenv("MONGO_DATABASE", "DyoPods_DB")
         
-        self.client = MongoClient(MONGO_URI)
+        self.client = self.client_class(MONGO_URI, **client_options())
         self.database = self.client[MONGO_DATABASE]
         self.collections = {}
         # Pre-initialize default collections
@@ -63,28 +122,7 @@ class MongoDB:
             _response.content = _log_entry_json.content
             # Custom logic for Executor with base64 image
             if _log_entry_json.source == "Executor":
-                import ast
-                import re
-                content = _log_entry_json.content
-                try:
-                    if isinstance(content, str) and "'type': 'image'" in content and "'base64_data':" in content:
-                        pattern = r"\{[^{}]*'type': 'image'[^{}]*'base64_data':[^{}]*\}"
-                        match = re.search(pattern, content)
-                        if match:
-                            img_dict_str = match.group(0)
-                            img_dict = ast.literal_eval(img_dict_str)
-                            if (
-                                isinstance(img_dict, dict)
-                                and img_dict.get('type') == 'image'
-                                and img_dict.get('format') == 'png'
-                                and 'base64_data' in img_dict
-                            ):
-                                _response.content_image = f"data:image/png;base64,{img_dict['base64_data']}"
-                                # Remove the dict substring from the content
-                                cleaned_content = content.replace(img_dict_str, "").strip()
-                                _response.content = cleaned_content
-                except Exception:
-                    pass
+                _response.content, _response.content_image = extract_executor_image(_log_entry_json.content)
         elif isinstance(_log_entry_json, ToolCallExecutionEvent):
             _response.type = _log_entry_json.type
             _response.source = _log_entry_json.source
@@ -107,73 +145,139 @@ class MongoDB:
             _response.content = "Agents mumbling."
         return _response
 
-    def store_conversation(self, conversation: TaskResult, conversation_details: AutoGenMessage, conversation_dict: dict):
-        _messages = []
-        for message in conversation.messages:
-            _m = self.format_message(message)
-            _messages.append(_m.to_json())
-        conversation_document_item = {
+    # ---- builders shared with AsyncMongoDB: only the I/O differs between the two -----------
+    @staticmethod
+    def _session_query(user_id: str, session_id: str) -> Dict:
+        return {"user_id": user_id, "session_id": session_id}
+
+    @staticmethod
+    def _conversation_document(conversation_details: AutoGenMessage, conversation_dict: dict, messages: List[AutoGenMessage]) -> Dict:
+        return {
             "id": str(uuid.uuid4()),
             "user_id": conversation_details.session_user,
             "session_id": conversation_details.session_id,
-            "messages": _messages, 
+            "messages": [m.to_json() for m in messages],
             "agents": conversation_dict["agents"],
             "run_mode_locally": False,
             "timestamp": conversation_details.time,
         }
-        collection = self.get_collection("DyoPods_demo")
-        response = collection.insert_one(conversation_document_item)
-        return response
 
-    def fetch_user_conversations(self, user_id: Optional[str] = None, page: int = 1, page_size: int = 20) -> Dict:
-        collection = self.get_collection("DyoPods_demo")
-        
-        # Query for total count
-        if user_id is None:
-            total_count = collection.count_documents({})
-        else:
-            total_count = collection.count_documents({"user_id": user_id})
-        
-        # Calculate total pages
-        total_pages = (total_count + page_size - 1) // page_size if total_count > 0 else 1
-        
-        # Ensure page is within valid range
-        page = max(1, min(page, total_pages))
-        
-        # Calculate skip for pagination
-        skip = (page - 1) * page_size
-        
-        # Get paginated results
-        if user_id is None:
-            items = list(collection.find({}, {"user_id": 1, "session_id": 1, "timestamp": 1}).sort("timestamp", -1).skip(skip).limit(page_size))
+    @staticmethod
+    def _count_plan(query: Dict, count_mode: str):
+        """
+        How to count the conversations matching ``query``: (collection method, args, kwargs,
+        capped), or None to skip counting. count_mode "exact" counts through the index,
+        "estimated" uses collection metadata (or a capped count when filtering by user)
+        and "none" skips counting.
+        """
+        if count_mode == "none":
+            return None
+        if count_mode == "estimated":
+            if not query:
+                return "estimated_document_count", (), {}, False
+            return "count_documents", (query,), {"limit": ESTIMATED_COUNT_CAP}, True
+        return "count_documents", (query,), {}, False
+
+    @staticmethod
+    def _counts(total_count: Optional[int], capped: bool) -> Dict:
+        return {
+            "total_count": total_count,
+            "total_count_capped": capped and total_count is not None and total_count >= ESTIMATED_COUNT_CAP,
+        }
+
+    @staticmethod
+    def _total_pages(total_count: Optional[int], page_size: int) -> Optional[int]:
+        if total_count is None:
+            return None
+        return (total_count + page_size - 1) // page_size if total_count > 0 else 1
+
+    def _conversations_cursor(self, query: Dict, page: int, page_size: int, before: Optional[str], total_pages: Optional[int]):
+        """The cursor of one page of conversation metadata, newest first, and the page number it is."""
+        cursor = self.get_collection("DyoPods_demo").find(
+            {**query, **decode_cursor(before)} if before else query,
+            {"user_id": 1, "session_id": 1, "timestamp": 1},
+        ).sort(CONVERSATION_SORT)
+        if before:
+            page = None
         else:
-            items = list(collection.find({"user_id": user_id}, {"user_id": 1, "session_id": 1, "timestamp": 1}).sort("timestamp", -1).skip(skip).limit(page_size))
-        
+            page = max(1, min(page, total_pages)) if total_pages else max(1, page)
+            cursor = cursor.skip((page - 1) * page_size)
+        return cursor.limit(page_size), page
+
+    def _conversations_page(self, items: List[Dict], counts: Dict, page: Optional[int], page_size: int, total_pages: Optional[int]) -> Dict:
         return {
             "conversations": self.serialize_document(items),
-            "total_count": total_count,
+            **counts,
             "page": page,
-            "total_pages": total_pages
+            "total_pages": total_pages,
+            "next_cursor": encode_cursor(items[-1]) if len(items) == page_size else None,
         }
 
+    @staticmethod
+    def _deleted(result, error: str) -> Dict:
+        if result.deleted_count == 0:
+            return {"error": error}
+        return {"success": True}
+
+    @staticmethod
+    def _team_files() -> List[str]:
+        teams_folder = os.path.join(os.path.dirname(__file__), "./data/teams-definitions")
+        json_files = sorted(glob.glob(os.path.join(teams_folder, "*.json")))
+        print(f"Found {len(json_files)} JSON files in {teams_folder}.")
+        return json_files
+
+    @staticmethod
+    def _load_team(file_path: str) -> Dict:
+        with open(file_path, "r") as f:
+            return json.load(f)
+
+    # ---- queries -----------------------------------------------------------------
+    def store_conversation(self, conversation: TaskResult, conversation_details: AutoGenMessage, conversation_dict: dict):
+        messages = [self.format_message(message) for message in conversation.messages]
+        collection = self.get_collection("DyoPods_demo")
+        response = collection.insert_one(self._conversation_document(conversation_details, conversation_dict, messages))
+        return response
+
+    def count_conversations(self, query: Dict, count_mode: str = "exact") -> Dict:
+        plan = self._count_plan(query, count_mode)
+        if plan is None:
+            return self._counts(None, False)
+        method, args, kwargs, capped = plan
+        return self._counts(getattr(self.get_collection("DyoPods_demo"), method)(*args, **kwargs), capped)
+
+    def fetch_user_conversations(
+        self,
+        user_id: Optional[str] = None,
+        page: int = 1,
+        page_size: int = 20,
+        before: Optional[str] = None,
+        count_mode: str = "exact",
+    ) -> Dict:
+        """
+        Page through conversation metadata, newest first.
+        Pass ``before`` (the ``next_cursor`` of the previous page) for keyset pagination,
+        which stays an index range scan however deep the page; otherwise ``page`` is used.
+        """
+        query = {} if user_id is None else {"user_id": user_id}
+        counts = self.count_conversations(query, count_mode)
+        total_pages = self._total_pages(counts["total_count"], page_size)
+        cursor, page = self._conversations_cursor(query, page, page_size, before, total_pages)
+        return self._conversations_page(list(cursor), counts, page, page_size, total_pages)
+
     def fetch_user_conversation(self, user_id: str, session_id: str):
         collection = self.get_collection("DyoPods_demo")
-        item = collection.find_one({"user_id": user_id, "session_id": session_id})
+        item = collection.find_one(self._session_query(user_id, session_id))
         return self.serialize_document(item)
 
     def delete_user_conversation(self, user_id: str, session_id: str):
         collection = self.get_collection("DyoPods_demo")
-        result = collection.delete_one({"user_id": user_id, "session_id": session_id})
-        if result.deleted_count == 0:
-            return {"error": f"No conversation found with user_id {user_id} and session_id {session_id}."}
-        return {"success": True}
+        result = collection.delete_one(self._session_query(user_id, session_id))
+        return self._deleted(result, f"No conversation found with user_id {user_id} and session_id {session_id}.")
 
     def delete_user_all_conversations(self, user_id: str):
         collection = self.get_collection("DyoPods_demo")
         result = collection.delete_many({"user_id": user_id})
-        if result.deleted_count == 0:
-            return {"error": f"No conversation found with user_id {user_id}."}
-        return {"success": True}
+        return self._deleted(result, f"No conversation found with user_id {user_id}.")
 
     def create_team(self, team: dict):
         collection = self.get_collection("DyoPods_teams")
@@ -200,20 +304,211 @@ class MongoDB:
     def delete_team(self, team_id: str):
         collection = self.get_collection("DyoPods_teams")
         result = collection.delete_one({"team_id": team_id})
-        if result.deleted_count == 0:
+        return self._deleted(result, "Team not found")
+
+    def initialize_teams(self):
+        json_files = self._team_files()
+        created_items = 0
+        for file_path in json_files:
+            self.create_team(self._load_team(file_path))
+            print(f"Created team from {os.path.basename(file_path)}")
+            created_items += 1
+        print(f"Created {created_items}/{len(json_files)} items in the database.")
+        return f"Successfully created {created_items} teams."
+
+class AsyncMongoDB(MongoDB):
+    """
+    Non-blocking variant of MongoDB for the FastAPI handlers, built on pymongo's AsyncMongoClient.
+    Same surface as MongoDB; every method that talks to the server is a coroutine.
+    """
+    client_class = AsyncMongoClient
+
+    def __init__(self, write_mode: str = MONGO_WRITE_MODE, message_storage: str = MONGO_MESSAGE_STORAGE):
+        super().__init__()
+        self.incremental = write_mode == "incremental"
+        self.messages_in_collection = message_storage == "collection"
+        # set by the API so stored transcripts reference images instead of embedding them
+        self.blob_store = None
+
+    async def close(self):
+        await self.client.close()
+
+    async def ensure_indexes(self):
+        for keys, name in CONVERSATION_INDEXES:
+            await self.get_collection("DyoPods_demo").create_index(keys, name=name)
+        for keys, name in TEAM_INDEXES:
+            await self.get_collection("DyoPods_teams").create_index(keys, name=name)
+        if self.messages_in_collection:
+            for keys, name in MESSAGE_INDEXES:
+                await self.get_collection("DyoPods_messages").create_index(keys, name=name)
+        for keys, name in USAGE_INDEXES:
+            await self.get_collection("DyoPods_usage").create_index(keys, name=name, unique=name == "usage_group")
+
+    async def start_conversation(self, user_id: str, session_id: str, agents: list, message: dict, timestamp: str, run_mode_locally: bool = False):
+        """Incremental mode: upsert the session document when the run is created."""
+        collection = self.get_collection("DyoPods_demo")
+        await collection.update_one(
+            {"user_id": user_id, "session_id": session_id},
+            {
+                "$set": {"agents": agents, "run_mode_locally": run_mode_locally, "timestamp": timestamp, "status": "running"},
+                "$setOnInsert": {"id": str(uuid.uuid4())},
+            },
+            upsert=True,
+        )
+        await self.append_messages([(user_id, session_id, message)])
+
+    async def append_messages(self, items: List[tuple]):
+        """
+        Incremental mode: append (user_id, session_id, message) items in one round trip.
+        Embedded storage issues one $push/$each per session through bulk_write; collection
+        storage inserts one document per message (ordered by _id) and bumps a counter.
+        """
+        if not items:
+            return
+        grouped: Dict[tuple, List[dict]] = {}
+        for user_id, session_id, message in items:
+            grouped.setdefault((user_id, session_id), []).append(message)
+        collection = self.get_collection("DyoPods_demo")
+        if self.messages_in_collection:
+            await self.get_collection("DyoPods_messages").insert_many(
+                [{"user_id": user_id, "session_id": session_id, "message": message} for user_id, session_id, message in items],
+                ordered=True,
+            )
+            operations = [
+                UpdateOne({"user_id": user_id, "session_id": session_id}, {"$inc": {"message_count": len(messages)}}, upsert=True)
+                for (user_id, session_id), messages in grouped.items()
+            ]
+        else:
+            operations = [
+                UpdateOne(
+                    {"user_id": user_id, "session_id": session_id},
+                    {"$push": {"messages": {"$each": messages}}, "$inc": {"message_count": len(messages)}},
+                    upsert=True,
+                )
+                for (user_id, session_id), messages in grouped.items()
+            ]
+        await collection.bulk_write(operations, ordered=False)
+
+    async def finish_conversation(self, user_id: str, session_id: str, stop_reason: Optional[str], timestamp: str):
+        collection = self.get_collection("DyoPods_demo")
+        return await collection.update_one(
+            {"user_id": user_id, "session_id": session_id},
+            {"$set": {"status": "completed", "stop_reason": stop_reason, "completed_at": timestamp}},
+        )
+
+    async def store_conversation(self, conversation: TaskResult, conversation_details: AutoGenMessage, conversation_dict: dict):
+        if self.incremental:
+            # every event is already in the document; only mark the run as finished
+            return await self.finish_conversation(
+                conversation_details.session_user,
+                conversation_details.session_id,
+                conversation_details.stop_reason,
+                conversation_details.time,
+            )
+        messages = [self.format_message(message) for message in conversation.messages]
+        if self.blob_store is not None:
+            for message in messages:
+                message.content_image = await self.blob_store.offload(message.content_image)
+        collection = self.get_collection("DyoPods_demo")
+        response = await collection.insert_one(self._conversation_document(conversation_details, conversation_dict, messages))
+        return response
+
+    async def record_usage(self, items: List[tuple]):
+        """Add (group, counters) usage increments to DyoPods_usage, one upsert per group, in one round trip."""
+        if not items:
+            return
+        now = time.time()
+        operations = [
+            UpdateOne(group, {"$inc": counters, "$set": {"updated_at": now}}, upsert=True)
+            for group, counters in items
+        ]
+        await self.get_collection("DyoPods_usage").bulk_write(operations, ordered=False)
+
+    async def fetch_usage(self, scope: str, key: Optional[str] = None, since: Optional[str] = None) -> List[Dict]:
+        """Usage documents of a scope (and key), from day ``since`` (YYYY-MM-DD) onwards, newest first."""
+        query: Dict = {"scope": scope}
+        if key is not None:
+            query["key"] = key
+        if since is not None:
+            query["day"] = {"$gte": since}
+        cursor = self.get_collection("DyoPods_usage").find(query, {"_id": 0}).sort([("day", DESCENDING), ("key", ASCENDING)])
+        return await cursor.to_list(length=None)
+
+    async def count_conversations(self, query: Dict, count_mode: str = "exact") -> Dict:
+        plan = self._count_plan(query, count_mode)
+        if plan is None:
+            return self._counts(None, False)
+        method, args, kwargs, capped = plan
+        return self._counts(await getattr(self.get_collection("DyoPods_demo"), method)(*args, **kwargs), capped)
+
+    async def fetch_user_conversations(
+        self,
+        user_id: Optional[str] = None,
+        page: int = 1,
+        page_size: int = 20,
+        before: Optional[str] = None,
+        count_mode: str = "exact",
+    ) -> Dict:
+        query = {} if user_id is None else {"user_id": user_id}
+        counts = await self.count_conversations(query, count_mode)
+        total_pages = self._total_pages(counts["total_count"], page_size)
+        cursor, page = self._conversations_cursor(query, page, page_size, before, total_pages)
+        return self._conversations_page(await cursor.to_list(length=None), counts, page, page_size, total_pages)
+
+    async def fetch_user_conversation(self, user_id: str, session_id: str):
+        collection = self.get_collection("DyoPods_demo")
+        item = await collection.find_one(self._session_query(user_id, session_id))
+        if item is not None and self.messages_in_collection:
+            cursor = self.get_collection("DyoPods_messages").find(self._session_query(user_id, session_id)).sort("_id", ASCENDING)
+            item["messages"] = item.get("messages", []) + [m["message"] for m in await cursor.to_list(length=None)]
+        return self.serialize_document(item)
+
+    async def delete_user_conversation(self, user_id: str, session_id: str):
+        collection = self.get_collection("DyoPods_demo")
+        result = await collection.delete_one(self._session_query(user_id, session_id))
+        if self.messages_in_collection:
+            await self.get_collection("DyoPods_messages").delete_many(self._session_query(user_id, session_id))
+        return self._deleted(result, f"No conversation found with user_id {user_id} and session_id {session_id}.")
+
+    async def delete_user_all_conversations(self, user_id: str):
+        collection = self.get_collection("DyoPods_demo")
+        result = await collection.delete_many({"user_id": user_id})
+        if self.messages_in_collection:
+            await self.get_collection("DyoPods_messages").delete_many({"user_id": user_id})
+        return self._deleted(result, f"No conversation found with user_id {user_id}.")
+
+    async def create_team(self, team: dict):
+        collection = self.get_collection("DyoPods_teams")
+        response = await collection.insert_one(team)
+        return {"inserted_id": str(response.inserted_id)}
+
+    async def get_teams(self):
+        collection = self.get_collection("DyoPods_teams")
+        items = await collection.find({}).to_list(length=None)
+        return self.serialize_document(items)
+
+    async def get_team(self, team_id: str):
+        collection = self.get_collection("DyoPods_teams")
+        item = await collection.find_one({"team_id": team_id})
+        return self.serialize_document(item)
+
+    async def update_team(self, team_id: str, team: dict):
+        collection = self.get_collection("DyoPods_teams")
+        result = await collection.update_one({"team_id": team_id}, {"$set": team})
+        if result.matched_count == 0:
             return {"error": "Team not found"}
         return {"success": True}
 
-    def initialize_teams(self):
-        teams_folder = os.path.join(os.path.dirname(__file__), "./data/teams-definitions")
-        json_files = glob.glob(os.path.join(teams_folder, "*.json"))
-        json_files.sort()
-        print(f"Found {len(json_files)} JSON files in {teams_folder}.")
+    async def delete_team(self, team_id: str):
+        collection = self.get_collection("DyoPods_teams")
+        result = await collection.delete_one({"team_id": team_id})
+        return self._deleted(result, "Team not found")
+
+    async def initialize_teams(self):
+        json_files = self._team_files()
         created_items = 0
         for file_path in json_files:
-            with open(file_path, "r") as f:
-                team = json.load(f)
-            response = self.create_team(team)
+            await self.create_team(self._load_team(file_path))
             print(f"Created team from {os.path.basename(file_path)}")
             created_items += 1
         print(f"Created {created_items}/{len(json_files)} items in the database.")
@@ -221,15 +516,4 @@ class MongoDB:
 
 if __name__ == "__main__":
     db = MongoDB()
-    teams_folder = os.path.join(os.path.dirname(__file__), "./data/teams-definitions")
-    json_files = glob.glob(os.path.join(teams_folder, "*.json"))
-    json_files.sort()
-    print(f"Found {len(json_files)} JSON files in {teams_folder}.")
-    created_items = 0
-    for file_path in json_files:
-        with open(file_path, "r") as f:
-            team = json.load(f)
-        response = db.create_team(team)
-        print(f"Created team from {os.path.basename(file_path)}")
-        created_items += 1
-    print(f"Created {created_items}/{len(json_files)} items in the database.")
\ No newline at end of file
+    db.initialize_teams()
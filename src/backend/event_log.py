@@ -0,0 +1,222 @@
+# File: event_log.py
+"""
+Per-session event logs that decouple running a team from delivering its events.
+
+A run publishes every SSE payload to the log of its session; ``/chat-stream``
+subscribers replay the log from an offset (the SSE ``Last-Event-ID``) and then
+live-tail it, so a dropped connection resumes instead of re-running the task.
+Sequence numbers match the position of the message in the stored conversation
+(message 0 is the user's task), so the conversation file can stand in for a log
+that has already been evicted.
+
+Token deltas of a message that is still being generated are published with
+``publish_partial``. They take no sequence number and are only kept until the
+next complete event, which supersedes them. A subscriber that catches up gets
+the deltas of the message in flight as ``(None, event)`` items.
+
+EVENT_LOG_BACKEND selects "memory" (default, ring buffer per session) or
+"mongo" (DyoPods_events collection, tailed through a change stream, or by
+polling on servers without change streams).
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOG_BACKEND = os.getenv("EVENT_LOG_BACKEND", "memory").lower()
+EVENT_LOG_RING_SIZE = int(os.getenv("EVENT_LOG_RING_SIZE", "2000"))
+EVENT_LOG_RETENTION = float(os.getenv("EVENT_LOG_RETENTION", "3600"))
+EVENT_LOG_KEEPALIVE = float(os.getenv("EVENT_LOG_KEEPALIVE", "15"))
+
+# (seq, event) pairs, seq None for partial events; None is a keep-alive tick while nothing new arrived
+Event = Optional[Tuple[Optional[int], dict]]
+
+
+class _SessionEvents:
+    def __init__(self, maxlen: int, first_seq: int):
+        self.events: deque = deque(maxlen=maxlen)
+        self.first_seq = first_seq  # seq of events[0]
+        self.next_seq = first_seq
+        self.partials: list = []  # deltas of the event being generated after next_seq - 1
+        self.closed_at: Optional[float] = None
+        self.changed = asyncio.Condition()
+
+
+class InMemoryEventLog:
+    def __init__(self, ring_size: int = EVENT_LOG_RING_SIZE, retention: float = EVENT_LOG_RETENTION):
+        self.ring_size = max(1, ring_size)
+        self.retention = retention
+        self._sessions: Dict[str, _SessionEvents] = {}
+
+    def _sweep(self):
+        cutoff = time.monotonic() - self.retention
+        for session_id in [s for s, e in self._sessions.items() if e.closed_at is not None and e.closed_at < cutoff]:
+            del self._sessions[session_id]
+
+    async def open(self, session_id: str, first_seq: int = 1):
+        self._sweep()
+        if session_id not in self._sessions:
+            self._sessions[session_id] = _SessionEvents(self.ring_size, first_seq)
+
+    async def exists(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    async def is_closed(self, session_id: str) -> bool:
+        events = self._sessions.get(session_id)
+        return events is not None and events.closed_at is not None
+
+    async def publish(self, session_id: str, event: dict) -> int:
+        events = self._sessions[session_id]
+        async with events.changed:
+            seq = events.next_seq
+            if len(events.events) == events.events.maxlen:
+                events.first_seq += 1
+            events.events.append(event)
+            events.next_seq += 1
+            events.partials = []
+            events.changed.notify_all()
+        return seq
+
+    async def publish_partial(self, session_id: str, event: dict):
+        events = self._sessions[session_id]
+        async with events.changed:
+            events.partials.append(event)
+            events.changed.notify_all()
+
+    async def close(self, session_id: str):
+        events = self._sessions.get(session_id)
+        if events is None:
+            return
+        async with events.changed:
+            events.closed_at = time.monotonic()
+            events.changed.notify_all()
+
+    async def subscribe(self, session_id: str, after: int = 0, keepalive: float = EVENT_LOG_KEEPALIVE) -> AsyncIterator[Event]:
+        events = self._sessions.get(session_id)
+        if events is None:
+            return
+        last = after
+        seen_partials = 0
+        while True:
+            if last + 1 < events.first_seq:
+                logger.warning(f"Event log of {session_id} no longer holds events {last + 1}..{events.first_seq - 1}")
+                last = events.first_seq - 1
+            # copy first: appends while we yield may rotate the ring
+            start = last + 1 - events.first_seq
+            pending = [(events.first_seq + i, events.events[i]) for i in range(start, len(events.events))]
+            for seq, event in pending:
+                yield seq, event
+                last = seq
+                seen_partials = 0
+            if events.next_seq - 1 == last:
+                # caught up: stream the deltas of the event in flight
+                partials = events.partials[seen_partials:]
+                for event in partials:
+                    yield None, event
+                seen_partials += len(partials)
+            timed_out = False
+            async with events.changed:
+                if events.next_seq - 1 <= last and len(events.partials) <= seen_partials:
+                    if events.closed_at is not None:
+                        return
+                    try:
+                        await asyncio.wait_for(events.changed.wait(), keepalive)
+                    except asyncio.TimeoutError:
+                        timed_out = True
+            if timed_out:
+                yield None
+
+
+class MongoEventLog:
+    def __init__(self, db, retention: float = EVENT_LOG_RETENTION, poll_interval: float = 0.5):
+        self.collection = db.get_collection("DyoPods_events")
+        self.retention = retention
+        self.poll_interval = poll_interval
+        self._next_seq: Dict[str, int] = {}
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("session_id", 1), ("seq", 1)], name="session_id_seq", unique=True)
+        await self.collection.create_index("created_at", name="created_at_ttl", expireAfterSeconds=int(self.retention))
+
+    async def open(self, session_id: str, first_seq: int = 1):
+        self._next_seq.setdefault(session_id, first_seq)
+
+    async def exists(self, session_id: str) -> bool:
+        return session_id in self._next_seq or await self.collection.find_one({"session_id": session_id}, {"_id": 1}) is not None
+
+    async def is_closed(self, session_id: str) -> bool:
+        return await self.collection.find_one({"session_id": session_id, "end": True}, {"_id": 1}) is not None
+
+    async def _insert(self, session_id: str, document: dict) -> int:
+        seq = self._next_seq[session_id]
+        self._next_seq[session_id] = seq + 1
+        await self.collection.insert_one({"session_id": session_id, "seq": seq, "created_at": datetime.now(timezone.utc), **document})
+        return seq
+
+    async def publish(self, session_id: str, event: dict) -> int:
+        return await self._insert(session_id, {"event": event})
+
+    async def publish_partial(self, session_id: str, event: dict):
+        # token deltas are not written to Mongo; subscribers get the complete event
+        pass
+
+    async def close(self, session_id: str):
+        if session_id in self._next_seq:
+            await self._insert(session_id, {"end": True})
+            del self._next_seq[session_id]
+
+    async def _open_change_stream(self, session_id: str):
+        try:
+            return await self.collection.watch(
+                [{"$match": {"operationType": "insert", "fullDocument.session_id": session_id}}],
+                max_await_time_ms=int(self.poll_interval * 1000),
+            )
+        except Exception as e:
+            # standalone servers have no change streams
+            logger.info(f"Change stream unavailable, polling event log instead: {e}")
+            return None
+
+    async def subscribe(self, session_id: str, after: int = 0, keepalive: float = EVENT_LOG_KEEPALIVE) -> AsyncIterator[Event]:
+        # open the change stream before replaying so nothing falls between the two
+        change_stream = await self._open_change_stream(session_id)
+        last = after
+        idle_since = time.monotonic()
+        try:
+            while True:
+                cursor = self.collection.find({"session_id": session_id, "seq": {"$gt": last}}).sort("seq", 1)
+                found = False
+                async for document in cursor:
+                    if document.get("end"):
+                        return
+                    found = True
+                    last = document["seq"]
+                    idle_since = time.monotonic()
+                    yield last, document["event"]
+                if not found and not await self.exists(session_id):
+                    # expired while we were tailing
+                    return
+                if change_stream is not None:
+                    # wake up on the next insert (or after max_await_time_ms), then re-read from `last`
+                    await change_stream.try_next()
+                else:
+                    await asyncio.sleep(self.poll_interval)
+                if time.monotonic() - idle_since >= keepalive:
+                    idle_since = time.monotonic()
+                    yield None
+        finally:
+            if change_stream is not None:
+                await change_stream.close()
+
+
+def create_event_log(db=None, backend: str = EVENT_LOG_BACKEND):
+    if backend == "mongo":
+        if db is None:
+            raise ValueError("Mongo event log requires a MongoDB database.")
+        return MongoEventLog(db)
+    return InMemoryEventLog()
@@ -0,0 +1,246 @@
+# File: executor_pool.py
+"""
+Pool of pre-started DockerCommandLineCodeExecutors.
+
+Starting a container costs several seconds, and Executor/CodeExecutor agents
+used to pay it on every run before the first event. The pool keeps
+EXECUTOR_POOL_SIZE started executors idle and leases one per agent. It never
+holds more than EXECUTOR_POOL_MAX at once; when all are leased, ``acquire``
+waits for a release.
+
+The work dir is bind-mounted into the container when it starts, so every
+pooled executor owns a directory under EXECUTOR_POOL_DIR. Every lease is
+single-use: on release the container is stopped and its work dir removed, and
+a fresh one is warmed in its place. Whatever the run left in the work dir
+(generated files, plots) is copied to the directory the caller passes to
+``release`` first, so it still ends up in the session's logs dir as it did
+with one executor per run. A container that ran one user's code
+(installed packages, background processes, files outside the work dir) is
+never handed to another session. A container whose start is cancelled is
+stopped as well.
+"""
+
+import os
+import time
+import shutil
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_POOL_SIZE = int(os.getenv("EXECUTOR_POOL_SIZE", "2"))
+EXECUTOR_POOL_MAX = int(os.getenv("EXECUTOR_POOL_MAX", "8"))
+EXECUTOR_POOL_LEASE_TIMEOUT = float(os.getenv("EXECUTOR_POOL_LEASE_TIMEOUT", "120"))
+EXECUTOR_POOL_DIR = os.getenv("EXECUTOR_POOL_DIR", "./data/executors")
+
+
+def _docker_executor(work_dir: str):
+    from autogen_ext.code_executors.docker import DockerCommandLineCodeExecutor
+    return DockerCommandLineCodeExecutor(work_dir=work_dir)
+
+
+def _clear_dir(path: str):
+    for name in os.listdir(path):
+        child = os.path.join(path, name)
+        if os.path.isdir(child) and not os.path.islink(child):
+            shutil.rmtree(child, ignore_errors=True)
+        else:
+            try:
+                os.remove(child)
+            except FileNotFoundError:
+                pass
+
+
+@dataclass
+class _Pooled:
+    executor: Any
+    work_dir: str
+
+
+class ExecutorPool:
+    def __init__(
+        self,
+        size: int = EXECUTOR_POOL_SIZE,
+        max_total: int = EXECUTOR_POOL_MAX,
+        lease_timeout: float = EXECUTOR_POOL_LEASE_TIMEOUT,
+        root: str = EXECUTOR_POOL_DIR,
+        factory: Callable[[str], Any] = _docker_executor,
+    ):
+        self.size = max(0, size)
+        self.max_total = max(1, max_total, self.size)
+        self.lease_timeout = lease_timeout
+        self.root = root
+        self.factory = factory
+        self._idle: List[_Pooled] = []
+        self._leased: Dict[int, _Pooled] = {}
+        self._starting = 0
+        self._next_slot = 0
+        self._closed = False
+        self._available = asyncio.Condition()
+        self._background: set = set()
+        self._metrics = {
+            "hits": 0,
+            "misses": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "started": 0,
+            "start_failures": 0,
+            "recycled": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "total_start_seconds": 0.0,
+        }
+
+    @property
+    def total(self) -> int:
+        return len(self._idle) + len(self._leased) + self._starting
+
+    # ---- container lifecycle -------------------------------------------------
+    async def _start_one(self) -> _Pooled:
+        """Start a new executor; the caller has already counted it in ``_starting``."""
+        self._next_slot += 1
+        work_dir = os.path.abspath(os.path.join(self.root, f"executor-{os.getpid()}-{self._next_slot}"))
+        started = time.perf_counter()
+        executor = None
+        try:
+            await asyncio.to_thread(os.makedirs, work_dir, exist_ok=True)
+            await asyncio.to_thread(_clear_dir, work_dir)
+            executor = self.factory(work_dir)
+            await executor.start()
+        except BaseException as e:
+            if not isinstance(e, asyncio.CancelledError):
+                self._metrics["start_failures"] += 1
+            if executor is not None:
+                # a failed or cancelled start may have left the container running
+                await asyncio.shield(self._stop_one(_Pooled(executor=executor, work_dir=work_dir)))
+            else:
+                await asyncio.to_thread(shutil.rmtree, work_dir, True)
+            raise
+        finally:
+            self._starting -= 1
+        self._metrics["started"] += 1
+        self._metrics["total_start_seconds"] += time.perf_counter() - started
+        return _Pooled(executor=executor, work_dir=work_dir)
+
+    async def _stop_one(self, pooled: _Pooled, save_to: Optional[str] = None):
+        try:
+            await pooled.executor.stop()
+        except Exception as e:
+            logger.warning(f"Failed to stop pooled executor: {e}")
+        if save_to is not None:
+            try:
+                await asyncio.to_thread(shutil.copytree, pooled.work_dir, save_to, dirs_exist_ok=True)
+            except Exception as e:
+                logger.warning(f"Failed to copy executor work dir to {save_to}: {e}")
+        await asyncio.to_thread(shutil.rmtree, pooled.work_dir, True)
+
+    async def _warm_one(self):
+        try:
+            pooled = await self._start_one()
+        except Exception as e:
+            logger.warning(f"Failed to pre-start code executor: {e}")
+            async with self._available:
+                self._available.notify_all()
+            return
+        async with self._available:
+            if self._closed:
+                await self._stop_one(pooled)
+                return
+            self._idle.append(pooled)
+            self._available.notify_all()
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _refill(self):
+        """Start executors in the background until SIZE are idle or starting."""
+        while not self._closed and len(self._idle) + self._starting < self.size and self.total < self.max_total:
+            self._starting += 1
+            self._spawn(self._warm_one())
+
+    async def start(self):
+        """Begin warming the pool; does not wait for the containers."""
+        self._refill()
+
+    async def stop(self):
+        self._closed = True
+        for task in list(self._background):
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        pooled = self._idle + list(self._leased.values())
+        self._idle, self._leased = [], {}
+        await asyncio.gather(*(self._stop_one(p) for p in pooled))
+
+    # ---- leasing -------------------------------------------------------------
+    def _take(self) -> Any:
+        pooled = self._idle.pop()
+        self._leased[id(pooled.executor)] = pooled
+        return pooled.executor
+
+    async def acquire(self) -> Any:
+        """Lease a started executor with an empty work dir."""
+        if self._closed:
+            raise RuntimeError("Executor pool is closed.")
+        async with self._available:
+            if self._idle:
+                self._metrics["hits"] += 1
+                executor = self._take()
+                self._refill()
+                return executor
+            if self.total < self.max_total:
+                self._metrics["misses"] += 1
+                self._starting += 1
+                cold = True
+            else:
+                cold = False
+        if cold:
+            pooled = await self._start_one()
+            self._leased[id(pooled.executor)] = pooled
+            self._refill()
+            return pooled.executor
+        # at capacity: wait for a release (or for a warming executor)
+        self._metrics["waits"] += 1
+        started = time.perf_counter()
+        try:
+            async with self._available:
+                await asyncio.wait_for(self._available.wait_for(lambda: self._idle or self.total < self.max_total), self.lease_timeout)
+        except asyncio.TimeoutError:
+            self._metrics["timeouts"] += 1
+            raise TimeoutError(f"No code executor became available within {self.lease_timeout:.0f}s.")
+        finally:
+            waited = time.perf_counter() - started
+            self._metrics["total_wait_seconds"] += waited
+            self._metrics["max_wait_seconds"] = max(self._metrics["max_wait_seconds"], waited)
+        return await self.acquire()
+
+    async def release(self, executor: Any, save_to: Optional[str] = None):
+        """
+        Return a leased executor. Its container is stopped, never leased again, and
+        replaced by a fresh one in the background. The files in its work dir are
+        copied into ``save_to`` (if given) before the dir is removed.
+        """
+        pooled = self._leased.pop(id(executor), None)
+        if pooled is None:
+            return
+        self._metrics["recycled"] += 1
+        await self._stop_one(pooled, save_to=save_to)
+        async with self._available:
+            self._refill()
+            self._available.notify_all()
+
+    def stats(self) -> Dict:
+        leases = self._metrics["hits"] + self._metrics["misses"]
+        return {
+            **self._metrics,
+            "idle": len(self._idle),
+            "leased": len(self._leased),
+            "starting": self._starting,
+            "size": self.size,
+            "max_total": self.max_total,
+            "hit_rate": self._metrics["hits"] / leases if leases else 0.0,
+            "average_start_seconds": self._metrics["total_start_seconds"] / self._metrics["started"] if self._metrics["started"] else 0.0,
+        }
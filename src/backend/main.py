@@ -25,18 +25,30 @@ def setup_logging(logs_dir=None, log_file="server.log"):
 
 # File: main.py
 from providers.registry import PROVIDERS
-from fastapi import FastAPI, Depends, UploadFile, HTTPException, Query, File, Form
+from providers.http_pool import http_clients
+from providers.mcp_worker_pool import mcp_workers
+from providers.client_wrapper import response_cache, llm_flights
+from providers.concurrency_limiter import llm_limiters
+from providers.usage import SCOPES as USAGE_SCOPES, usage as llm_usage, bind as bind_usage, unbind as unbind_usage, message_usage
+from fastapi import FastAPI, Depends, UploadFile, HTTPException, Query, File, Form, Header
 from fastapi.middleware.cors import CORSMiddleware
 
 import schemas, crud
-from database import MongoDB
+from database import AsyncMongoDB
+from persistence import PersistenceWriter
+from blob_store import create_blob_store, extract_executor_image
+from event_log import create_event_log, MongoEventLog
+from run_scheduler import RunScheduler, SchedulerFull
+from session_registry import SessionRegistry
+from executor_pool import ExecutorPool
+from team_cache import TeamTemplateCache
 import os
 import uuid
 from contextlib import asynccontextmanager
 from fastapi.responses import StreamingResponse, Response
 import json, asyncio
 from ag_mo_helper import MagenticOneHelper
-from autogen_agentchat.messages import MultiModalMessage, TextMessage, ToolCallExecutionEvent, ToolCallRequestEvent, SelectSpeakerEvent, ToolCallSummaryMessage
+from autogen_agentchat.messages import MultiModalMessage, TextMessage, ToolCallExecutionEvent, ToolCallRequestEvent, SelectSpeakerEvent, ToolCallSummaryMessage, ModelClientStreamingChunkEvent
 from autogen_agentchat.base import TaskResult
 from ag_mo_helper import generate_session_name
 
@@ -44,7 +56,7 @@ import logging
 
 from datetime import datetime 
 from schemas import AutoGenMessage
-from typing import List
+from typing import List, Optional, TYPE_CHECKING
 import time
 
 import logging, os
@@ -74,11 +86,11 @@ load_dotenv()
 setup_logging()
 
 
-from llama_index.core.indices.base import BaseIndex
+# llama_index and chromadb load in the lifespan, not at import
+if TYPE_CHECKING:
+    from llama_index.core.indices.base import BaseIndex
 rag_index: BaseIndex | None = None
 llama_agent = None
-from providers.llamaindex_provider import build_index_and_persist
-session_data = {}
 MAGENTIC_ONE_DEFAULT_AGENTS = [
             {
             "input_key":"0001",
@@ -118,7 +130,34 @@ import os
 # Lifespan handler for startup/shutdown events
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    app.state.db = MongoDB()
+    app.state.db = AsyncMongoDB()
+    try:
+        await app.state.db.ensure_indexes()
+    except Exception as e:
+        logging.getLogger("lifespan").warning(f"Failed to create MongoDB indexes: {str(e)}")
+    # rebuild the conversation sidecar index before serving listings
+    crud.load_index()
+    app.state.blobs = create_blob_store(app.state.db)
+    app.state.db.blob_store = app.state.blobs
+    app.state.persistence = PersistenceWriter(db=app.state.db)
+    await app.state.persistence.start()
+    app.state.event_log = create_event_log(app.state.db)
+    if isinstance(app.state.event_log, MongoEventLog):
+        await app.state.event_log.ensure_indexes()
+    # runs are queued and started in the background; they outlive the /chat-stream requests that started them
+    app.state.scheduler = RunScheduler()
+    app.state.sessions = SessionRegistry()
+    # warm Docker code executors in the background so runs skip the container cold start
+    app.state.executor_pool = ExecutorPool()
+    await app.state.executor_pool.start()
+    app.state.team_cache = TeamTemplateCache()
+    # keep-alive HTTP clients shared by the providers, one per origin
+    app.state.http_clients = http_clients
+    # mcp_server.py tool workers, started on the first tool call
+    app.state.mcp_workers = mcp_workers
+    # token usage per agent, session, user and team; flushed to DyoPods_usage in the background
+    app.state.usage = llm_usage
+    await app.state.usage.start(app.state.db)
 
     global rag_index
     from providers.llamaindex_provider import build_index_and_persist, load_index_from_chroma
@@ -141,6 +180,17 @@ async def lifespan(app: FastAPI):
     # Removed logging.basicConfig here (already done in setup_logging)
     # print("Database initialized.")
     yield
+    await app.state.scheduler.stop()
+    await app.state.executor_pool.stop()
+    await app.state.http_clients.aclose()
+    await app.state.mcp_workers.stop()
+    await app.state.team_cache.aclose()
+    await PROVIDERS.aclose()
+    response_cache.close()
+    await app.state.usage.stop()
+    # flush queued events before the database goes away
+    await app.state.persistence.stop()
+    await app.state.db.close()
     app.state.db = None
 
 app = FastAPI(lifespan=lifespan)
@@ -234,7 +284,9 @@ async def display_log_message(log_entry, logs_dir, session_id, user_id, conversa
         _response.source = "TaskResult"
         _response.content = _log_entry_json.messages[-1].content
         _response.stop_reason = _log_entry_json.stop_reason
-        app.state.db.store_conversation(_log_entry_json, _response, conversation)
+        # the whole run, broken down by agent, including the orchestrator's own calls
+        _response.models_usage = llm_usage.session(session_id)
+        await app.state.persistence.store_conversation(_log_entry_json, _response, conversation)
 
     elif isinstance(_log_entry_json, MultiModalMessage):
         _response.type = _log_entry_json.type
@@ -248,28 +300,7 @@ async def display_log_message(log_entry, logs_dir, session_id, user_id, conversa
         _response.content = _log_entry_json.content
         # Custom logic for Executor with base64 image
         if _log_entry_json.source == "Executor":
-            import ast
-            import re
-            content = _log_entry_json.content
-            try:
-                if isinstance(content, str) and "'type': 'image'" in content and "'base64_data':" in content:
-                    pattern = r"\{[^{}]*'type': 'image'[^{}]*'base64_data':[^{}]*\}"
-                    match = re.search(pattern, content)
-                    if match:
-                        img_dict_str = match.group(0)
-                        img_dict = ast.literal_eval(img_dict_str)
-                        if (
-                            isinstance(img_dict, dict)
-                            and img_dict.get('type') == 'image'
-                            and img_dict.get('format') == 'png'
-                            and 'base64_data' in img_dict
-                        ):
-                            _response.content_image = f"data:image/png;base64,{img_dict['base64_data']}"
-                            # Remove the dict substring from the content
-                            cleaned_content = content.replace(img_dict_str, "").strip()
-                            _response.content = cleaned_content
-            except Exception:
-                pass
+            _response.content, _response.content_image = extract_executor_image(_log_entry_json.content)
 
     elif isinstance(_log_entry_json, ToolCallExecutionEvent):
         _response.type = _log_entry_json.type
@@ -296,14 +327,17 @@ async def display_log_message(log_entry, logs_dir, session_id, user_id, conversa
         _response.source = "N/A"
         _response.content = "Agents mumbling."
 
-    _ = crud.save_message(
-            id=None, # it is auto-generated
+    if _response.models_usage is None:
+        _response.models_usage = message_usage(_log_entry_json)
+
+    # images are stored once by hash; the file, Mongo and SSE frames only carry the reference
+    _response.content_image = await app.state.blobs.offload(_response.content_image)
+
+    # written behind by the persistence writer so the stream never waits on disk
+    await app.state.persistence.save_message(
             user_id=_user_id,
             session_id=session_id,
-            message=_response.to_json(),
-            agents=None,
-            run_mode_locally=None,
-            timestamp=_response.time
+            message=_response.to_json()
         )
 
     return _response
@@ -321,10 +355,11 @@ async def chat_endpoint(
     # ...existing code...
     mock_response = "This is a mock AI response (Markdown formatted)."
     # Log the user message.
-    crud.save_message(
+    await app.state.persistence.save_message(
         user_id=user["sub"],
         session_id="session_direct",  # or generate a session id if needed
-        message={"content": message.content, "role": "user"}
+        message={"content": message.content, "role": "user"},
+        header=crud.conversation_header()
     )
     # Log the AI response message.
     response = {
@@ -336,10 +371,11 @@ async def chat_endpoint(
         "models_usage": None,
         "content_image": None,
     }
-    crud.save_message(
+    await app.state.persistence.save_message(
         user_id=user["sub"],
         session_id="session_direct",
-        message=response
+        message=response,
+        header=crud.conversation_header()
     )
 
     return Response(content=json.dumps(response), media_type="application/json")
@@ -377,18 +413,32 @@ async def chat_endpoint(
         except Exception as e:
             logger.warning(f"[MCP TOOL LOAD FAILED] {str(e)}")
 
-    client = provider.get_client(model=model_name)
+    # builds (or reuses) the client now, so a bad provider/model fails the request
+    await PROVIDERS.client_for(provider_name, model_name)
 
-    conversation = crud.save_message(
-        id=uuid.uuid4(),
+    # written through the persistence queue, but awaited: /chat-stream reads the file next
+    await app.state.persistence.write_message(
         user_id=_user_id,
         session_id=_session_id,
         message={"content": message.content, "role": "user"},
-        agents=_agents,
-        run_mode_locally=False,
-        timestamp=get_current_time()
+        header=crud.conversation_header(
+            id=uuid.uuid4(),
+            agents=_agents,
+            run_mode_locally=False,
+            timestamp=get_current_time(),
+            team_id=message.team_id
+        )
     )
 
+    if app.state.db.incremental:
+        await app.state.persistence.start_conversation(
+            user_id=_user_id,
+            session_id=_session_id,
+            agents=_agents,
+            message={"content": message.content, "role": "user"},
+            timestamp=get_current_time()
+        )
+
     logger.info(f"Conversation saved with session_id: {_session_id} and user_id: {_user_id}")
     # Return session_id as the conversation identifier
     db_message = schemas.ChatMessageResponse(
@@ -402,25 +452,37 @@ async def chat_endpoint(
     return db_message
 
 
-# Streaming Chat Endpoint
-@app.get("/chat-stream")
-async def chat_stream(
-    session_id: str = Query(...),
-    user_id: str = Query(...),
-    # db: Session = Depends(get_db),
-    user: dict = Depends(validate_token)
-):
+# grace period after max_time before a run that ignored its termination condition is cancelled
+RUN_CANCEL_GRACE = float(os.getenv("RUN_CANCEL_GRACE", "30"))
+
+async def publish_run_end(session_id: str, user_id: str, type: str, content: str, stop_reason: str):
+    """Persist and publish the last event of a run that did not end with a TaskResult."""
+    message = AutoGenMessage(
+        time=get_current_time(),
+        type=type,
+        source="DyoPodOrchestrator",
+        content=content,
+        stop_reason=stop_reason,
+        models_usage=llm_usage.session(session_id),
+        session_id=session_id,
+        session_user=user_id
+    )
+    await app.state.persistence.save_message(user_id=user_id, session_id=session_id, message=message.to_json())
+    await app.state.event_log.publish(session_id, message.to_json())
+
+async def run_session(session_id: str, user_id: str, conversation: dict, provider_name: str, provider, model_name: str):
+    """
+    Run the team of a session and publish every event to its event log.
+    Runs as a background task, independent of the /chat-stream connections watching it.
+    """
     logger = logging.getLogger("chat_stream")
-    logger.setLevel(logging.WARNING)
-    logger.info(f"Chat stream started for session_id: {session_id} and user_id: {user_id}")
+    event_log = app.state.event_log
+    sessions = app.state.sessions
     # create folder for logs if not exists
     logs_dir = "./logs"
     if not os.path.exists(logs_dir):
         os.makedirs(logs_dir)
 
-    # get the conversation from the database using user and session id
-    conversation = crud.get_conversation(user_id, session_id)
-    logger.info(f"Conversation retrieved: {conversation}")
     # get first message from the conversation
     first_message = conversation["messages"][0]
     # get the task from the first message as content
@@ -430,34 +492,57 @@ async def chat_stream(
     _run_locally = conversation["run_mode_locally"]
     _agents = conversation["agents"]
 
-    # Provider/model selection for chat stream
-    provider_name = conversation.get("provider", os.getenv("DEFAULT_PROVIDER", "docker"))
-    model_name = conversation.get("model", os.getenv("DEFAULT_MODEL", "ai/mistral"))
-    provider = PROVIDERS.get(provider_name)
-    if not provider:
-        raise HTTPException(status_code=400, detail=f"Provider '{provider_name}' not supported")
-    client = provider.get_client(model=model_name)
-
-    #  Initialize the MagenticOne system with user_id
-    magentic_one = MagenticOneHelper(
-        logs_dir=logs_dir,
-        save_screenshots=False,
-        run_locally=_run_locally,
-        user_id=user_id,
-        client=client
-    )
-    logger.info(f"Initializing MagenticOne with agents: {len(_agents)} and session_id: {session_id} and user_id: {user_id}")
-    await magentic_one.initialize(agents=_agents, session_id=session_id)
-    logger.info(f"Initialized MagenticOne with agents: {len(_agents)} and session_id: {session_id} and user_id: {user_id}")
+    tracer = trace.get_tracer("autogen-agentchat")
+    magentic_one = None
+    watchdog = None
+    client_acquired = False
+    template = None
+    state, error_message = "finished", None
+    # every model call of the run (and of the tasks the team starts) is charged to this session;
+    # fresh labels, so nothing is inherited from the run whose end started this one
+    usage_labels = bind_usage(fresh=True, session=session_id, user=user_id, team=conversation.get("team_id"))
+    try:
+        client = await PROVIDERS.acquire_client(provider_name, model_name)
+        client_acquired = True
+        template = await app.state.team_cache.acquire(_agents, provider_name, model_name)
+
+        #  Initialize the MagenticOne system with user_id
+        magentic_one = MagenticOneHelper(
+            logs_dir=logs_dir,
+            save_screenshots=False,
+            run_locally=_run_locally,
+            user_id=user_id,
+            client=client,
+            executor_pool=app.state.executor_pool,
+            template=template
+        )
+        sessions.started(session_id, task=asyncio.current_task(), max_time=magentic_one.max_time)
+        # the team stops itself at max_time; this catches runs stuck inside a call
+        watchdog = asyncio.get_running_loop().call_later(
+            magentic_one.max_time + RUN_CANCEL_GRACE, sessions.cancel, session_id, "timeout"
+        )
+        logger.info(f"Initializing MagenticOne with agents: {len(_agents)} and session_id: {session_id} and user_id: {user_id}")
+        await magentic_one.initialize(agents=_agents, session_id=session_id)
+        logger.info(f"Initialized MagenticOne with agents: {len(_agents)} and session_id: {session_id} and user_id: {user_id}")
 
-    stream, cancellation_token = magentic_one.main(task=task)
-    logger.info(f"Stream and cancellation token created for task: {task}")
+        stream, cancellation_token = magentic_one.main(task=task)
+        sessions.attach(session_id, helper=magentic_one, team=magentic_one.team, cancellation_token=cancellation_token)
+        logger.info(f"Stream and cancellation token created for task: {task}")
 
-    tracer = trace.get_tracer("autogen-agentchat")
-    # Wrap the team execution logic in a tracing span
-    async def event_generator(stream, conversation):
+        # Wrap the team execution logic in a tracing span
         with tracer.start_as_current_span("run_agentchat"):
             async for log_entry in stream:
+                if isinstance(log_entry, ModelClientStreamingChunkEvent):
+                    # token delta of a message still being generated: live only, never persisted;
+                    # the complete message follows and replaces the deltas in the browser
+                    await event_log.publish_partial(session_id, {
+                        "type": log_entry.type,
+                        "source": log_entry.source,
+                        "content": log_entry.content,
+                        "session_id": session_id,
+                        "partial": True
+                    })
+                    continue
                 if isinstance(log_entry, ToolCallRequestEvent):
                     logger.warning(f"[TOOL CALL REQUEST] Tool: {log_entry.content[0].name}, Args: {log_entry.content[0].arguments}")
                 elif isinstance(log_entry, ToolCallExecutionEvent):
@@ -469,51 +554,179 @@ async def chat_stream(
                     conversation=conversation,
                     user_id=user_id
                 )
-                yield f"data: {json.dumps(json_response.to_json())}\n\n"
+                await event_log.publish(session_id, json_response.to_json())
+    except asyncio.CancelledError:
+        # /stop, the max_time watchdog or shutdown
+        record = sessions.get(session_id)
+        reason = record.cancel_reason if record is not None and record.cancel_reason else "cancelled"
+        state = "timed_out" if reason == "timeout" else "cancelled"
+        logger.warning(f"Run of session {session_id} cancelled: {reason}")
+        await publish_run_end(session_id, user_id, "Cancelled", f"Run cancelled: {reason}", reason)
+        raise
+    except Exception as e:
+        logger.error(f"Run of session {session_id} failed: {str(e)}")
+        state, error_message = "failed", str(e)
+        await publish_run_end(session_id, user_id, "Error", f"Run failed: {str(e)}", "error")
+    finally:
+        if watchdog is not None:
+            watchdog.cancel()
+        if magentic_one is not None:
+            # stop the Docker executors whether the run finished, failed or was cancelled
+            await magentic_one.close()
+        if template is not None:
+            await app.state.team_cache.release(template)
+        if client_acquired:
+            PROVIDERS.release_client(provider_name, model_name)
+        sessions.finish(session_id, state, error=error_message)
+        await event_log.close(session_id)
+        unbind_usage(usage_labels)
+
+async def stream_session_events(session_id: str, conversation: dict, after: int):
+    """SSE frames of a session from event `after` onwards: replay, then live tail."""
+    event_log = app.state.event_log
+    yield "retry: 3000\n\n"
+    if await event_log.exists(session_id):
+        async for item in event_log.subscribe(session_id, after=after):
+            if item is None:
+                status = app.state.scheduler.status(session_id)
+                if status is not None and status["state"] == "queued":
+                    yield f": queued position={status['position']}\n\n"
+                else:
+                    yield ": keep-alive\n\n"
+                continue
+            seq, event = item
+            if seq is None:
+                # partial event: no id, so a reconnect resumes from the last complete one
+                yield f"data: {json.dumps(event)}\n\n"
+            else:
+                yield f"id: {seq}\ndata: {json.dumps(event)}\n\n"
+    else:
+        # the log is gone (evicted, or the run finished before a restart): replay what was persisted
+        for seq, message in enumerate(conversation["messages"][after + 1:], start=after + 1):
+            yield f"id: {seq}\ndata: {json.dumps(message)}\n\n"
 
-    return StreamingResponse(event_generator(stream, conversation), media_type="text/event-stream")
+# Streaming Chat Endpoint
+@app.get("/chat-stream")
+async def chat_stream(
+    session_id: str = Query(...),
+    user_id: str = Query(...),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    # db: Session = Depends(get_db),
+    user: dict = Depends(validate_token)
+):
+    logger = logging.getLogger("chat_stream")
+    logger.setLevel(logging.WARNING)
+    logger.info(f"Chat stream started for session_id: {session_id} and user_id: {user_id}")
+
+    # get the conversation from the database using user and session id
+    # off the event loop: a slow disk must not stall the other SSE clients
+    conversation = await asyncio.to_thread(crud.get_conversation, user_id, session_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail=f"Session '{session_id}' not found")
+    logger.info(f"Conversation retrieved: {conversation}")
+
+    # EventSource sends Last-Event-ID on reconnect; resume after it instead of re-running the task
+    after = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+
+    # only a conversation holding just the task has never been started
+    scheduler = app.state.scheduler
+    if scheduler.get(session_id) is None and len(conversation["messages"]) == 1 and not await app.state.event_log.exists(session_id):
+        # Provider/model selection for chat stream
+        provider_name = conversation.get("provider", os.getenv("DEFAULT_PROVIDER", "docker"))
+        model_name = conversation.get("model", os.getenv("DEFAULT_MODEL", "ai/mistral"))
+        provider = PROVIDERS.get(provider_name)
+        if not provider:
+            raise HTTPException(status_code=400, detail=f"Provider '{provider_name}' not supported")
+        if scheduler.get(session_id) is None:
+            try:
+                # starts right away when the global, per-user and per-provider limits allow it
+                app.state.sessions.register(session_id, user_id, provider_name, model=model_name)
+                scheduler.submit(
+                    session_id=session_id,
+                    user_id=user_id,
+                    provider=provider_name,
+                    factory=lambda: run_session(session_id, user_id, conversation, provider_name, provider, model_name)
+                )
+            except SchedulerFull as e:
+                app.state.sessions.finish(session_id, "rejected", error=str(e))
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+            await app.state.event_log.open(session_id, first_seq=1)
+
+    return StreamingResponse(stream_session_events(session_id, conversation, after), media_type="text/event-stream")
 
 @app.get("/stop")
 async def stop(session_id: str = Query(...)):
     logger = logging.getLogger("stop")
     try:
         logger.info(f"Stopping session: {session_id}")
-        cancellation_token = session_data[session_id].get("cancellation_token")
-        if (cancellation_token):
-            cancellation_token.cancel()
-            return {"status": "success", "message": f"Session {session_id} cancelled successfully."}
-        else:
-            return {"status": "error", "message": "Cancellation token not found."}
+        record = app.state.sessions.get(session_id)
+        if record is None or not record.active:
+            return {"status": "error", "message": f"Session {session_id} is not running."}
+        if record.state == "queued":
+            # never started: nothing to tear down but the queue entry and the event log
+            app.state.scheduler.cancel(session_id)
+            record.cancel_reason = "cancelled"
+            await publish_run_end(session_id, record.user_id, "Cancelled", "Run cancelled before it started.", "cancelled")
+            app.state.sessions.finish(session_id, "cancelled")
+            await app.state.event_log.close(session_id)
+        elif not app.state.sessions.cancel(session_id, "cancelled"):
+            return {"status": "error", "message": f"Session {session_id} is already stopping."}
+        return {"status": "success", "message": f"Session {session_id} cancelled successfully."}
     except Exception as e:
         logger.error(f"Error stopping session {session_id}: {str(e)}")
         return {"status": "error", "message": f"Error stopping session: {str(e)}"}
 
+@app.get("/sessions")
+async def list_sessions(user_id: Optional[str] = Query(None), active_only: bool = Query(False)):
+    """Runs known to this process: active ones and those finished within the retention window."""
+    sessions = []
+    for record in app.state.sessions.list(user_id=user_id, active_only=active_only):
+        entry = record.to_json()
+        if record.state == "queued":
+            status = app.state.scheduler.status(record.session_id)
+            entry["queue_position"] = status["position"] if status else None
+        sessions.append(entry)
+    return {"sessions": sessions}
+
 # New endpoint to retrieve all conversations with pagination.
 @app.post("/conversations")
 async def list_all_conversations(
     request_data: dict,
     user: dict = Depends(validate_token)
     ):
+    page = request_data.get("page", 1)
+    page_size = request_data.get("page_size", 20)
     try:
-        user_id = request_data.get("user_id")
-        page = request_data.get("page", 1)
-        page_size = request_data.get("page_size", 20)
-        conversations = app.state.db.fetch_user_conversations(
+        conversations = await app.state.db.fetch_user_conversations(
             user_id=None, 
             page=page, 
-            page_size=page_size
+            page_size=page_size,
+            before=request_data.get("before"),
+            count_mode=request_data.get("count_mode", "exact")
         )
         return conversations
     except Exception as e:
         logging.getLogger("conversations").error(f"Error retrieving conversations: {str(e)}")
-        return {"conversations": [], "total_count": 0, "page": 1, "total_pages": 1}
+        # the local conversation files are always written; list them from the sidecar index
+        return crud.list_conversations(user_id=None, page=page, page_size=page_size)
 
 # New endpoint to retrieve conversations for the authenticated user.
 @app.post("/conversations/user")
 async def list_user_conversation(request_data: dict = None, user: dict = Depends(validate_token)):
-    session_id = request_data.get("session_id") if request_data else None
-    user_id = request_data.get("user_id") if request_data else None
-    conversations = app.state.db.fetch_user_conversations(user_id, session_id=session_id)
+    request_data = request_data or {}
+    session_id = request_data.get("session_id")
+    user_id = request_data.get("user_id")
+    if session_id:
+        # one conversation with its messages, as a list (the history dialog reads the first item)
+        conversation = await app.state.db.fetch_user_conversation(user_id, session_id)
+        return [conversation] if conversation else []
+    conversations = await app.state.db.fetch_user_conversations(
+        user_id=user_id,
+        page=request_data.get("page", 1),
+        page_size=request_data.get("page_size", 20),
+        before=request_data.get("before"),
+        count_mode=request_data.get("count_mode", "exact")
+    )
     return conversations
 
 @app.post("/conversations/delete")
@@ -523,7 +736,7 @@ async def delete_conversation(session_id: str = Query(...), user_id: str = Query
     logger.info(f"Deleting conversation with session_id: {session_id} for user_id: {user_id}")
     try:
         # result = crud.delete_conversation(user["sub"], session_id)
-        result = app.state.db.delete_user_conversation(user_id=user_id, session_id=session_id)
+        result = await app.state.db.delete_user_conversation(user_id=user_id, session_id=session_id)
         if result:
             logger.info(f"Conversation {session_id} deleted successfully.")
             return {"status": "success", "message": f"Conversation {session_id} deleted successfully."}
@@ -534,6 +747,86 @@ async def delete_conversation(session_id: str = Query(...), user_id: str = Query
         logger.error(f"Error deleting conversation {session_id}: {str(e)}")
         return {"status": "error", "message": f"Error deleting conversation: {str(e)}"}
     
+@app.get("/blobs/{blob_hash}")
+async def get_blob(blob_hash: str):
+    blob = await app.state.blobs.get(blob_hash)
+    if blob is None:
+        raise HTTPException(status_code=404, detail="Blob not found")
+    data, content_type = blob
+    # content-addressed, so the bytes behind a hash never change
+    return Response(content=data, media_type=content_type, headers={"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"{blob_hash}"'})
+
+@app.get("/runs")
+async def list_runs():
+    """Running and queued sessions with their queue positions."""
+    return {"runs": app.state.scheduler.queue(), "stats": app.state.scheduler.stats()}
+
+@app.get("/runs/status")
+async def run_status(session_id: str = Query(...)):
+    status = app.state.scheduler.status(session_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Session '{session_id}' is not queued or running")
+    return status
+
+@app.get("/http/stats")
+async def http_pool_stats():
+    return app.state.http_clients.stats()
+
+@app.get("/providers/stats")
+async def provider_stats():
+    return PROVIDERS.stats()
+
+@app.get("/llm/cache/stats")
+async def llm_cache_stats():
+    return {**response_cache.stats(), "single_flight": llm_flights.stats()}
+
+@app.get("/llm/limits")
+async def llm_limits():
+    return llm_limiters.stats()
+
+@app.get("/usage")
+async def get_usage(
+    scope: Optional[str] = Query(None),
+    key: Optional[str] = Query(None),
+    history: bool = Query(False),
+    since: Optional[str] = Query(None)
+):
+    """
+    Model usage per agent, session, user and team: totals since startup, or with
+    history=true the daily totals stored in DyoPods_usage (``since`` is YYYY-MM-DD).
+    """
+    if scope is not None and scope not in USAGE_SCOPES:
+        raise HTTPException(status_code=400, detail=f"scope must be one of {', '.join(USAGE_SCOPES)}")
+    if not history:
+        return {"usage": app.state.usage.report(scope, key), "stats": app.state.usage.stats()}
+    if scope is None:
+        raise HTTPException(status_code=400, detail="history=true needs a scope")
+    # include what is still pending in memory
+    await app.state.usage.flush()
+    return {"scope": scope, "key": key, "usage": await app.state.db.fetch_usage(scope, key, since=since)}
+
+@app.get("/router/stats")
+async def router_stats():
+    if "router" not in PROVIDERS.stats()["built"]:
+        return {"built": False}
+    return PROVIDERS.get("router").stats()
+
+@app.get("/mcp/workers/stats")
+async def mcp_worker_stats():
+    return app.state.mcp_workers.stats()
+
+@app.get("/teams/cache/stats")
+async def team_cache_stats():
+    return app.state.team_cache.stats()
+
+@app.get("/executors/stats")
+async def executor_pool_stats():
+    return app.state.executor_pool.stats()
+
+@app.get("/persistence/stats")
+async def persistence_stats():
+    return app.state.persistence.stats()
+
 @app.get("/health")
 async def health_check():
     logger = logging.getLogger("health_check")
@@ -564,7 +857,7 @@ from fastapi import HTTPException
 @app.get("/teams")
 async def get_teams_api():
     try:
-        teams = app.state.db.get_teams()
+        teams = await app.state.db.get_teams()
         # teams= []
         return teams
     except Exception as e:
@@ -573,7 +866,7 @@ async def get_teams_api():
 @app.get("/teams/{team_id}")
 async def get_team_api(team_id: str):
     try:
-        team = app.state.db.get_team(team_id)
+        team = await app.state.db.get_team(team_id)
         if not team:
             raise HTTPException(status_code=404, detail="Team not found")
         return team
@@ -584,17 +877,26 @@ async def get_team_api(team_id: str):
 async def create_team_api(team: dict):
     try:
         team["agents"] = MAGENTIC_ONE_DEFAULT_AGENTS
-        response = app.state.db.create_team(team)
+        response = await app.state.db.create_team(team)
         return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating team: {str(e)}")
 
+async def invalidate_team_templates(*teams):
+    """Drop cached agent templates built from these team definitions."""
+    for team in teams:
+        if isinstance(team, dict) and team.get("agents"):
+            await app.state.team_cache.invalidate_agents(team["agents"])
+
 @app.put("/teams/{team_id}")
 async def update_team_api(team_id: str, team: dict):
     logger = logging.getLogger("update_team_api")
     logger.info(f"Updating team with ID: {team_id} and data: {team}")
     try:
-        response = app.state.db.update_team(team_id, team)
+        previous = await app.state.db.get_team(team_id)
+        response = await app.state.db.update_team(team_id, team)
+        if "error" not in response:
+            await invalidate_team_templates(previous, team)
         if "error" in response:
             logger.error(f"Error updating team: {response['error']}")
             raise HTTPException(status_code=404, detail=response["error"])
@@ -606,7 +908,10 @@ async def update_team_api(team_id: str, team: dict):
 @app.delete("/teams/{team_id}")
 async def delete_team_api(team_id: str):
     try:
-        response = app.state.db.delete_team(team_id)
+        previous = await app.state.db.get_team(team_id)
+        response = await app.state.db.delete_team(team_id)
+        if "error" not in response:
+            await invalidate_team_templates(previous)
         if "error" in response:
             raise HTTPException(status_code=404, detail=response["error"])
         return response
@@ -618,7 +923,7 @@ async def delete_team_api(team_id: str):
 async def initialize_teams_api():
     try:
         # Initialize the teams in the database
-        msg = app.state.db.initialize_teams()
+        msg = await app.state.db.initialize_teams()
         msg = "DUMMY: Teams initialized successfully."
         return {"status": "success", "message": msg}
     except Exception as e:
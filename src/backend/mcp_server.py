@@ -1,9 +1,12 @@
 # mcp_server.py
 
 import os
+import sys
 import json
 import logging
 import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from fastmcp import FastMCP
 from azure.communication.email import EmailClient
 from azure.identity import DefaultAzureCredential
@@ -91,6 +94,78 @@ def find_file(filename: str) -> str:
             return os.path.join(root, filename)
     return None
 
+# === stdio worker ===
+MCP_WORKER_THREADS = int(os.getenv("MCP_WORKER_THREADS", "4"))
+
+
+def call_tool(tool_name: str, args: dict):
+    tool = next((t for t in mcp.list_tools() if t.name == tool_name), None)
+    if tool is None:
+        raise LookupError(f"Tool '{tool_name}' not found")
+    sig = inspect.signature(tool.fn)
+    kwargs = {k: v for k, v in args.items() if k in sig.parameters}
+    return tool.fn(**kwargs)
+
+
+def serve_stdio():
+    """
+    Serve tool calls as newline-delimited JSON-RPC over stdin/stdout until stdin closes.
+
+    Requests: {"jsonrpc": "2.0", "id": 1, "method": "call_tool", "params": {"tool": "add", "args": {...}}}
+    and "ping" for health checks. Calls run on a thread pool and are answered as they
+    complete, matched by id. A bare {"tool": ..., "args": ...} line (the one-shot format)
+    is still answered with {"result": ...} / {"error": ...}.
+    """
+    out = sys.stdout
+    # stdout carries the protocol; anything tools print goes to stderr
+    sys.stdout = sys.stderr
+    write_lock = threading.Lock()
+
+    def send(message: dict):
+        line = json.dumps(message, default=str)
+        with write_lock:
+            out.write(line + "\n")
+            out.flush()
+
+    def handle(request: dict):
+        if "method" not in request:
+            try:
+                send({"result": call_tool(request["tool"], request.get("args", {}))})
+            except Exception as e:
+                send({"error": str(e)})
+            return
+        request_id = request.get("id")
+        params = request.get("params") or {}
+        try:
+            if request["method"] == "call_tool":
+                result = call_tool(params["tool"], params.get("args") or {})
+            elif request["method"] == "list_tools":
+                result = [t.name for t in mcp.list_tools()]
+            else:
+                send({"jsonrpc": "2.0", "id": request_id, "error": {"code": -32601, "message": f"Unknown method '{request['method']}'"}})
+                return
+            send({"jsonrpc": "2.0", "id": request_id, "result": result})
+        except Exception as e:
+            logger.error(f"Tool call failed: {e}")
+            send({"jsonrpc": "2.0", "id": request_id, "error": {"code": -32000, "message": str(e)}})
+
+    with ThreadPoolExecutor(max_workers=MCP_WORKER_THREADS) as pool:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                send({"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": f"Parse error: {e}"}})
+                continue
+            if request.get("method") == "ping":
+                # answered inline: a worker whose reader loop is alive is healthy
+                send({"jsonrpc": "2.0", "id": request.get("id"), "result": "pong"})
+                continue
+            pool.submit(handle, request)
+
+
 if __name__ == "__main__":
     transport = os.getenv("MCP_TRANSPORT", "stdio")  # stdio or sse
     logger.info(f"Starting MCP server with transport: {transport}")
@@ -99,21 +174,6 @@ if __name__ == "__main__":
         logger.info(f"- {tool.name}")
 
     if transport == "stdio":
-        try:
-            input_json = input()
-            request = json.loads(input_json)
-            tool_name = request["tool"]
-            args = request.get("args", {})
-
-            tool = next((t for t in mcp.list_tools() if t.name == tool_name), None)
-            if tool is None:
-                print(json.dumps({"error": f"Tool '{tool_name}' not found"}))
-            else:
-                sig = inspect.signature(tool.fn)
-                kwargs = {k: v for k, v in args.items() if k in sig.parameters}
-                result = tool.fn(**kwargs)
-                print(json.dumps({"result": result}))
-        except Exception as e:
-            print(json.dumps({"error": str(e)}))
+        serve_stdio()
     else:
-        mcp.run(transport=transport)
\ No newline at end of file
+        mcp.run(transport=transport)
@@ -0,0 +1,224 @@
+# File: persistence.py
+"""
+Write-behind persistence for the /chat-stream event loop.
+
+``display_log_message`` used to write every event to disk and Mongo inline,
+so one slow write stalled every SSE client sharing the event loop. Events are
+now put on a bounded asyncio queue and a single background writer flushes
+them in batches (messages grouped per conversation file, one thread hop per
+batch). When the queue is full producers wait, which is the backpressure
+signal surfaced in ``stats()``. With an incremental MongoDB backend the same
+batches are pushed to Mongo as the run streams.
+
+A failed write is retried PERSISTENCE_RETRIES times with exponential backoff
+from PERSISTENCE_RETRY_DELAY seconds. The writes of a batch are retried one by
+one, so the ones that already went through are not repeated; the items of a
+write that still fails are counted as ``dropped``.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import crud
+
+logger = logging.getLogger(__name__)
+
+PERSISTENCE_QUEUE_SIZE = int(os.getenv("PERSISTENCE_QUEUE_SIZE", "10000"))
+PERSISTENCE_BATCH_SIZE = int(os.getenv("PERSISTENCE_BATCH_SIZE", "256"))
+PERSISTENCE_SHUTDOWN_TIMEOUT = float(os.getenv("PERSISTENCE_SHUTDOWN_TIMEOUT", "30"))
+PERSISTENCE_RETRIES = int(os.getenv("PERSISTENCE_RETRIES", "3"))
+PERSISTENCE_RETRY_DELAY = float(os.getenv("PERSISTENCE_RETRY_DELAY", "0.5"))
+
+
+class PersistenceWriter:
+    def __init__(
+        self,
+        db: Any = None,
+        max_queue: int = PERSISTENCE_QUEUE_SIZE,
+        batch_size: int = PERSISTENCE_BATCH_SIZE,
+        shutdown_timeout: float = PERSISTENCE_SHUTDOWN_TIMEOUT,
+        retries: int = PERSISTENCE_RETRIES,
+        retry_delay: float = PERSISTENCE_RETRY_DELAY,
+    ):
+        self.db = db
+        self.batch_size = max(1, batch_size)
+        self.shutdown_timeout = shutdown_timeout
+        self.retries = max(0, retries)
+        self.retry_delay = retry_delay
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self._metrics = {
+            "enqueued": 0,
+            "messages_written": 0,
+            "conversations_written": 0,
+            "batches": 0,
+            "failures": 0,
+            "dropped": 0,
+            "max_queue_depth": 0,
+            "blocked_puts": 0,
+            "blocked_seconds": 0.0,
+            "last_batch_seconds": 0.0,
+            "max_batch_seconds": 0.0,
+        }
+
+    # ---- lifecycle -----------------------------------------------------------
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="persistence-writer")
+
+    async def stop(self):
+        """Flush whatever is queued, then stop the writer."""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Persistence queue not drained on shutdown; {self.queue.qsize()} items dropped.")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await asyncio.to_thread(crud.store.flush)
+
+    # ---- producers -----------------------------------------------------------
+    async def _put(self, item: Tuple):
+        if self.queue.full():
+            started = time.perf_counter()
+            await self.queue.put(item)
+            self._metrics["blocked_puts"] += 1
+            self._metrics["blocked_seconds"] += time.perf_counter() - started
+        else:
+            self.queue.put_nowait(item)
+        self._metrics["enqueued"] += 1
+        self._metrics["max_queue_depth"] = max(self._metrics["max_queue_depth"], self.queue.qsize())
+
+    async def save_message(self, user_id: str, session_id: str, message: dict, header: Optional[dict] = None):
+        """Queue a message for the conversation file (``header``: see ``crud.conversation_header``)."""
+        await self._put(("message", user_id, session_id, message, header, None))
+
+    async def write_message(self, user_id: str, session_id: str, message: dict, header: Optional[dict] = None):
+        """Like ``save_message``, and wait until the message is in the conversation file."""
+        written = asyncio.get_running_loop().create_future()
+        await self._put(("message", user_id, session_id, message, header, written))
+        await written
+
+    async def start_conversation(self, user_id: str, session_id: str, agents: list, message: dict, timestamp: str):
+        """Queue the creation of the session document (incremental MongoDB only)."""
+        await self._put(("start", user_id, session_id, agents, message, timestamp))
+
+    async def store_conversation(self, task_result: Any, response: Any, conversation: dict):
+        """Queue a finished run for MongoDB."""
+        await self._put(("conversation", task_result, response, conversation))
+
+    # ---- writer --------------------------------------------------------------
+    async def _next_batch(self) -> List[Tuple]:
+        batch = [await self.queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    def _write_messages(self, items: List[Tuple]):
+        # group by conversation while keeping per-conversation order
+        grouped: Dict[Tuple[str, str], List[dict]] = {}
+        headers: Dict[Tuple[str, str], dict] = {}
+        for _, user_id, session_id, message, header, _ in items:
+            grouped.setdefault((user_id, session_id), []).append(message)
+            if header is not None:
+                headers.setdefault((user_id, session_id), header)
+        for (user_id, session_id), messages in grouped.items():
+            crud.save_messages(user_id=user_id, session_id=session_id, messages=messages, header=headers.get((user_id, session_id)))
+
+    @property
+    def incremental(self) -> bool:
+        return getattr(self.db, "incremental", False)
+
+    async def _store_conversation(self, task_result: Any, response: Any, conversation: dict):
+        if asyncio.iscoroutinefunction(self.db.store_conversation):
+            await self.db.store_conversation(task_result, response, conversation)
+        else:
+            await asyncio.to_thread(self.db.store_conversation, task_result, response, conversation)
+        self._metrics["conversations_written"] += 1
+
+    async def _save_messages(self, messages: List[Tuple]):
+        await asyncio.to_thread(self._write_messages, messages)
+        self._metrics["messages_written"] += len(messages)
+
+    def _steps(self, batch: List[Tuple]) -> List[Tuple[int, Callable[[], Awaitable], List[asyncio.Future]]]:
+        """The writes of a batch in order, each with the number of items it carries and who waits for it."""
+        # the queue is FIFO, so within a batch starts precede their messages and finals come last
+        steps: List[Tuple[int, Callable[[], Awaitable], List[asyncio.Future]]] = []
+        if self.incremental:
+            for _, user_id, session_id, agents, message, timestamp in (item for item in batch if item[0] == "start"):
+                steps.append((1, partial(self.db.start_conversation, user_id, session_id, agents, message, timestamp), []))
+        messages = [item for item in batch if item[0] == "message"]
+        if messages:
+            waiters = [item[5] for item in messages if item[5] is not None]
+            steps.append((len(messages), partial(self._save_messages, messages), waiters))
+            if self.incremental:
+                pushed = [(user_id, session_id, message) for _, user_id, session_id, message, _, _ in messages]
+                steps.append((len(messages), partial(self.db.append_messages, pushed), []))
+        if self.db is not None:
+            for _, task_result, response, conversation in (item for item in batch if item[0] == "conversation"):
+                steps.append((1, partial(self._store_conversation, task_result, response, conversation), []))
+        return steps
+
+    async def _attempt(self, step: Callable[[], Awaitable], items: int) -> bool:
+        """Run one write, retrying with exponential backoff; False once it gives up."""
+        for attempt in range(self.retries + 1):
+            try:
+                await step()
+                return True
+            except Exception as e:
+                self._metrics["failures"] += 1
+                if attempt == self.retries:
+                    logger.error(f"Failed to persist {items} items after {attempt + 1} attempts: {e}")
+                    return False
+                delay = self.retry_delay * 2 ** attempt
+                logger.warning(f"Failed to persist {items} items, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+        return False
+
+    async def _write(self, batch: List[Tuple]):
+        # each step is retried on its own, so the writes that went through are never repeated
+        for items, step, waiters in self._steps(batch):
+            written = await self._attempt(step, items)
+            if not written:
+                self._metrics["dropped"] += items
+            for waiter in waiters:
+                if waiter.done():
+                    continue
+                if written:
+                    waiter.set_result(None)
+                else:
+                    waiter.set_exception(RuntimeError(f"Failed to persist {items} items"))
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            started = time.perf_counter()
+            try:
+                await self._write(batch)
+            finally:
+                elapsed = time.perf_counter() - started
+                self._metrics["batches"] += 1
+                self._metrics["last_batch_seconds"] = elapsed
+                self._metrics["max_batch_seconds"] = max(self._metrics["max_batch_seconds"], elapsed)
+                for _ in batch:
+                    self.queue.task_done()
+
+    def stats(self) -> Dict:
+        return {
+            **self._metrics,
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "running": self._task is not None and not self._task.done(),
+        }
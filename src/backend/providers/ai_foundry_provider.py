@@ -2,12 +2,18 @@
 
 import httpx
 from autogen_agentchat.messages import TextMessage
+from autogen_core.models import RequestUsage
+
+from providers.http_pool import http_clients
 import logging
 
 logger = logging.getLogger(__name__)
 
 
 class AiFoundryProvider:
+    # applied when a call sets no temperature; the response cache treats these calls as sampled
+    default_temperature = 0.7
+
     def __init__(self, base_url="http://localhost:5273/v1", model="Phi-3-mini-4k-instruct-generic-gpu"):
         self.base_url = base_url
         self.default_model = model
@@ -37,10 +43,12 @@ class AiFoundryProvider:
         }
 
     def get_client(self, model: str = None):
-        if model:
-            self.default_model = model
-            self.model_info["model"] = model.strip().replace("foundry/", "")
-        return self
+        # a separate instance per model; the shared one keeps its own model
+        if not model or model == self.default_model:
+            return self
+        client = AiFoundryProvider(base_url=self.base_url, model=model)
+        client.model_info["model"] = model.strip().replace("foundry/", "")
+        return client
 
     async def create(self, messages: list, model: str = None, **kwargs):
         try:
@@ -51,7 +59,7 @@ class AiFoundryProvider:
                 raise ValueError("Messages list cannot be empty.")
             logger.debug(f"[AiFoundryProvider] Messages received: {[str(m) for m in messages]}")
 
-            temperature = kwargs.get("temperature", 0.7)
+            temperature = kwargs.get("temperature", self.default_temperature)
             logger.debug(f"[AiFoundryProvider] Temperature set to: {temperature}")
             logger.debug(f"[AiFoundryProvider] Final model used: {model}")
 
@@ -69,53 +77,58 @@ class AiFoundryProvider:
             logger.debug(f"[AiFoundryProvider] Posting to URL: {url}")
             logger.debug(f"[AiFoundryProvider] Payload: {payload}")
 
-            async with httpx.AsyncClient(timeout=httpx.Timeout(60.0)) as client:
-                response = await client.post(url, json=payload)
-
-                logger.debug(f"[AiFoundryProvider] HTTP status: {response.status_code}")
-                if response.status_code != 200:
-                    if response.status_code == 400 and not response.text:
-                        logger.error("Empty 400 response. Check model name and endpoint compatibility.")
-                    logger.error(f"Request to {url} failed with status code {response.status_code}")
-                    logger.error(f"Response text: {response.text}")
-                    logger.error(f"Payload: {payload}")
-                    logger.error(f"Request headers: {response.request.headers}")
-                    logger.error(f"Request body: {response.request.content}")
-                    raise httpx.HTTPStatusError(
-                        f"Client error {response.status_code} - {response.text}",
-                        request=response.request,
-                        response=response,
-                    )
-
-                data = response.json()
-                logger.debug(f"[AiFoundryProvider] Response JSON: {data}")
-
-                choices = data.get("choices", [])
-                if not choices:
-                    raise ValueError("No choices returned in response")
-
-                choice = choices[0]
-                message = choice.get("message") or choice.get("delta")
-                logger.debug(f"[AiFoundryProvider] Choice extracted: {choice}")
-
-                if not message:
-                    logger.error(f"No message or delta found in choice: {choice}")
-                    raise ValueError("No valid message content returned from model.")
-
-                content = message.get("content", "")
-                logger.debug(f"[AiFoundryProvider] Raw model content: {content}")
-
-                if not isinstance(content, str) or not content.strip():
-                    logger.error(f"[AiFoundryProvider] Invalid or empty content: {content}")
-                    raise ValueError("Model response content must be a non-empty string.")
-
-                return TextMessage.model_construct(
-                    type="chat_message",
-                    role="assistant",
-                    content=content.strip(),
-                    name="AiFoundryProvider",
-                    source="ai-foundry"
+            client = http_clients.client_for(url)
+            response = await client.post(url, json=payload, timeout=httpx.Timeout(60.0))
+
+            logger.debug(f"[AiFoundryProvider] HTTP status: {response.status_code}")
+            if response.status_code != 200:
+                if response.status_code == 400 and not response.text:
+                    logger.error("Empty 400 response. Check model name and endpoint compatibility.")
+                logger.error(f"Request to {url} failed with status code {response.status_code}")
+                logger.error(f"Response text: {response.text}")
+                logger.error(f"Payload: {payload}")
+                logger.error(f"Request headers: {response.request.headers}")
+                logger.error(f"Request body: {response.request.content}")
+                raise httpx.HTTPStatusError(
+                    f"Client error {response.status_code} - {response.text}",
+                    request=response.request,
+                    response=response,
                 )
+
+            data = response.json()
+            logger.debug(f"[AiFoundryProvider] Response JSON: {data}")
+
+            choices = data.get("choices", [])
+            if not choices:
+                raise ValueError("No choices returned in response")
+
+            choice = choices[0]
+            message = choice.get("message") or choice.get("delta")
+            logger.debug(f"[AiFoundryProvider] Choice extracted: {choice}")
+
+            if not message:
+                logger.error(f"No message or delta found in choice: {choice}")
+                raise ValueError("No valid message content returned from model.")
+
+            content = message.get("content", "")
+            logger.debug(f"[AiFoundryProvider] Raw model content: {content}")
+
+            if not isinstance(content, str) or not content.strip():
+                logger.error(f"[AiFoundryProvider] Invalid or empty content: {content}")
+                raise ValueError("Model response content must be a non-empty string.")
+
+            usage = data.get("usage") or {}
+            return TextMessage.model_construct(
+                type="chat_message",
+                role="assistant",
+                content=content.strip(),
+                name="AiFoundryProvider",
+                source="ai-foundry",
+                models_usage=RequestUsage(
+                    prompt_tokens=usage.get("prompt_tokens", 0),
+                    completion_tokens=usage.get("completion_tokens", 0)
+                ) if usage else None
+            )
         except Exception as e:
             logger.exception(f"[AiFoundryProvider] Error during message creation: {type(e).__name__} - {str(e)}")
             raise
\ No newline at end of file
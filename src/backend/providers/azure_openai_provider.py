@@ -1,5 +1,6 @@
 from .base import BaseProvider
 import httpx
+from providers.http_pool import http_clients
 
 class AzureOpenAIProvider(BaseProvider):
     async def generate(self, prompt: str, model: str, **kwargs):
@@ -13,7 +14,7 @@ class AzureOpenAIProvider(BaseProvider):
             "max_tokens": kwargs.get("max_tokens", 200)
         }
 
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(url, json=payload, headers=headers)
-            resp.raise_for_status()
-            return resp.json()
\ No newline at end of file
+        # httpx's default 5s timeout, as with the per-call client this replaces
+        resp = await http_clients.client_for(url).post(url, json=payload, headers=headers, timeout=httpx.Timeout(5.0))
+        resp.raise_for_status()
+        return resp.json()
\ No newline at end of file
@@ -0,0 +1,128 @@
+# File: providers/client_cache.py
+"""
+Bounded cache of model clients keyed by (provider, model, base_url).
+
+``get_client`` used to retarget the shared provider instance. Docker and AI
+Foundry overwrote their ``default_model``, and Ollama replaced its
+``self.client``. Sessions running on different models therefore switched each
+other's model mid-run and kept rebuilding clients. Providers now return a
+separate client per model, and this cache makes each one reusable across
+sessions.
+
+Entries are evicted least recently used once there are more than
+CLIENT_CACHE_SIZE. An evicted client is closed unless it belongs to its
+provider (the provider itself, or its default client). Clients leased by a
+running session (``acquire`` / ``release``) are never evicted; the cache may
+go over its size while they are in use.
+"""
+
+import os
+import inspect
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+CLIENT_CACHE_SIZE = int(os.getenv("CLIENT_CACHE_SIZE", "16"))
+
+
+async def close_client(client: Any):
+    for method in ("aclose", "close"):
+        close = getattr(client, method, None)
+        if callable(close):
+            result = close()
+            if inspect.isawaitable(result):
+                await result
+            return
+
+
+@dataclass
+class _Entry:
+    client: Any
+    closeable: bool = True
+    users: int = 0
+
+
+class ClientCache:
+    def __init__(self, max_entries: int = CLIENT_CACHE_SIZE):
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._metrics = {"hits": 0, "misses": 0, "evictions": 0, "closed": 0, "close_errors": 0}
+
+    async def get(self, key: Hashable, factory: Callable[[], Any], closeable: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        The cached client for ``key``, built by ``factory`` on a miss. ``closeable(client)``
+        tells whether the cache may close the client when it evicts it (default: yes).
+        """
+        return (await self._entry(key, factory, closeable)).client
+
+    async def acquire(self, key: Hashable, factory: Callable[[], Any], closeable: Optional[Callable[[Any], bool]] = None) -> Any:
+        """Like ``get``, and the client is not evicted until it is released."""
+        entry = await self._entry(key, factory, closeable)
+        entry.users += 1
+        return entry.client
+
+    def release(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is not None and entry.users > 0:
+            entry.users -= 1
+
+    async def _entry(self, key: Hashable, factory: Callable[[], Any], closeable: Optional[Callable[[Any], bool]]) -> _Entry:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._metrics["hits"] += 1
+            self._entries.move_to_end(key)
+            return entry
+        self._metrics["misses"] += 1
+        client = factory()
+        entry = _Entry(client=client, closeable=closeable(client) if closeable is not None else True)
+        self._entries[key] = entry
+        await self._evict()
+        return entry
+
+    async def _evict(self):
+        # oldest first, skipping clients that running sessions hold
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_entries:
+                return
+            entry = self._entries[key]
+            if entry.users:
+                continue
+            del self._entries[key]
+            self._metrics["evictions"] += 1
+            logger.info(f"Evicted model client {key}")
+            if entry.closeable:
+                await self._close(key, entry)
+
+    async def _close(self, key: Hashable, entry: _Entry):
+        try:
+            await close_client(entry.client)
+            self._metrics["closed"] += 1
+        except Exception as e:
+            self._metrics["close_errors"] += 1
+            logger.warning(f"Failed to close model client {key}: {e}")
+
+    async def aclose(self):
+        entries, self._entries = self._entries, OrderedDict()
+        for key, entry in entries.items():
+            if entry.closeable:
+                await self._close(key, entry)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        lookups = self._metrics["hits"] + self._metrics["misses"]
+        return {
+            **self._metrics,
+            "hit_rate": round(self._metrics["hits"] / lookups, 3) if lookups else None,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "in_use": sum(1 for e in self._entries.values() if e.users),
+            "clients": [
+                {"key": [str(part) if part is not None else None for part in key], "users": e.users}
+                for key, e in self._entries.items()
+            ],
+        }
@@ -0,0 +1,389 @@
+# File: providers/client_wrapper.py
+"""
+Response cache and request coalescing around the ``create`` of any model client.
+
+The orchestrator's ledger and plan prompts, and the regression and eval runs,
+send the same requests to the Docker, Ollama and AI Foundry providers over and
+over. With LLM_CACHE=true (or LLM_COALESCE, below) the registry wraps every
+client it hands out in a ``ProviderClientWrapper``. The wrapper answers
+``create`` from a shared ``ResponseCache`` when it has already seen the request. Everything else,
+including ``create_stream``, model_info and close, goes straight to the
+wrapped client.
+
+A request is keyed by a SHA-256 of its canonical JSON: provider, base URL,
+model, messages, tools, tool choice, output format and the sampling arguments.
+Non-deterministic requests bypass the cache unless
+LLM_CACHE_NONDETERMINISTIC=true. A request is deterministic when it carries a
+seed, or when its temperature is 0. A request without a temperature uses the
+client's default: the client's ``default_temperature`` attribute (or
+``_create_args`` for autogen clients). When the client declares none, the
+server samples with its own default and the request is non-deterministic. A single call can force either
+way with ``cache=True`` / ``cache=False``.
+
+Tiers: an in-memory LRU (LLM_CACHE_SIZE entries), then a SQLite file
+(LLM_CACHE_PATH, empty to disable). Both expire entries after LLM_CACHE_TTL
+seconds.
+
+Identical concurrent requests that miss the cache are coalesced (LLM_COALESCE,
+on by default, which also turns the wrapper on). The first one goes to the
+model and the others wait for its answer; see ``single_flight``. Sessions
+starting the same team at once then send one planning request instead of
+dozens. The same determinism rule applies: sampled requests are never shared.
+
+Calls that do reach the model, streamed or not, take a slot from the adaptive
+limiter of their backend (LLM_LIMITER, on by default; see
+``concurrency_limiter``). ``with_priority`` returns a view of the client whose
+calls queue in another lane, so the orchestrator can go first.
+
+Every call, including cache hits and coalesced answers, is charged to the
+``usage`` accountant (LLM_USAGE, on by default; see ``usage``). ``with_agent``
+returns a view whose calls are charged to one agent.
+"""
+
+import os
+import copy
+import json
+import time
+import pickle
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import threading
+import dataclasses
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from providers.single_flight import SingleFlight
+from providers.concurrency_limiter import LLM_LIMITER, llm_limiters, work_tokens
+from providers.usage import LLM_USAGE, UsageAccountant, current_labels, extract_usage, usage as usage_accountant
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE = os.getenv("LLM_CACHE", "false").lower() == "true"
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./data/llm_cache.sqlite")
+LLM_CACHE_NONDETERMINISTIC = os.getenv("LLM_CACHE_NONDETERMINISTIC", "false").lower() == "true"
+LLM_COALESCE = os.getenv("LLM_COALESCE", "true").lower() == "true"
+
+# create() arguments that do not change the answer
+_UNKEYED_ARGS = ("cancellation_token", "cache")
+
+
+def _canonical(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return _canonical(value.model_dump(mode="json"))
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return _canonical(dataclasses.asdict(value))
+    if hasattr(value, "schema") and hasattr(value, "name") and not isinstance(value, dict):
+        # autogen Tool: its schema is what reaches the model
+        return _canonical(value.schema)
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def request_key(namespace: Tuple, messages: list, kwargs: Dict) -> str:
+    """Stable hash of a create() request; dict key order does not matter."""
+    args = {k: v for k, v in kwargs.items() if k not in _UNKEYED_ARGS}
+    canonical = json.dumps(
+        {"namespace": list(namespace), "messages": _canonical(messages), "args": _canonical(args)},
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def default_temperature(client: Any) -> Optional[float]:
+    """The temperature ``client`` applies when a call sets none, if it declares one."""
+    value = getattr(client, "default_temperature", None)
+    if value is None:
+        create_args = getattr(client, "_create_args", None)  # autogen OpenAI / Ollama clients
+        if isinstance(create_args, dict):
+            options = create_args.get("options")
+            value = create_args.get("temperature", options.get("temperature") if isinstance(options, dict) else None)
+    return value if isinstance(value, (int, float)) else None
+
+
+def is_deterministic(kwargs: Dict, default: Optional[float] = None) -> bool:
+    """A seeded or zero-temperature request; an unknown temperature counts as sampled."""
+    args = {**kwargs, **(kwargs.get("extra_create_args") or {})}
+    if args.get("seed") is not None:
+        return True
+    temperature = args.get("temperature", default)
+    return temperature is not None and temperature == 0
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = LLM_CACHE_SIZE, ttl: float = LLM_CACHE_TTL, path: Optional[str] = LLM_CACHE_PATH):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.path = path or None
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._metrics = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "errors": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+        return self._db
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        with self._db_lock:
+            row = self._connect().execute(
+                "SELECT value FROM llm_cache WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def _disk_put(self, key: str, value: bytes, expires_at: float):
+        with self._db_lock:
+            db = self._connect()
+            db.execute("INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at))
+            db.commit()
+
+    def _remember(self, key: str, expires_at: float, value: Any):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[0] >= time.time():
+                self._memory.move_to_end(key)
+                self._metrics["memory_hits"] += 1
+                return entry[1]
+            del self._memory[key]
+        if self.path:
+            try:
+                blob = await asyncio.to_thread(self._disk_get, key)
+                if blob is not None:
+                    value = pickle.loads(blob)
+                    self._remember(key, time.time() + self.ttl, value)
+                    self._metrics["disk_hits"] += 1
+                    return value
+            except Exception as e:
+                self._metrics["errors"] += 1
+                logger.warning(f"LLM cache read failed: {e}")
+        self._metrics["misses"] += 1
+        return None
+
+    async def put(self, key: str, value: Any):
+        expires_at = time.time() + self.ttl
+        self._remember(key, expires_at, value)
+        self._metrics["stores"] += 1
+        if self.path:
+            try:
+                await asyncio.to_thread(self._disk_put, key, pickle.dumps(value), expires_at)
+            except Exception as e:
+                # unpicklable results stay in memory only
+                self._metrics["errors"] += 1
+                logger.warning(f"LLM cache write failed: {e}")
+
+    def bypassed(self):
+        self._metrics["bypassed"] += 1
+
+    def clear(self):
+        self._memory.clear()
+        if self.path:
+            with self._db_lock:
+                db = self._connect()
+                db.execute("DELETE FROM llm_cache")
+                db.commit()
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict:
+        hits = self._metrics["memory_hits"] + self._metrics["disk_hits"]
+        lookups = hits + self._metrics["misses"]
+        return {
+            **self._metrics,
+            "enabled": LLM_CACHE,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+            "memory_entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "path": self.path,
+        }
+
+
+response_cache = ResponseCache()
+
+
+llm_flights = SingleFlight()
+
+
+class ProviderClientWrapper:
+    """Model client whose ``create`` goes through the response cache and single-flight."""
+
+    def __init__(
+        self,
+        client: Any,
+        provider: str,
+        model: Optional[str] = None,
+        base_url: Optional[str] = None,
+        cache: Optional[ResponseCache] = None,
+        caching: bool = LLM_CACHE,
+        coalesce: bool = LLM_COALESCE,
+        flights: Optional[SingleFlight] = None,
+        limiting: bool = LLM_LIMITER,
+        accountant: Optional[UsageAccountant] = None,
+    ):
+        self.wrapped = client
+        self.default_temperature = default_temperature(client)
+        self.namespace = (provider, base_url or "", model or "")
+        self.cache = cache if cache is not None else response_cache
+        self.caching = caching
+        self.coalesce = coalesce
+        self.flights = flights if flights is not None else llm_flights
+        self.limiter = llm_limiters.for_backend(base_url or provider) if limiting else None
+        self.priority = None  # lane of the calls; None uses the ambient priority()
+        self.accountant = accountant if accountant is not None else usage_accountant
+        self.agent = None  # agent charged for the calls; None uses the ambient labels
+
+    def __getattr__(self, name: str) -> Any:
+        # only reached for attributes the wrapper does not define
+        if name == "wrapped":
+            raise AttributeError(name)
+        return getattr(self.wrapped, name)
+
+    @staticmethod
+    def _copy(result: Any, cached: bool = False) -> Any:
+        try:
+            result = copy.deepcopy(result)
+        except Exception:
+            return result
+        if cached and hasattr(result, "cached"):
+            try:
+                result.cached = True
+            except Exception:
+                pass
+        return result
+
+    def _bound(self, **attributes: Any) -> "ProviderClientWrapper":
+        bound = object.__new__(type(self))
+        bound.__dict__.update(self.__dict__)
+        bound.__dict__.update(attributes)
+        return bound
+
+    def with_priority(self, priority: Any) -> "ProviderClientWrapper":
+        """The same client, with its calls queued in lane ``priority`` ("high", "normal", "low")."""
+        return self._bound(priority=priority)
+
+    def with_agent(self, agent: Optional[str]) -> "ProviderClientWrapper":
+        """The same client, with its calls charged to ``agent`` in the usage accounts."""
+        return self._bound(agent=agent)
+
+    def _record(self, result: Any = None, started: Optional[float] = None, error: Optional[BaseException] = None, cached: bool = False):
+        labels = current_labels()
+        if self.agent is not None:
+            labels["agent"] = self.agent
+        provider, _, model = self.namespace
+        seconds = time.monotonic() - started if started is not None else 0.0
+        self.accountant.record(provider, model, result=result, seconds=seconds, error=error, cached=cached, labels=labels)
+
+    async def _call(self, messages: list, *args, **kwargs) -> Any:
+        started = time.monotonic()
+        try:
+            if self.limiter is None:
+                result = await self.wrapped.create(messages, *args, **kwargs)
+            else:
+                async with self.limiter.slot(self.priority) as measurement:
+                    result = await self.wrapped.create(messages, *args, **kwargs)
+                    measurement.tokens = work_tokens(extract_usage(result))
+        except Exception as e:
+            self._record(started=started, error=e)
+            raise
+        self._record(result, started=started)
+        return result
+
+    async def _stream(self, messages: list, *args, **kwargs):
+        started = time.monotonic()
+        result = None
+        try:
+            async for chunk in self.wrapped.create_stream(messages, *args, **kwargs):
+                if not isinstance(chunk, str):
+                    result = chunk  # the final CreateResult carries the usage
+                yield chunk
+        except Exception as e:
+            self._record(started=started, error=e)
+            raise
+        self._record(result, started=started)
+
+    async def create_stream(self, messages: list, *args, **kwargs):
+        if self.limiter is None:
+            async for chunk in self._stream(messages, *args, **kwargs):
+                yield chunk
+            return
+        # the slot is held until the stream is exhausted or closed
+        async with self.limiter.slot(self.priority) as measurement:
+            async for chunk in self._stream(messages, *args, **kwargs):
+                if not isinstance(chunk, str):
+                    measurement.tokens = work_tokens(extract_usage(chunk))
+                yield chunk
+
+    async def _fetch(self, key: str, messages: list, kwargs: Dict) -> Any:
+        result = await self._call(messages, **kwargs)
+        if self.caching:
+            try:
+                # the caller owns `result`; the cache keeps its own copy
+                stored = copy.deepcopy(result)
+            except Exception as e:
+                logger.debug(f"Not caching an uncopyable {type(result).__name__}: {e}")
+                return result
+            await self.cache.put(key, stored)
+        return result
+
+    async def create(self, messages: list, *args, cache: Optional[bool] = None, **kwargs) -> Any:
+        if args:
+            # positional create() arguments are not keyed; pass them through
+            return await self._call(messages, *args, **kwargs)
+        deterministic = cache if cache is not None else (LLM_CACHE_NONDETERMINISTIC or is_deterministic(kwargs, self.default_temperature))
+        if not deterministic:
+            # sampled answers are neither reused nor shared
+            if self.caching:
+                self.cache.bypassed()
+            return await self._call(messages, **kwargs)
+        key = request_key(self.namespace, messages, kwargs)
+        if self.caching:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                self._record(cached=True)
+                return self._copy(cached, cached=True)
+        if not self.coalesce:
+            return await self._fetch(key, messages, kwargs)
+        # the shared request runs without any caller's token; each caller's token only ends its own wait
+        token = kwargs.pop("cancellation_token", None)
+        result, shared = await self.flights.do(key, lambda: self._fetch(key, messages, kwargs), cancellation_token=token)
+        if shared:
+            # the leader was charged for the request
+            self._record(cached=True)
+        # every caller gets its own copy of the shared result
+        return self._copy(result)
+
+
+def wrap_client(client: Any, provider: str, model: Optional[str] = None, base_url: Optional[str] = None) -> Any:
+    """The client wrapped when caching, coalescing, limiting or usage accounting is on, otherwise the client."""
+    if not (LLM_CACHE or LLM_COALESCE or LLM_LIMITER or LLM_USAGE) or isinstance(client, ProviderClientWrapper):
+        return client
+    if getattr(client, "manages_backends", False):
+        # a router: its backend clients are wrapped one by one
+        return client
+    return ProviderClientWrapper(client, provider, model=model, base_url=base_url)
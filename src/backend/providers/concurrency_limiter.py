@@ -0,0 +1,280 @@
+# File: providers/concurrency_limiter.py
+"""
+Adaptive concurrency limit per LLM backend, with priority lanes.
+
+Local model servers (llama.cpp in the Docker model runner, Ollama, Foundry
+Local) slow down sharply past a few concurrent requests. Each base URL gets an
+``AdaptiveLimiter``. Calls beyond its current limit wait in a queue. The limit
+follows AIMD:
+
+  * it grows by 1/limit per call that completes within LLM_LIMIT_TOLERANCE times
+    the backend's baseline speed (about +1 per round of calls);
+  * it is multiplied by 0.9 when calls come back slower than that;
+  * it is halved on 429/503 (or any error carrying those statuses);
+
+and it stays between LLM_LIMIT_MIN and LLM_LIMIT_MAX. Call time grows with the
+length of the answer, so speed is measured in seconds per token: the
+completion tokens plus the prompt tokens weighted by LLM_LIMIT_PROMPT_WEIGHT,
+as a prompt is read much faster than an answer is generated. Calls whose
+provider reports no usage, or that have fewer than LLM_LIMIT_MIN_TOKENS such
+tokens, leave the limit alone. The baseline is the lowest recent speed; it
+drifts upwards slowly so it follows a model that got slower. A decrease happens
+at most once per average call duration, so one burst of slow calls counts as
+one signal. Streaming calls hold a slot until the stream ends and are measured
+the same way, from the usage of their final result.
+
+Waiting calls are served by lane, then in arrival order. Lanes are ``high``
+(the orchestrator), ``normal`` (worker agents, the default) and ``low``. A
+call's lane comes from a bound client (``ProviderClientWrapper.with_priority``)
+or from the ``priority`` context manager.
+
+Configuration:
+  LLM_LIMITER           "false" to disable (default true)
+  LLM_LIMIT_INITIAL     starting concurrency per backend (default 4)
+  LLM_LIMIT_MIN / MAX   bounds (default 1 / 16)
+  LLM_LIMIT_TOLERANCE   seconds per token above baseline * tolerance is congestion (default 2.0)
+  LLM_LIMIT_PROMPT_WEIGHT  weight of a prompt token against a completion token (default 0.1)
+  LLM_LIMIT_MIN_TOKENS  weighted tokens a call needs to be measured (default 8)
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import logging
+import contextvars
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+LLM_LIMITER = os.getenv("LLM_LIMITER", "true").lower() == "true"
+LLM_LIMIT_INITIAL = float(os.getenv("LLM_LIMIT_INITIAL", "4"))
+LLM_LIMIT_MIN = float(os.getenv("LLM_LIMIT_MIN", "1"))
+LLM_LIMIT_MAX = float(os.getenv("LLM_LIMIT_MAX", "16"))
+LLM_LIMIT_TOLERANCE = float(os.getenv("LLM_LIMIT_TOLERANCE", "2.0"))
+LLM_LIMIT_PROMPT_WEIGHT = float(os.getenv("LLM_LIMIT_PROMPT_WEIGHT", "0.1"))
+LLM_LIMIT_MIN_TOKENS = float(os.getenv("LLM_LIMIT_MIN_TOKENS", "8"))
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+LANES = {"high": PRIORITY_HIGH, "normal": PRIORITY_NORMAL, "low": PRIORITY_LOW}
+_LANE_NAMES = {v: k for k, v in LANES.items()}
+
+OVERLOAD_STATUSES = (429, 503)
+
+_current_priority: contextvars.ContextVar = contextvars.ContextVar("llm_priority", default=PRIORITY_NORMAL)
+
+
+def lane(priority: Union[int, str, None]) -> int:
+    if priority is None:
+        return _current_priority.get()
+    if isinstance(priority, str):
+        return LANES[priority]
+    return max(PRIORITY_HIGH, min(PRIORITY_LOW, int(priority)))
+
+
+@contextmanager
+def priority(value: Union[int, str]):
+    """Run the LLM calls made inside the block in lane ``value``."""
+    token = _current_priority.set(lane(value))
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def status_of(error: BaseException) -> Optional[int]:
+    """HTTP status carried by an httpx, openai or ollama error, if any."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def work_tokens(counts: Dict[str, float], prompt_weight: float = LLM_LIMIT_PROMPT_WEIGHT) -> Optional[float]:
+    """Completion tokens plus weighted prompt tokens of a call (``usage.extract_usage`` counts), if known."""
+    if "completion_tokens" not in counts and "prompt_tokens" not in counts:
+        return None
+    return counts.get("completion_tokens", 0) + counts.get("prompt_tokens", 0) * prompt_weight
+
+
+class Measurement:
+    """Filled in by the caller inside ``AdaptiveLimiter.slot``: the tokens the call worked through."""
+
+    def __init__(self):
+        self.tokens: Optional[float] = None
+
+
+class _LaneStats:
+    def __init__(self):
+        self.acquired = 0
+        self.queued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.waits = deque(maxlen=500)
+
+    def record(self, wait: float):
+        self.acquired += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.waits.append(wait)
+
+    def to_json(self) -> Dict:
+        waits = sorted(self.waits)
+        return {
+            "acquired": self.acquired,
+            "queued": self.queued,
+            "mean_wait_ms": round(self.total_wait / self.acquired * 1000, 1) if self.acquired else None,
+            "p95_wait_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else None,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+        }
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        name: str,
+        initial: float = LLM_LIMIT_INITIAL,
+        minimum: float = LLM_LIMIT_MIN,
+        maximum: float = LLM_LIMIT_MAX,
+        tolerance: float = LLM_LIMIT_TOLERANCE,
+        min_tokens: float = LLM_LIMIT_MIN_TOKENS,
+    ):
+        self.name = name
+        self.minimum = max(1.0, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(self.maximum, max(self.minimum, initial))
+        self.tolerance = tolerance
+        self.min_tokens = max(1.0, min_tokens)
+        self.in_flight = 0
+        self.baseline: Optional[float] = None  # seconds per token
+        self.ewma_per_token: Optional[float] = None
+        self.ewma_latency: Optional[float] = None  # seconds per call
+        self._waiters: List = []  # heap of (lane, seq, future)
+        self._seq = itertools.count()
+        self._last_decrease = 0.0
+        self._lanes: Dict[int, _LaneStats] = {p: _LaneStats() for p in _LANE_NAMES}
+        self._metrics = {"increases": 0, "decreases": 0, "overloads": 0, "unmeasured": 0}
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue  # cancelled while waiting
+            self.in_flight += 1
+            future.set_result(None)
+
+    async def acquire(self, priority: Union[int, str, None] = None) -> float:
+        """Wait for a slot; returns the time spent waiting."""
+        p = lane(priority)
+        stats = self._lanes[p]
+        started = time.monotonic()
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (p, next(self._seq), future))
+            stats.queued += 1
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # the slot was granted as we were cancelled: hand it on
+                    self.in_flight -= 1
+                    self._wake()
+                raise
+            finally:
+                stats.queued -= 1
+        wait = time.monotonic() - started
+        stats.record(wait)
+        return wait
+
+    def release(self, latency: Optional[float] = None, error: Optional[BaseException] = None, tokens: Optional[float] = None):
+        self.in_flight -= 1
+        status = status_of(error) if error is not None else None
+        if status in OVERLOAD_STATUSES:
+            self._metrics["overloads"] += 1
+            self._decrease(0.5)
+        elif error is None and latency is not None:
+            self._observe(latency, tokens)
+        self._wake()
+
+    def _observe(self, latency: float, tokens: Optional[float]):
+        self.ewma_latency = latency if self.ewma_latency is None else 0.8 * self.ewma_latency + 0.2 * latency
+        if tokens is None or tokens < self.min_tokens:
+            # too short (or unknown) to tell congestion from a short answer
+            self._metrics["unmeasured"] += 1
+            return
+        per_token = latency / tokens
+        self.ewma_per_token = per_token if self.ewma_per_token is None else 0.8 * self.ewma_per_token + 0.2 * per_token
+        if self.baseline is None or per_token < self.baseline:
+            self.baseline = per_token
+        else:
+            self.baseline += (per_token - self.baseline) * 0.01
+        if per_token > self.baseline * self.tolerance:
+            self._decrease(0.9)
+        elif self.limit < self.maximum:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._metrics["increases"] += 1
+
+    def _decrease(self, factor: float):
+        now = time.monotonic()
+        if now - self._last_decrease < (self.ewma_latency or 0.0):
+            return
+        self._last_decrease = now
+        new_limit = max(self.minimum, self.limit * factor)
+        if new_limit < self.limit:
+            self._metrics["decreases"] += 1
+            logger.info(f"LLM concurrency for {self.name}: {self.limit:.2f} -> {new_limit:.2f}")
+        self.limit = new_limit
+
+    @asynccontextmanager
+    async def slot(self, priority: Union[int, str, None] = None):
+        """
+        Hold a slot for the block. Its errors feed the limit, and so does its duration
+        per token once the block sets ``tokens`` on the yielded ``Measurement``.
+        """
+        await self.acquire(priority)
+        started = time.monotonic()
+        measurement = Measurement()
+        try:
+            yield measurement
+        except BaseException as e:
+            self.release(error=e)
+            raise
+        else:
+            self.release(latency=time.monotonic() - started, tokens=measurement.tokens)
+
+    def stats(self) -> Dict:
+        return {
+            **self._metrics,
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": sum(1 for _, _, f in self._waiters if not f.done()),
+            "baseline_ms_per_token": round(self.baseline * 1000, 2) if self.baseline is not None else None,
+            "ewma_ms_per_token": round(self.ewma_per_token * 1000, 2) if self.ewma_per_token is not None else None,
+            "ewma_latency_ms": round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+            "lanes": {_LANE_NAMES[p]: s.to_json() for p, s in self._lanes.items()},
+        }
+
+
+class LimiterRegistry:
+    def __init__(self):
+        self._limiters: Dict[str, AdaptiveLimiter] = {}
+
+    def for_backend(self, key: str) -> AdaptiveLimiter:
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limiter = AdaptiveLimiter(key)
+            self._limiters[key] = limiter
+        return limiter
+
+    def stats(self) -> Dict:
+        return {"enabled": LLM_LIMITER, "backends": {key: l.stats() for key, l in self._limiters.items()}}
+
+
+llm_limiters = LimiterRegistry()
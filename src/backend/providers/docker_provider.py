@@ -1,15 +1,134 @@
+# File: providers/docker_provider.py
+"""
+Provider for the llama.cpp engine of Docker Model Runner.
+
+Two request modes (DOCKER_API_MODE):
+  chat         (default) ``/chat/completions`` with structured messages and tools,
+               so the server applies the model's chat template. Messages are
+               serialized canonically (sorted keys, no whitespace), so an unchanged
+               system prompt and history render to the same prompt prefix on every
+               turn, and ``cache_prompt`` lets llama.cpp reuse its KV cache for it.
+  completions  the previous path: messages flattened into a ``role: content``
+               prompt for ``/completions``.
+
+DOCKER_CACHE_PROMPT=false stops sending ``cache_prompt``.
+"""
+
+import os
 import json
-import httpx
-from httpx import ReadTimeout, Timeout
+from typing import Any, Dict, Optional
+from httpx import Timeout
+
+from autogen_core import FunctionCall
+from autogen_core.models import (
+    AssistantMessage,
+    CreateResult,
+    FunctionExecutionResultMessage,
+    RequestUsage,
+    SystemMessage,
+    UserMessage,
+)
+
+from providers.http_pool import http_clients
+
+DOCKER_API_MODE = os.getenv("DOCKER_API_MODE", "chat").lower()
+DOCKER_CACHE_PROMPT = os.getenv("DOCKER_CACHE_PROMPT", "true").lower() == "true"
+
+# autogen create() arguments that are not request fields
+_NON_PAYLOAD_ARGS = ("tools", "tool_choice", "json_output", "extra_create_args", "cancellation_token")
+
+
+def encode_payload(payload: dict) -> bytes:
+    """Canonical JSON: the same payload always gives the same bytes."""
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _content_parts(content) -> list:
+    parts = []
+    for part in content:
+        if isinstance(part, str):
+            parts.append({"type": "text", "text": part})
+        elif hasattr(part, "data_uri"):
+            parts.append({"type": "image_url", "image_url": {"url": part.data_uri}})
+        else:
+            parts.append({"type": "text", "text": str(part)})
+    return parts
+
+
+def chat_message(m) -> list:
+    """OpenAI chat messages for one autogen LLMMessage (or an already shaped dict)."""
+    if isinstance(m, dict):
+        return [m]
+    if isinstance(m, SystemMessage):
+        return [{"role": "system", "content": m.content}]
+    if isinstance(m, UserMessage):
+        content = m.content if isinstance(m.content, str) else _content_parts(m.content)
+        return [{"role": "user", "content": content}]
+    if isinstance(m, AssistantMessage):
+        if isinstance(m.content, str):
+            return [{"role": "assistant", "content": m.content}]
+        return [{
+            "role": "assistant",
+            "content": m.thought,
+            "tool_calls": [
+                {"id": call.id, "type": "function", "function": {"name": call.name, "arguments": call.arguments}}
+                for call in m.content
+            ],
+        }]
+    if isinstance(m, FunctionExecutionResultMessage):
+        return [{"role": "tool", "tool_call_id": r.call_id, "content": r.content} for r in m.content]
+    role = getattr(m, "role", getattr(m, "source", "user"))
+    return [{"role": role if role in ("system", "user", "assistant", "tool") else "user", "content": str(getattr(m, "content", ""))}]
+
+
+def _arguments(arguments) -> str:
+    # FunctionCall carries the arguments as a JSON string; some servers send an object
+    if arguments is None:
+        return "{}"
+    return arguments if isinstance(arguments, str) else json.dumps(arguments)
+
+
+def _usage(usage: Optional[dict]) -> RequestUsage:
+    return RequestUsage(
+        prompt_tokens=(usage or {}).get("prompt_tokens", 0),
+        completion_tokens=(usage or {}).get("completion_tokens", 0)
+    )
+
+
+def _finish_reason(reason: Optional[str]) -> str:
+    return reason if reason in ("stop", "length", "content_filter") else "stop"
+
+
+class DockerCreateResult(CreateResult):
+    """A CreateResult that also carries llama.cpp's ``timings`` for the usage accounts."""
+
+    timings: Optional[Dict[str, Any]] = None
+
+
+def tool_schema(tool) -> dict:
+    schema = tool if isinstance(tool, dict) else tool.schema
+    if schema.get("type") == "function":
+        return schema
+    function = {"name": schema["name"], "description": schema.get("description", "")}
+    if "parameters" in schema:
+        function["parameters"] = schema["parameters"]
+    return {"type": "function", "function": function}
+
 
 class DockerProvider:
     def __init__(
         self,
         base_url: str = None,
         default_model: str = None,
+        api_mode: str = None,
+        cache_prompt: bool = DOCKER_CACHE_PROMPT,
     ):
         self.base_url = base_url or "http://localhost:12434/engines/llama.cpp/v1"
         self.default_model = default_model
+        self.api_mode = (api_mode or DOCKER_API_MODE).lower()
+        if self.api_mode not in ("chat", "completions"):
+            raise ValueError(f"Unknown DockerProvider api_mode: {self.api_mode}")
+        self.cache_prompt = cache_prompt
         # Include "family" to satisfy multimodal WebSurfer
         self.model_info = {
             "family": "openai",
@@ -20,123 +139,171 @@ class DockerProvider:
 
     def get_client(self, model: str = None):
         """
-        Sets the default model and returns this provider instance.
+        The client for ``model``: this provider for its default model, otherwise a
+        provider with the same settings for that model. Never retargets this instance,
+        which concurrent sessions share.
         """
-        self.default_model = model or self.default_model
-        return self
+        if not model or model == self.default_model:
+            return self
+        return DockerProvider(base_url=self.base_url, default_model=model, api_mode=self.api_mode, cache_prompt=self.cache_prompt)
 
-    async def create(self, messages: list, model: str = None, **kwargs):
-        model = model or self.default_model
-        if not model:
-            raise ValueError("Model must be provided for DockerProvider.create()")
-        # flatten chat messages into an OpenAI‑style prompt
+    @staticmethod
+    def flatten_prompt(messages: list) -> str:
+        """The completions-mode prompt: one ``role: content`` line per message."""
         lines = []
         for m in messages:
             role = getattr(m, "role", getattr(m, "source", "user"))
             content = getattr(m, "content", "")
             lines.append(f"{role}: {content}")
-        prompt = "\n".join(lines) + "\nassistant:"
-        """
-        Proxy to /completions; same signature as OpenAI.
-        Returns the response JSON dict.
-        """
+        return "\n".join(lines) + "\nassistant:"
+
+    def build_request(self, messages: list, model: str = None, stream: bool = False, **kwargs):
+        """URL and encoded body of a completion request in this provider's api_mode."""
+        model = model or self.default_model
+        if not model:
+            raise ValueError("Model must be provided for DockerProvider")
         # ensure we never double up a /chat segment
         base = self.base_url.rstrip("/")
         base = base.replace("/chat", "")
-        url = f"{base}/completions"
         serializable_kwargs = {}
-        for k, v in kwargs.items():
+        for k, v in {**kwargs, **(kwargs.get("extra_create_args") or {})}.items():
+            if k in _NON_PAYLOAD_ARGS:
+                continue
             try:
                 json.dumps(v)
                 serializable_kwargs[k] = v
             except (TypeError, OverflowError):
                 # skip non-serializable values like CancellationToken
                 continue
-        payload = {"model": model, "prompt": prompt, **serializable_kwargs}
-        print("POST", url, payload)
+        payload = {"model": model, **serializable_kwargs}
+        if self.api_mode == "chat":
+            url = f"{base}/chat/completions"
+            payload["messages"] = [c for m in messages for c in chat_message(m)]
+            tools = kwargs.get("tools")
+            if tools:
+                payload["tools"] = [tool_schema(t) for t in tools]
+                tool_choice = kwargs.get("tool_choice", "auto")
+                if isinstance(tool_choice, str):
+                    payload["tool_choice"] = tool_choice
+                else:
+                    payload["tool_choice"] = {"type": "function", "function": {"name": tool_choice.schema["name"]}}
+            if kwargs.get("json_output") is True:
+                payload["response_format"] = {"type": "json_object"}
+        else:
+            url = f"{base}/completions"
+            payload["prompt"] = self.flatten_prompt(messages)
+        if self.cache_prompt:
+            payload["cache_prompt"] = True
+        if stream:
+            payload["stream"] = True
+            # OpenAI-compatible servers then send usage in the last chunk
+            payload["stream_options"] = {"include_usage": True}
+        return url, encode_payload(payload)
+
+    async def create(self, messages: list, model: str = None, **kwargs):
+        """
+        Proxy to /chat/completions (or /completions); same signature as OpenAI.
+        Returns a CreateResult with the text, or the FunctionCalls when the model
+        calls tools, as ``create_stream`` ends with.
+        """
+        url, body = self.build_request(messages, model=model, **kwargs)
         timeout = Timeout(connect=10.0, read=300.0, write=300.0, pool=10.0)
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            try:
-                res = await client.post(url, json=payload)
-            except ReadTimeout:
-                # retry once on tmagentic_one_orchestrator.pyimeout
-                res = await client.post(url, json=payload)
-            res.raise_for_status()
-            data = res.json()
-            if not isinstance(data, dict) or "choices" not in data or not data["choices"]:
-                raise ValueError("Unexpected response structure: missing 'choices'")
-            text = data["choices"][0].get("text")
-            if not isinstance(text, str):
-                text = str(text) if text is not None else "[no response from model]"
-            text = text.strip()
-            return {
-                "type": "chat_message",
-                "role": "assistant",
-                "content": text,
-                "name": "DockerProvider",
-                "source": "docker"
-            }
+        headers = {"Content-Type": "application/json"}
+        # shared keep-alive client: no new connection per turn
+        client = http_clients.client_for(url)
+        # no retry here: a timeout reaches the concurrency limiter and the router, which decide
+        res = await client.post(url, content=body, headers=headers, timeout=timeout)
+        res.raise_for_status()
+        data = res.json()
+        if not isinstance(data, dict) or "choices" not in data or not data["choices"]:
+            raise ValueError("Unexpected response structure: missing 'choices'")
+        choice = data["choices"][0]
+        message = choice.get("message") or {}
+        text = message.get("content") if self.api_mode == "chat" else choice.get("text")
+        if not isinstance(text, str):
+            text = str(text) if text is not None else "[no response from model]"
+        text = text.strip()
+        if message.get("tool_calls"):
+            return DockerCreateResult(
+                finish_reason="function_calls",
+                content=[
+                    FunctionCall(
+                        id=call.get("id") or "",
+                        name=(call.get("function") or {}).get("name") or "",
+                        arguments=_arguments((call.get("function") or {}).get("arguments")),
+                    )
+                    for call in message["tool_calls"]
+                ],
+                usage=_usage(data.get("usage")),
+                thought=(message.get("content") or "").strip() or None,
+                cached=False,
+                timings=data.get("timings"),
+            )
+        return DockerCreateResult(
+            finish_reason=_finish_reason(choice.get("finish_reason")),
+            content=text,
+            usage=_usage(data.get("usage")),
+            cached=False,
+            timings=data.get("timings"),
+        )
 
     async def create_stream(self, messages: list, model: str = None, **kwargs):
-        model = model or self.default_model
-        if not model:
-            raise ValueError("Model must be provided for DockerProvider.create_stream()")
-        # flatten chat messages into an OpenAI‑style prompt
-        lines = []
-        for m in messages:
-            role = getattr(m, "role", getattr(m, "source", "user"))
-            content = getattr(m, "content", "")
-            lines.append(f"{role}: {content}")
-        prompt = "\n".join(lines) + "\nassistant:"
         """
-        Proxy streaming completions; yields chunk dicts like OpenAI.
+        Proxy streaming completions. Yields each text delta as it arrives (unmodified),
+        then a CreateResult with the whole text (or the tool calls) and the token usage,
+        as autogen's ChatCompletionClient.create_stream does.
         """
-        # ensure we never double up a /chat segment
-        base = self.base_url.rstrip("/")
-        base = base.replace("/chat", "")
-        url = f"{base}/completions"
-        serializable_kwargs = {}
-        for k, v in kwargs.items():
-            try:
-                json.dumps(v)
-                serializable_kwargs[k] = v
-            except (TypeError, OverflowError):
-                # skip non-serializable values like CancellationToken
-                continue
-        payload = {"model": model, "prompt": prompt, "stream": True, **serializable_kwargs}
+        url, body = self.build_request(messages, model=model, stream=True, **kwargs)
         timeout = Timeout(connect=10.0, read=300.0, write=300.0, pool=10.0)
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            try:
-                streamer = client.stream("POST", url, json=payload)
-            except ReadTimeout:
-                # retry once on timeout
-                streamer = client.stream("POST", url, json=payload)
-            yielded = False
-            async with streamer as resp:
-                resp.raise_for_status()
-                async for line in resp.aiter_lines():
-                    if not line.startswith("data:"):
-                        continue
-                    data = line[len("data:"):].strip()
-                    if data == "[DONE]":
-                        break
-                    chunk = json.loads(data)
-                    text = chunk.get("choices", [{}])[0].get("text")
-                    if not isinstance(text, str):
-                        text = str(text) if text is not None else "[no response from model]"
-                    text = text.strip()
-                    if text:
-                        yielded = True
-                        yield {
-                            "type": "chat_message",
-                            "role": "assistant",
-                            "content": text,
-                            "source": "docker"
-                        }
-                if not yielded:
-                    yield {
-                        "type": "chat_message",
-                        "role": "assistant",
-                        "content": "[no result]",
-                        "source": "docker"
-                    }
\ No newline at end of file
+        client = http_clients.client_for(url)
+        parts = []
+        tool_calls = {}
+        usage = None
+        timings = None
+        finish_reason = None
+        async with client.stream("POST", url, content=body, headers={"Content-Type": "application/json"}, timeout=timeout) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+                if chunk.get("timings"):
+                    timings = chunk["timings"]
+                choices = chunk.get("choices") or [{}]
+                finish_reason = choices[0].get("finish_reason") or finish_reason
+                delta = choices[0].get("delta") or {}
+                # tool call arguments arrive in fragments, keyed by index
+                for call in delta.get("tool_calls") or []:
+                    entry = tool_calls.setdefault(call.get("index", 0), {"id": "", "name": "", "arguments": ""})
+                    function = call.get("function") or {}
+                    entry["id"] = call.get("id") or entry["id"]
+                    entry["name"] += function.get("name") or ""
+                    entry["arguments"] += function.get("arguments") or ""
+                text = delta.get("content") if self.api_mode == "chat" else choices[0].get("text")
+                if isinstance(text, str) and text:
+                    parts.append(text)
+                    yield text
+        usage = _usage(usage)
+        if tool_calls:
+            yield DockerCreateResult(
+                finish_reason="function_calls",
+                content=[FunctionCall(id=c["id"], name=c["name"], arguments=c["arguments"]) for _, c in sorted(tool_calls.items())],
+                usage=usage,
+                thought="".join(parts).strip() or None,
+                cached=False,
+                timings=timings,
+            )
+            return
+        content = "".join(parts).strip() or "[no result]"
+        yield DockerCreateResult(
+            finish_reason=_finish_reason(finish_reason),
+            content=content,
+            usage=usage,
+            cached=False,
+            timings=timings,
+        )
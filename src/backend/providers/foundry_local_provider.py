@@ -1,13 +1,18 @@
 import httpx
 import json
-import asyncio
+
+from providers.http_pool import http_clients
 
 class FoundryResponse:
-    def __init__(self, content, ledger_info=None):
+    def __init__(self, content, ledger_info=None, usage=None):
         self.content = content
         self.ledger_info = ledger_info or {}
+        self.usage = usage
 
 class FoundryLocalClient:
+    # every request is sampled at this temperature
+    default_temperature = 0.7
+
     def __init__(self, base_url, model):
         self.base_url = base_url
         self.model = model
@@ -35,7 +40,7 @@ class FoundryLocalClient:
         payload = {
             "model": self.model,
             "messages": formatted_messages,
-            "temperature": 0.7,
+            "temperature": self.default_temperature,
             "max_tokens": 1024,
             "json_output": json_output
         }
@@ -43,56 +48,30 @@ class FoundryLocalClient:
         print("DEBUG Foundry Payload:")
         print(json.dumps(payload, indent=2))
 
-        async with httpx.AsyncClient(timeout=httpx.Timeout(180.0)) as client:
-            for attempt in range(3):
-                try:
-                    resp = await client.post(f"{self.base_url}/v1/chat/completions", json=payload)
-                    resp.raise_for_status()
-                    data = resp.json()
-
-                    # Ensure model response includes ledger_info at top level if missing
-                    if 'choices' in data and isinstance(data['choices'], list) and data['choices']:
-                        message_obj = data['choices'][0].get('message', {})
-                        if 'ledger_info' not in message_obj or not isinstance(message_obj['ledger_info'], dict):
-                            print("WARNING: Model response missing ledger_info, requesting model to regenerate.")
-                            # Optionally add a regeneration logic here, for now raise a clean error
-                            raise ValueError("Model response did not contain valid ledger_info. Aborting orchestration.")
-                    else:
-                        print("ERROR: No choices returned in response.")
-                        raise ValueError("Model response did not contain choices. Aborting orchestration.")
-
-                    # Extract assistant message
-                    choices = data.get("choices", [])
-
-                    if choices:
-                        message_obj = choices[0].get("message", {})
-                        assistant_message = message_obj.get("content", "")
-                        ledger_info = message_obj.get("ledger_info")
-                        if ledger_info is None:
-                            ledger_info = {}
-                            print(f"INFO: ledger_info not available in response (attempt {attempt + 1}). Proceeding without ledger_info.")
-
-                    else:
-                        assistant_message = ""
-                        ledger_info = {}
-                        print(f"INFO: No choices returned in response (attempt {attempt + 1}).")
-
-                    # Removed fallback injection logic as per instructions
-
-                    return FoundryResponse(content=assistant_message, ledger_info=ledger_info)
-
-                except httpx.ReadTimeout:
-                    print(f"WARNING: Timeout on attempt {attempt + 1}")
-                    if attempt < 2:
-                        await asyncio.sleep(2)
-                    else:
-                        return FoundryResponse(content="Timeout occurred. Please try again later.")
-                except httpx.HTTPStatusError as exc:
-                    print(f"HTTP error: {exc}")
-                    return FoundryResponse(content=f"HTTP error {exc.response.status_code}")
-                except Exception as exc:
-                    print(f"Unexpected error: {exc}")
-                    raise
+        client = http_clients.client_for(self.base_url)
+        # one attempt: timeouts and HTTP errors reach the concurrency limiter and the router,
+        # which own retrying and backing off
+        resp = await client.post(f"{self.base_url}/v1/chat/completions", json=payload, timeout=httpx.Timeout(180.0))
+        resp.raise_for_status()
+        data = resp.json()
+
+        # Ensure model response includes ledger_info at top level if missing
+        if 'choices' in data and isinstance(data['choices'], list) and data['choices']:
+            message_obj = data['choices'][0].get('message', {})
+            if 'ledger_info' not in message_obj or not isinstance(message_obj['ledger_info'], dict):
+                print("WARNING: Model response missing ledger_info, requesting model to regenerate.")
+                # Optionally add a regeneration logic here, for now raise a clean error
+                raise ValueError("Model response did not contain valid ledger_info. Aborting orchestration.")
+        else:
+            print("ERROR: No choices returned in response.")
+            raise ValueError("Model response did not contain choices. Aborting orchestration.")
+
+        # Extract assistant message
+        message_obj = data["choices"][0].get("message", {})
+        assistant_message = message_obj.get("content", "")
+        ledger_info = message_obj.get("ledger_info") or {}
+
+        return FoundryResponse(content=assistant_message, ledger_info=ledger_info, usage=data.get("usage"))
 
 class FoundryLocalProvider:
     def __init__(self):
@@ -0,0 +1,182 @@
+# File: providers/http_pool.py
+"""
+Shared, pooled ``httpx.AsyncClient`` per origin.
+
+Providers and web tools used to open a fresh AsyncClient for every call, which
+means a new TCP (and often TLS) handshake for every LLM turn. They now borrow a
+long-lived client from ``http_clients``. Providers get one client per
+scheme://host:port (``client_for``), with keep-alive connections kept in its
+pool. At most HTTP_POOL_MAX_ORIGINS of them are kept; the least recently used
+one is evicted and closed once its in-flight requests are done. The web tools,
+which fetch arbitrary URLs, share a single client (``web_client``) whose
+keep-alive pool is bounded across all the sites it visits. Callers keep
+passing their own per-request timeouts. Everything is closed in the FastAPI
+lifespan.
+
+Configuration:
+  HTTP_POOL_MAX_CONNECTIONS   connections per client (default 100)
+  HTTP_POOL_MAX_KEEPALIVE     idle keep-alive connections per client (default 20)
+  HTTP_POOL_MAX_ORIGINS       per-origin clients kept (default 32)
+  HTTP_POOL_KEEPALIVE_EXPIRY  seconds an idle connection is kept (default 30)
+  HTTP_CONNECT_TIMEOUT / HTTP_READ_TIMEOUT / HTTP_POOL_TIMEOUT  defaults (10 / 300 / 10)
+  HTTP_HTTP2                  "true" to negotiate HTTP/2 (needs the h2 package)
+"""
+
+import os
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100"))
+HTTP_POOL_MAX_KEEPALIVE = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "20"))
+HTTP_POOL_MAX_ORIGINS = int(os.getenv("HTTP_POOL_MAX_ORIGINS", "32"))
+HTTP_POOL_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_POOL_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "300"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "10"))
+HTTP_HTTP2 = os.getenv("HTTP_HTTP2", "false").lower() == "true"
+
+
+def origin_of(url: str) -> str:
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    return f"{parts.scheme}://{parts.hostname}:{port}"
+
+
+class HttpClientManager:
+    def __init__(
+        self,
+        max_connections: int = HTTP_POOL_MAX_CONNECTIONS,
+        max_keepalive: int = HTTP_POOL_MAX_KEEPALIVE,
+        keepalive_expiry: float = HTTP_POOL_KEEPALIVE_EXPIRY,
+        http2: bool = HTTP_HTTP2,
+        timeout: Optional[httpx.Timeout] = None,
+        max_origins: int = HTTP_POOL_MAX_ORIGINS,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        self.timeout = timeout or httpx.Timeout(
+            connect=HTTP_CONNECT_TIMEOUT, read=HTTP_READ_TIMEOUT, write=HTTP_READ_TIMEOUT, pool=HTTP_POOL_TIMEOUT
+        )
+        self.max_origins = max(1, max_origins)
+        self._clients: "OrderedDict[str, httpx.AsyncClient]" = OrderedDict()
+        self._web: Optional[httpx.AsyncClient] = None
+        self._requests: Dict[str, int] = {}
+        self._retiring: set = set()
+        self._evictions = 0
+
+    def _new_client(self, name: str) -> httpx.AsyncClient:
+        async def count_request(request: httpx.Request):
+            self._requests[name] = self._requests.get(name, 0) + 1
+
+        kwargs = dict(limits=self.limits, timeout=self.timeout, event_hooks={"request": [count_request]})
+        if self.http2:
+            try:
+                return httpx.AsyncClient(http2=True, **kwargs)
+            except ImportError:
+                logger.warning("HTTP_HTTP2 is set but the h2 package is not installed; using HTTP/1.1.")
+                self.http2 = False
+        return httpx.AsyncClient(**kwargs)
+
+    def client_for(self, url: str) -> httpx.AsyncClient:
+        """The shared client for the origin of ``url``; never close it yourself."""
+        origin = origin_of(url)
+        client = self._clients.get(origin)
+        if client is None or client.is_closed:
+            client = self._new_client(origin)
+            self._clients[origin] = client
+            while len(self._clients) > self.max_origins:
+                evicted_origin, evicted = self._clients.popitem(last=False)
+                self._evictions += 1
+                self._requests.pop(evicted_origin, None)
+                self._retire(evicted_origin, evicted)
+        else:
+            self._clients.move_to_end(origin)
+        return client
+
+    def web_client(self) -> httpx.AsyncClient:
+        """The one client shared by the web tools, whatever site they fetch."""
+        if self._web is None or self._web.is_closed:
+            self._web = self._new_client("web")
+        return self._web
+
+    def _retire(self, origin: str, client: httpx.AsyncClient):
+        try:
+            task = asyncio.get_running_loop().create_task(self._close_when_idle(origin, client))
+        except RuntimeError:
+            # no loop (shutdown or a sync caller): nothing can be in flight on it
+            return
+        self._retiring.add(task)
+        task.add_done_callback(self._retiring.discard)
+
+    async def _close_when_idle(self, origin: str, client: httpx.AsyncClient):
+        # requests already holding the evicted client may still be using it
+        deadline = asyncio.get_running_loop().time() + (self.timeout.read or 300)
+        while asyncio.get_running_loop().time() < deadline:
+            connections = self._connections(client)
+            if connections is None or not connections["active"]:
+                break
+            await asyncio.sleep(1)
+        await self._close(origin, client)
+
+    @staticmethod
+    async def _close(name: str, client: httpx.AsyncClient):
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"Failed to close HTTP client for {name}: {e}")
+
+    async def aclose(self):
+        for task in list(self._retiring):
+            task.cancel()
+        await asyncio.gather(*self._retiring, return_exceptions=True)
+        clients, self._clients = self._clients, OrderedDict()
+        for origin, client in clients.items():
+            await self._close(origin, client)
+        if self._web is not None:
+            web, self._web = self._web, None
+            await self._close("web", web)
+
+    @staticmethod
+    def _connections(client: httpx.AsyncClient) -> Optional[Dict[str, int]]:
+        # httpx does not expose its pool; read httpcore's when it is there
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is None:
+            return None
+        idle = sum(1 for c in connections if c.is_idle())
+        return {"open": len(connections), "idle": idle, "active": len(connections) - idle}
+
+    def stats(self) -> Dict:
+        return {
+            "http2": self.http2,
+            "limits": {
+                "max_connections": self.limits.max_connections,
+                "max_keepalive_connections": self.limits.max_keepalive_connections,
+                "keepalive_expiry": self.limits.keepalive_expiry,
+                "max_origins": self.max_origins,
+            },
+            "evictions": self._evictions,
+            "retiring": len(self._retiring),
+            "origins": {
+                origin: {"requests": self._requests.get(origin, 0), "connections": self._connections(client)}
+                for origin, client in self._clients.items()
+            },
+            "web": {
+                "requests": self._requests.get("web", 0),
+                "connections": self._connections(self._web) if self._web is not None else None,
+            },
+        }
+
+
+http_clients = HttpClientManager()
@@ -2,9 +2,10 @@
 A thin proxy that lets agents call your TypeScript MCP helpers
 through a local FastAPI micro-service.
 """
-import httpx
 from autogen_core import BaseAgent
 
+from providers.http_pool import http_clients
+
 # TextMessage location differs across autogen-core versions
 try:
     from autogen_core.messages import TextMessage  # ≥ 0.5.8
@@ -21,11 +22,12 @@ class MCPProvider(BaseAgent):
     def __init__(self, base_url="http://localhost:7000/mcp", name="MCPAction", **kw):
         super().__init__(name=name, description="Foundry / GitHub / Ollama actions", **kw)
         self.base_url = base_url
-        self.client = httpx.AsyncClient(timeout=30)
+        # shared keep-alive client for the micro-service's origin
+        self.client = http_clients.client_for(base_url)
 
     async def ask(self, msg: TextMessage, **ctx) -> TextMessage:
         resp = await self.client.post(f"{self.base_url}/exec",
-                                      json={"cmd": msg.content})
+                                      json={"cmd": msg.content}, timeout=30)
         resp.raise_for_status()
         return TextMessage(content=resp.text, source=self.name)
 
@@ -0,0 +1,315 @@
+# File: providers/mcp_worker_pool.py
+"""
+Pool of long-lived ``mcp_server.py`` worker processes for tool calls.
+
+``OllamaProvider.dispatch_tool_call`` used to start ``python3 mcp_server.py``
+for every tool call. That cost about a second of interpreter, FastMCP and
+Azure SDK start-up per call, and it blocked the event loop in
+``communicate``. The pool now keeps MCP_WORKER_POOL_SIZE workers running in
+stdio mode. They speak newline-delimited JSON-RPC: every request carries an
+id, so many calls can be in flight on one worker and are matched to their
+futures as the answers arrive. Calls go to the least busy live worker.
+
+A health loop pings every worker each MCP_WORKER_HEALTH_INTERVAL seconds. A
+worker that exited or stopped answering is restarted, and the calls it had in
+flight fail with ``MCPWorkerError``. They are not retried, because tools such
+as the mailer are not idempotent.
+
+The worker answers pings inline, so a ping alone does not show that its tool
+threads are free. A call that times out keeps its thread until the late answer
+arrives, and the pool remembers it. A worker is also restarted when every one
+of its MCP_WORKER_THREADS threads is held by such a call, or after
+MCP_WORKER_MAX_TIMEOUTS call timeouts in a row.
+
+Configuration:
+  MCP_WORKER_POOL_SIZE        worker processes (default 2)
+  MCP_WORKER_CALL_TIMEOUT     seconds per tool call (default 60)
+  MCP_WORKER_HEALTH_INTERVAL  seconds between pings (default 30)
+  MCP_WORKER_LINE_LIMIT       largest response line in bytes (default 16 MiB)
+  MCP_WORKER_THREADS          tool threads per worker, as in mcp_server.py (default 4)
+  MCP_WORKER_MAX_TIMEOUTS     consecutive call timeouts before a restart (default 3)
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import itertools
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MCP_WORKER_POOL_SIZE = int(os.getenv("MCP_WORKER_POOL_SIZE", "2"))
+MCP_WORKER_CALL_TIMEOUT = float(os.getenv("MCP_WORKER_CALL_TIMEOUT", "60"))
+MCP_WORKER_HEALTH_INTERVAL = float(os.getenv("MCP_WORKER_HEALTH_INTERVAL", "30"))
+MCP_WORKER_LINE_LIMIT = int(os.getenv("MCP_WORKER_LINE_LIMIT", str(16 * 1024 * 1024)))
+MCP_WORKER_THREADS = int(os.getenv("MCP_WORKER_THREADS", "4"))
+MCP_WORKER_MAX_TIMEOUTS = int(os.getenv("MCP_WORKER_MAX_TIMEOUTS", "3"))
+
+MCP_SERVER_PATH = Path(__file__).resolve().parent.parent / "mcp_server.py"
+
+
+class MCPWorkerError(RuntimeError):
+    """The worker failed (exited, timed out or spoke garbage); the tool may not have run."""
+
+
+class MCPWorkerTimeout(MCPWorkerError):
+    """The worker did not answer in time; the tool may still be running."""
+
+
+class MCPToolError(RuntimeError):
+    """The tool ran and reported an error."""
+
+
+class _Worker:
+    def __init__(self, index: int, command: List[str]):
+        self.index = index
+        self.command = command
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.ids = itertools.count(1)
+        self.started_at: Optional[float] = None
+        self.calls = 0
+        self.checking = False
+        # calls that timed out and have not been answered since: their threads may be hung
+        self.abandoned: set = set()
+        self.timeouts = 0  # call timeouts in a row
+        self._reader: Optional[asyncio.Task] = None
+        self._stderr: Optional[asyncio.Task] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env={**os.environ, "MCP_TRANSPORT": "stdio"},
+            limit=MCP_WORKER_LINE_LIMIT,
+        )
+        self.started_at = time.monotonic()
+        self._reader = asyncio.create_task(self._read_responses())
+        self._stderr = asyncio.create_task(self._drain_stderr())
+        logger.info(f"MCP worker {self.index} started (pid {self.process.pid})")
+
+    async def _read_responses(self):
+        try:
+            while True:
+                line = await self.process.stdout.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"MCP worker {self.index} wrote a non-JSON line: {line[:200]!r}")
+                    continue
+                self.abandoned.discard(message.get("id"))
+                future = self.pending.pop(message.get("id"), None)
+                if future is None or future.done():
+                    continue
+                if "error" in message:
+                    future.set_exception(MCPToolError(message["error"].get("message", str(message["error"]))))
+                else:
+                    future.set_result(message.get("result"))
+        except Exception as e:
+            logger.error(f"MCP worker {self.index} reader failed: {e}")
+        finally:
+            self._fail_pending(MCPWorkerError(f"MCP worker {self.index} exited"))
+
+    async def _drain_stderr(self):
+        # tool logs; an unread pipe would eventually block the worker
+        while True:
+            line = await self.process.stderr.readline()
+            if not line:
+                return
+            logger.debug(f"[mcp worker {self.index}] {line.decode(errors='replace').rstrip()}")
+
+    def _fail_pending(self, error: Exception):
+        pending, self.pending = self.pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    async def request(self, method: str, params: Optional[dict] = None, timeout: float = MCP_WORKER_CALL_TIMEOUT) -> Any:
+        if not self.alive:
+            raise MCPWorkerError(f"MCP worker {self.index} is not running")
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        line = json.dumps({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or {}}) + "\n"
+        try:
+            self.process.stdin.write(line.encode("utf-8"))
+            await self.process.stdin.drain()
+            result = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            if method != "ping":
+                self.abandoned.add(request_id)
+                self.timeouts += 1
+            raise MCPWorkerTimeout(f"MCP worker {self.index} did not answer '{method}' within {timeout}s")
+        except MCPToolError:
+            self.timeouts = 0
+            raise
+        except (BrokenPipeError, ConnectionResetError) as e:
+            raise MCPWorkerError(f"MCP worker {self.index} is gone: {e}")
+        finally:
+            self.pending.pop(request_id, None)
+        if method != "ping":
+            self.timeouts = 0
+        return result
+
+    async def stop(self):
+        if self.process is not None and self.process.returncode is None:
+            try:
+                self.process.stdin.close()
+                await asyncio.wait_for(self.process.wait(), 5)
+            except (asyncio.TimeoutError, ProcessLookupError, BrokenPipeError, ConnectionResetError):
+                try:
+                    self.process.kill()
+                except ProcessLookupError:
+                    pass
+                await self.process.wait()
+        for task in (self._reader, self._stderr):
+            if task is not None:
+                task.cancel()
+        self._fail_pending(MCPWorkerError(f"MCP worker {self.index} stopped"))
+
+
+class MCPWorkerPool:
+    def __init__(
+        self,
+        size: int = MCP_WORKER_POOL_SIZE,
+        command: Optional[List[str]] = None,
+        call_timeout: float = MCP_WORKER_CALL_TIMEOUT,
+        health_interval: float = MCP_WORKER_HEALTH_INTERVAL,
+        worker_threads: int = MCP_WORKER_THREADS,
+        max_timeouts: int = MCP_WORKER_MAX_TIMEOUTS,
+    ):
+        self.size = max(1, size)
+        self.command = command or [sys.executable, str(MCP_SERVER_PATH)]
+        self.call_timeout = call_timeout
+        self.health_interval = health_interval
+        self.worker_threads = max(1, worker_threads)
+        self.max_timeouts = max(1, max_timeouts)
+        self._workers: List[_Worker] = []
+        self._lock = asyncio.Lock()
+        self._health: Optional[asyncio.Task] = None
+        self._checks: set = set()
+        self._metrics = {"calls": 0, "tool_errors": 0, "worker_errors": 0, "restarts": 0, "hung_restarts": 0}
+
+    async def start(self):
+        async with self._lock:
+            if self._workers:
+                return
+            workers = [_Worker(i, self.command) for i in range(self.size)]
+            await asyncio.gather(*(w.start() for w in workers))
+            self._workers = workers
+            self._health = asyncio.create_task(self._health_loop())
+
+    async def stop(self):
+        if self._health is not None:
+            self._health.cancel()
+            self._health = None
+        for task in list(self._checks):
+            task.cancel()
+        workers, self._workers = self._workers, []
+        await asyncio.gather(*(w.stop() for w in workers), return_exceptions=True)
+
+    async def _restart(self, worker: _Worker):
+        logger.warning(f"Restarting MCP worker {worker.index}")
+        self._metrics["restarts"] += 1
+        await worker.stop()
+        replacement = _Worker(worker.index, self.command)
+        await replacement.start()
+        if worker in self._workers:
+            self._workers[self._workers.index(worker)] = replacement
+
+    async def _check(self, worker: _Worker):
+        if worker.checking or worker not in self._workers:
+            # already being checked, or replaced meanwhile
+            return
+        worker.checking = True
+        try:
+            await self._check_worker(worker)
+        finally:
+            worker.checking = False
+
+    def _hung(self, worker: _Worker) -> bool:
+        return len(worker.abandoned) >= self.worker_threads or worker.timeouts >= self.max_timeouts
+
+    async def _check_worker(self, worker: _Worker):
+        if worker.alive and self._hung(worker):
+            logger.warning(
+                f"MCP worker {worker.index} looks hung ({len(worker.abandoned)} unanswered calls, "
+                f"{worker.timeouts} timeouts in a row)"
+            )
+            self._metrics["hung_restarts"] += 1
+        elif worker.alive:
+            try:
+                await worker.request("ping", timeout=min(10.0, self.call_timeout))
+                return
+            except MCPWorkerError as e:
+                logger.warning(str(e))
+        try:
+            await self._restart(worker)
+        except Exception as e:
+            logger.error(f"Failed to restart MCP worker {worker.index}: {e}")
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await asyncio.gather(*(self._check(w) for w in list(self._workers)))
+
+    def _pick(self) -> _Worker:
+        alive = [w for w in self._workers if w.alive]
+        if not alive:
+            raise MCPWorkerError("No MCP worker is running")
+        return min(alive, key=lambda w: len(w.pending))
+
+    async def call_tool(self, name: str, args: dict, timeout: Optional[float] = None) -> Any:
+        """Run an MCP tool on a worker and return its result."""
+        if not self._workers:
+            await self.start()
+        worker = self._pick()
+        worker.calls += 1
+        self._metrics["calls"] += 1
+        try:
+            return await worker.request("call_tool", {"tool": name, "args": args}, timeout=timeout or self.call_timeout)
+        except MCPToolError:
+            self._metrics["tool_errors"] += 1
+            raise
+        except MCPWorkerError:
+            self._metrics["worker_errors"] += 1
+            # a hung or dead worker is replaced now instead of at the next health check
+            task = asyncio.create_task(self._check(worker))
+            self._checks.add(task)
+            task.add_done_callback(self._checks.discard)
+            raise
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        return {
+            **self._metrics,
+            "size": self.size,
+            "workers": [
+                {
+                    "index": w.index,
+                    "pid": w.process.pid if w.process is not None else None,
+                    "alive": w.alive,
+                    "in_flight": len(w.pending),
+                    "abandoned": len(w.abandoned),
+                    "timeouts": w.timeouts,
+                    "calls": w.calls,
+                    "uptime_seconds": round(now - w.started_at, 1) if w.started_at else None,
+                }
+                for w in self._workers
+            ],
+        }
+
+
+mcp_workers = MCPWorkerPool()
@@ -5,7 +5,15 @@ logger = logging.getLogger(__name__)
 from autogen_ext.models.ollama import OllamaChatCompletionClient
 from autogen_core.models import UserMessage
 
+from providers.mcp_worker_pool import mcp_workers, MCPToolError
+
+# the keyword arguments OllamaChatCompletionClient.create/create_stream accept; the rest are sampling options
+_CLIENT_ARGS = ("tools", "tool_choice", "json_output", "extra_create_args", "cancellation_token")
+
 class OllamaProvider:
+    # applied when a call sets no temperature; the response cache treats these calls as sampled
+    default_temperature = 0.3
+
     def __init__(self, model: str = "mistral:instruct", base_url: str = "http://localhost:11434/v1"):
         self.model = model
         self.base_url = base_url
@@ -20,15 +28,24 @@ class OllamaProvider:
             normalized.append(UserMessage(content=content, source=role))
         return normalized
 
+    def _create_args(self, kwargs: dict) -> dict:
+        """
+        Arguments for the autogen client: temperature, top_p and the other sampling
+        settings travel to Ollama in ``extra_create_args["options"]``.
+        """
+        args = {name: kwargs.pop(name) for name in _CLIENT_ARGS if name in kwargs}
+        args.setdefault("tool_choice", "auto")
+        options = {"temperature": self.default_temperature, "top_p": 0.8, **kwargs}
+        extra = dict(args.get("extra_create_args") or {})
+        extra["options"] = {**options, **(extra.get("options") or {})}
+        args["extra_create_args"] = extra
+        return args
+
     async def create(self, messages: list, **kwargs):
         import re
         logger.debug(f"OllamaProvider.create called with {len(messages)} messages")
         user_messages = self._normalize_messages(messages)
-        tool_choice = kwargs.pop("tool_choice", "auto")
-        tools = kwargs.pop("tools", None)
-        kwargs.setdefault("temperature", 0.3)
-        kwargs.setdefault("top_p", 0.8)
-        response = await self.client.create(user_messages, tools=tools, tool_choice=tool_choice, **kwargs)
+        response = await self.client.create(user_messages, **self._create_args(kwargs))
         content = response.content.strip()
         match = re.search(r"^.*?[.!?](?:\s|$)", content)
         brief = match.group(0).strip() if match else content.splitlines()[0]
@@ -40,6 +57,8 @@ class OllamaProvider:
             "source": "ollama",
             "is_terminated": True
         }
+        if getattr(response, "usage", None) is not None:
+            result["usage"] = {"prompt_tokens": response.usage.prompt_tokens, "completion_tokens": response.usage.completion_tokens}
         if hasattr(response, "tool_calls") and response.tool_calls:
             logger.debug(f"Tool calls detected: {[t.name for t in response.tool_calls]}")
             result["tool_calls"] = response.tool_calls
@@ -50,7 +69,7 @@ class OllamaProvider:
                     func_name = call.function.name
                     arguments = json.loads(call.function.arguments)
 
-                    result_value = self.dispatch_tool_call(func_name, arguments)
+                    result_value = await self.dispatch_tool_call(func_name, arguments)
                     logger.info(f"Executed tool '{func_name}' with result: {result_value}")
                     result["tool_responses"].append({
                         "name": func_name,
@@ -61,50 +80,25 @@ class OllamaProvider:
         return result
 
     async def create_stream(self, messages: list, **kwargs):
-        import re
+        """Yield text deltas as Ollama produces them, then the final CreateResult (with usage)."""
         logger.debug(f"OllamaProvider.create_stream called with {len(messages)} messages")
         user_messages = self._normalize_messages(messages)
-        tool_choice = kwargs.pop("tool_choice", "auto")
-        tools = kwargs.pop("tools", None)
-        kwargs.setdefault("temperature", 0.3)
-        kwargs.setdefault("top_p", 0.8)
-        yielded = False
-        async for chunk in self.client.create_stream(user_messages, tools=tools, tool_choice=tool_choice, **kwargs):
-            content = chunk.content.strip()
-            match = re.search(r"^.*?[.!?](?:\s|$)", content)
-            if match:
-                content = match.group(0).strip()
-                yielded = True
-                yield {
-                    "type": "chat_message",
-                    "role": "assistant",
-                    "content": content,
-                    "source": "ollama",
-                    "is_terminated": True
-                }
-                return
-        if not yielded:
-            yield {
-                "type": "chat_message",
-                "role": "assistant",
-                "content": "[no response]",
-                "source": "ollama",
-                "is_terminated": True
-            }
+        async for chunk in self.client.create_stream(user_messages, **self._create_args(kwargs)):
+            yield chunk
 
     async def close(self):
         await self.client.close()
 
     def get_client(self, model=None):
         if model and model != self.model:
-            logger.info(f"Switching Ollama model from '{self.model}' to '{model}'")
-            self.model = model
-            self.client = OllamaChatCompletionClient(model=model, base_url=self.base_url)
+            # a new client for the other model; self.client stays on self.model for the sessions using it
+            logger.info(f"Creating Ollama client for model '{model}'")
+            return OllamaChatCompletionClient(model=model, base_url=self.base_url)
         return self.client
 
   
 
-    def dispatch_tool_call(self, name: str, args: dict):
+    async def dispatch_tool_call(self, name: str, args: dict):
         logger.info(f"Dispatching tool call: {name}({args})")
 
         # FORCE all tool calls via MCP proxy — do NOT check for local methods
@@ -114,28 +108,15 @@ class OllamaProvider:
         logger.warning(f"Tool name received for MCP proxy: '{name}'")
 
         # 2. Try MCP proxy fallback with normalization
+        tool_name = name.lower().replace(" ", "_")
+        logger.info(f"Normalized tool name: {tool_name}")
         try:
-            import subprocess
-            import os
-            from pathlib import Path
-            backend_dir = Path(__file__).resolve().parent.parent
-            mcp_path = backend_dir / "mcp_server.py"
-
-            tool_name = name.lower().replace(" ", "_")
-            logger.info(f"Normalized tool name: {tool_name}")
-            request = {"tool": tool_name, "args": args}
-            proc = subprocess.Popen(
-                ["python3", str(mcp_path)],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            stdout, stderr = proc.communicate(input=json.dumps(request))
-            if proc.returncode != 0:
-                logger.error(f"Tool execution failed: {stderr.strip()}")
-                return f"[MCP subprocess error: {stderr.strip()}]"
-            return stdout.strip()
+            # long-lived mcp_server.py workers instead of a new interpreter per call
+            result = await mcp_workers.call_tool(tool_name, args)
+            return json.dumps({"result": result}, default=str)
+        except MCPToolError as e:
+            logger.error(f"Tool execution failed: {e}")
+            return json.dumps({"error": str(e)})
         except Exception as e:
             logger.error(f"Error proxying tool '{name}' to MCP: {e}")
-            return f"[MCP proxy error: {e}]"
\ No newline at end of file
+            return f"[MCP proxy error: {e}]"
@@ -1,23 +1,151 @@
-from providers.azure_openai_provider import AzureOpenAIProvider
-from providers.ollama_provider import OllamaProvider
-from providers.docker_provider import DockerProvider
-from providers.github_provider import GitHubProvider
-from providers.foundry_local_provider import FoundryLocalProvider
-from providers.llamaindex_provider import LlamaIndexProvider
-from providers.mcp_provider import MCPProvider
-from providers.ai_foundry_provider import AiFoundryProvider
+# File: providers/registry.py
+"""
+Registry of LLM providers, built lazily.
+
+Importing this module used to construct every provider: the Ollama one built
+an OllamaChatCompletionClient, and LlamaIndexProvider pulled in llama_index and
+chromadb. That cost showed up on every cold start of the API and of the
+``ag_mo_helper`` CLI. The registry now holds factories, given as
+"module:attribute" paths plus constructor arguments. A provider module is
+imported and its provider built the first time the provider is used.
+
+``client_for(name, model)`` returns the model client of a provider for a model.
+Clients are kept in a ``ClientCache`` keyed by (provider, model, base_url).
+A running session holds its client with ``acquire_client`` / ``release_client``,
+so the client is not evicted under it. ``aclose()`` closes the clients and
+providers that were built; the API calls it on shutdown.
+
+With LLM_CACHE on, the clients are wrapped in the response cache of
+``client_wrapper``.
+
+``PROVIDERS.get(name)`` keeps the dict interface the callers already use.
+"""
+
 import os
-PROVIDERS = {
-    "docker": DockerProvider(
+import inspect
+import logging
+import importlib
+from typing import Any, Callable, Dict, Optional
+
+from providers.client_cache import ClientCache, close_client
+from providers.client_wrapper import wrap_client
+
+logger = logging.getLogger(__name__)
+
+
+def lazy(target: str, *args, **kwargs) -> Callable[[], Any]:
+    """
+    Factory for "module:attribute". It imports the module when called and returns
+    ``attribute(*args, **kwargs)``, or the attribute itself with ``construct=False``.
+    """
+    construct = kwargs.pop("construct", True)
+
+    def factory():
+        module_name, _, attribute = target.partition(":")
+        value = getattr(importlib.import_module(module_name), attribute)
+        return value(*args, **kwargs) if construct else value
+
+    factory.target = target
+    return factory
+
+
+class ProviderRegistry:
+    def __init__(self, factories: Optional[Dict[str, Callable[[], Any]]] = None, clients: Optional[ClientCache] = None):
+        self._factories: Dict[str, Callable[[], Any]] = dict(factories or {})
+        self._providers: Dict[str, Any] = {}
+        self.clients = clients if clients is not None else ClientCache()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        self._factories[name] = factory
+        self._providers.pop(name, None)
+
+    def names(self):
+        return list(self._factories)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._factories
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """The provider registered as ``name``, built on first use."""
+        if name in self._providers:
+            return self._providers[name]
+        factory = self._factories.get(name)
+        if factory is None:
+            return default
+        logger.info(f"Building provider '{name}' ({getattr(factory, 'target', factory)})")
+        provider = factory()
+        self._providers[name] = provider
+        return provider
+
+    def __getitem__(self, name: str) -> Any:
+        provider = self.get(name)
+        if provider is None:
+            raise KeyError(name)
+        return provider
+
+    def _client_args(self, name: str, model: Optional[str]):
+        provider = self.get(name)
+        if provider is None:
+            raise KeyError(name)
+        base_url = getattr(provider, "base_url", None)
+        key = (name, model, base_url)
+
+        def owned(client):
+            # the provider and its default client live as long as the provider; only per-model clients are closed on evict
+            client = getattr(client, "wrapped", client)
+            return client is not provider and client is not getattr(provider, "client", None)
+
+        # wrap_client adds the response cache when LLM_CACHE is on
+        return key, lambda: wrap_client(provider.get_client(model=model), name, model=model, base_url=base_url), owned
+
+    async def client_for(self, name: str, model: Optional[str] = None) -> Any:
+        """The model client of provider ``name`` for ``model``, reused across sessions."""
+        return await self.clients.get(*self._client_args(name, model))
+
+    async def acquire_client(self, name: str, model: Optional[str] = None) -> Any:
+        """``client_for`` for a running session; pair with ``release_client``."""
+        return await self.clients.acquire(*self._client_args(name, model))
+
+    def release_client(self, name: str, model: Optional[str] = None):
+        provider = self._providers.get(name)
+        self.clients.release((name, model, getattr(provider, "base_url", None)))
+
+    async def aclose(self):
+        await self.clients.aclose()
+        providers, self._providers = self._providers, {}
+        for name, provider in providers.items():
+            # classes registered as-is are not closed
+            if inspect.isclass(provider):
+                continue
+            try:
+                await close_client(provider)
+            except Exception as e:
+                logger.warning(f"Failed to close provider '{name}': {e}")
+
+    def stats(self) -> Dict:
+        return {
+            "registered": self.names(),
+            "built": list(self._providers),
+            "clients": self.clients.stats(),
+        }
+
+
+PROVIDERS = ProviderRegistry({
+    "docker": lazy(
+        "providers.docker_provider:DockerProvider",
         base_url="http://localhost:12434/engines/llama.cpp/v1/chat"
-    ).get_client(),
-    "llamaindex": LlamaIndexProvider,
-    "mcp": MCPProvider,
- "AIFOUNDRY_PROVIDER":AiFoundryProvider(
-    base_url="http://localhost:5273/v1",  # or wherever Foundry is running
-    model="foundry/Phi-3-mini-4k-instruct-generic-gpu"  # Update with your deployed model
-),
-"OllamaProvider":OllamaProvider(base_url= os.getenv("LLM_URL", "http://localhost:4000/v1"),  # or wherever Foundry is running
-    model= os.getenv("DEFAULT_MODEL", "mistral:instruct")  # Update with your deployed model)
-)
-}
\ No newline at end of file
+    ),
+    "llamaindex": lazy("providers.llamaindex_provider:LlamaIndexProvider", construct=False),
+    "mcp": lazy("providers.mcp_provider:MCPProvider", construct=False),
+    "AIFOUNDRY_PROVIDER": lazy(
+        "providers.ai_foundry_provider:AiFoundryProvider",
+        base_url="http://localhost:5273/v1",  # or wherever Foundry is running
+        model="foundry/Phi-3-mini-4k-instruct-generic-gpu"  # Update with your deployed model
+    ),
+    "router": lazy("providers.router_provider:RouterProvider"),
+    "OllamaProvider": lazy(
+        "providers.ollama_provider:OllamaProvider",
+        base_url=os.getenv("LLM_URL", "http://localhost:4000/v1"),
+        model=os.getenv("DEFAULT_MODEL", "mistral:instruct")
+    ),
+})
@@ -0,0 +1,408 @@
+# File: providers/router_provider.py
+"""
+Routing provider over several entries of ``PROVIDERS``.
+
+``/start`` and ``/chat-stream`` used to pick one provider by name, with no
+failover. Selecting the "router" provider sends every call to the healthiest
+of the ROUTER_BACKENDS instead, e.g. Ollama and the Docker model runner on
+different hosts:
+
+    ROUTER_BACKENDS="docker=ai/mistral,OllamaProvider=mistral:instruct"
+
+A backend is compatible with the requested model when it serves the same
+model family. "ai/mistral", "mistral:instruct" and "mistral" are all
+"mistral". A backend without a model serves the requested model as is.
+
+Each backend tracks the EWMA of its latency and of its error rate. Calls go
+to the compatible backend with the best score (latency, inflated by errors
+and by calls already in flight). A failed call fails over to the next
+backend; a stream fails over only if it has not yielded anything yet.
+ROUTER_BREAKER_FAILURES consecutive failures open a backend's circuit for
+ROUTER_BREAKER_COOLDOWN seconds. After that, one trial call decides whether
+it closes again.
+
+Only errors that say something about the backend count as failures:
+timeouts, connection errors, and 5xx or 429 responses. Anything else (a 4xx,
+a bad request, a prompt over the context length) would fail the same way on
+every backend. It is raised to the caller without failover, and the
+backend's health is left unchanged.
+
+``with_priority`` and ``with_agent`` return views of the router client whose
+calls go through the same views of the backend clients, so the orchestrator
+lane and the usage accounts work behind the router too.
+
+Hedging (ROUTER_HEDGE_AFTER, off by default): when the chosen backend has not
+answered a ``create`` after that many seconds ("auto": its p95 latency), the
+same request goes to the next backend as well. The first answer wins and the
+other request is cancelled.
+"""
+
+import os
+import re
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from providers.registry import PROVIDERS
+from providers.client_wrapper import wrap_client
+from providers.concurrency_limiter import status_of
+
+logger = logging.getLogger(__name__)
+
+ROUTER_BACKENDS = os.getenv("ROUTER_BACKENDS", "docker,OllamaProvider")
+ROUTER_BREAKER_FAILURES = int(os.getenv("ROUTER_BREAKER_FAILURES", "3"))
+ROUTER_BREAKER_COOLDOWN = float(os.getenv("ROUTER_BREAKER_COOLDOWN", "30"))
+ROUTER_HEDGE_AFTER = os.getenv("ROUTER_HEDGE_AFTER", "")
+
+
+def model_family(model: Optional[str]) -> Optional[str]:
+    """Family of a model name: ai/mistral, mistral:instruct and mistral are all "mistral"."""
+    if not model:
+        return None
+    name = model.strip().lower().rsplit("/", 1)[-1]
+    return re.split(r"[:@]", name, maxsplit=1)[0]
+
+
+def parse_backends(spec: str) -> List[Tuple[str, Optional[str]]]:
+    backends = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, model = entry.partition("=")
+        backends.append((name.strip(), model.strip() or None))
+    return backends
+
+
+# transport errors of httpx, openai and the standard library, matched by name
+_TRANSIENT_ERRORS = {"TimeoutException", "TransportError", "APIConnectionError", "APITimeoutError"}
+
+
+def is_backend_failure(error: BaseException) -> bool:
+    """True when ``error`` means the backend is unhealthy, False when the request itself is at fault."""
+    status = status_of(error)
+    if status is not None:
+        return status >= 500 or status == 429
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return any(cls.__name__ in _TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+class _Backend:
+    def __init__(self, provider_name: str, model: Optional[str]):
+        self.provider_name = provider_name
+        self.model = model
+        self.ewma_latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.latencies = deque(maxlen=200)
+
+    @property
+    def name(self) -> str:
+        return f"{self.provider_name}={self.model}" if self.model else self.provider_name
+
+    def state(self, cooldown: float) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= cooldown:
+            return "half_open"
+        return "open"
+
+    def score(self) -> float:
+        # untried backends score 0 so they get explored
+        latency = self.ewma_latency or 0.0
+        return latency * (1 + 10 * self.error_rate) * (1 + self.in_flight)
+
+    def p95(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def succeeded(self, latency: float):
+        self.ewma_latency = latency if self.ewma_latency is None else 0.8 * self.ewma_latency + 0.2 * latency
+        self.latencies.append(latency)
+        self.error_rate *= 0.9
+        self.consecutive_failures = 0
+        if self.opened_at is not None:
+            logger.info(f"Router backend {self.name} recovered; closing its circuit")
+        self.opened_at = None
+
+    def failed(self, threshold: int):
+        self.failures += 1
+        self.error_rate = 0.9 * self.error_rate + 0.1
+        self.consecutive_failures += 1
+        if self.opened_at is not None or self.consecutive_failures >= threshold:
+            # a failed trial re-opens the circuit for another cooldown
+            if self.opened_at is None:
+                logger.warning(f"Router backend {self.name} failed {self.consecutive_failures} times; opening its circuit")
+            self.opened_at = time.monotonic()
+
+    def to_json(self, cooldown: float) -> Dict:
+        p95 = self.p95()
+        return {
+            "backend": self.name,
+            "state": self.state(cooldown),
+            "calls": self.calls,
+            "failures": self.failures,
+            "in_flight": self.in_flight,
+            "error_rate": round(self.error_rate, 3),
+            "ewma_latency_ms": round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+            "p95_latency_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+class RouterClient:
+    """Model client that spreads calls over the router's compatible backends."""
+
+    # the backend clients are wrapped (cache, coalescing, limiter) one by one
+    manages_backends = True
+
+    def __init__(self, router: "RouterProvider", model: Optional[str], views: Tuple = ()):
+        self.router = router
+        self.model = model
+        self.views = views  # (method, value) applied to every backend client
+
+    def _view(self, method: str, value: Any) -> "RouterClient":
+        return RouterClient(self.router, self.model, self.views + ((method, value),))
+
+    def with_priority(self, priority: Any) -> "RouterClient":
+        """The same client, with the backend calls queued in lane ``priority``."""
+        return self._view("with_priority", priority)
+
+    def with_agent(self, agent: Optional[str]) -> "RouterClient":
+        """The same client, with the backend calls charged to ``agent``."""
+        return self._view("with_agent", agent)
+
+    def _client(self, backend: _Backend) -> Any:
+        client = self.router.client(backend, self.model)
+        for method, value in self.views:
+            bind = getattr(client, method, None)
+            if callable(bind):
+                client = bind(value)
+        return client
+
+    @property
+    def model_info(self) -> Dict:
+        backends = self.router.compatible(self.model)
+        if not backends:
+            raise RuntimeError(f"No router backend serves model '{self.model}'")
+        return self.router.client(backends[0], self.model).model_info
+
+    async def _attempt(self, backend: _Backend, messages: list, kwargs: Dict) -> Any:
+        client = self._client(backend)
+        self.router.begin(backend)
+        started = time.monotonic()
+        try:
+            result = await client.create(messages, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if is_backend_failure(e):
+                backend.failed(self.router.breaker_failures)
+                logger.warning(f"Router backend {backend.name} failed: {e}")
+            raise
+        finally:
+            self.router.end(backend)
+        backend.succeeded(time.monotonic() - started)
+        return result
+
+    async def _hedged(self, candidates: List[_Backend], tried: List[_Backend], messages: list, kwargs: Dict) -> Any:
+        primary = candidates[0]
+        tried.append(primary)
+        delay = self.router.hedge_delay(primary)
+        if delay is None or len(candidates) < 2:
+            return await self._attempt(primary, messages, kwargs)
+        first = asyncio.ensure_future(self._attempt(primary, messages, kwargs))
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return first.result()
+            secondary = candidates[1]
+            tried.append(secondary)
+            self.router.metrics["hedges"] += 1
+            second = asyncio.ensure_future(self._attempt(secondary, messages, kwargs))
+            pending = {first, second}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.router.metrics["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+                    if not is_backend_failure(error):
+                        # the other backend would reject the request too
+                        raise error
+            raise error
+        finally:
+            # the losing request, or both when the caller is cancelled
+            for task in pending:
+                task.cancel()
+
+    async def create(self, messages: list, **kwargs) -> Any:
+        tried: List[_Backend] = []
+        last_error: Optional[BaseException] = None
+        while True:
+            candidates = [b for b in self.router.candidates(self.model) if b not in tried]
+            if not candidates:
+                raise RuntimeError(f"All router backends failed for model '{self.model}': {last_error}") from last_error
+            if tried:
+                self.router.metrics["failovers"] += 1
+            try:
+                return await self._hedged(candidates, tried, messages, kwargs)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not is_backend_failure(e):
+                    raise
+                last_error = e
+
+    async def create_stream(self, messages: list, **kwargs):
+        tried: List[_Backend] = []
+        last_error: Optional[BaseException] = None
+        while True:
+            candidates = [b for b in self.router.candidates(self.model) if b not in tried]
+            if not candidates:
+                raise RuntimeError(f"All router backends failed for model '{self.model}': {last_error}") from last_error
+            if tried:
+                self.router.metrics["failovers"] += 1
+            backend = candidates[0]
+            tried.append(backend)
+            client = self._client(backend)
+            self.router.begin(backend)
+            started = time.monotonic()
+            yielded = False
+            try:
+                async for chunk in client.create_stream(messages, **kwargs):
+                    yielded = True
+                    yield chunk
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not is_backend_failure(e):
+                    raise
+                backend.failed(self.router.breaker_failures)
+                logger.warning(f"Router backend {backend.name} failed while streaming: {e}")
+                if yielded:
+                    # part of the answer is out; another backend cannot continue it
+                    raise
+                last_error = e
+                continue
+            finally:
+                self.router.end(backend)
+            backend.succeeded(time.monotonic() - started)
+            return
+
+    async def close(self):
+        # backend clients belong to the router
+        pass
+
+
+class RouterProvider:
+    def __init__(
+        self,
+        backends: Optional[List[Tuple[str, Optional[str]]]] = None,
+        breaker_failures: int = ROUTER_BREAKER_FAILURES,
+        breaker_cooldown: float = ROUTER_BREAKER_COOLDOWN,
+        hedge_after: str = ROUTER_HEDGE_AFTER,
+    ):
+        self.backends = [_Backend(name, model) for name, model in (backends or parse_backends(ROUTER_BACKENDS))]
+        if not self.backends:
+            raise ValueError("RouterProvider needs at least one backend (ROUTER_BACKENDS)")
+        self.breaker_failures = max(1, breaker_failures)
+        self.breaker_cooldown = breaker_cooldown
+        self.hedge_after = (hedge_after or "").strip().lower()
+        self.metrics = {"failovers": 0, "hedges": 0, "hedge_wins": 0}
+        self._clients: Dict[Tuple[str, Optional[str]], Any] = {}
+        self._router_clients: Dict[Optional[str], RouterClient] = {}
+
+    def get_client(self, model: Optional[str] = None) -> RouterClient:
+        client = self._router_clients.get(model)
+        if client is None:
+            if not self.compatible(model):
+                raise ValueError(f"No router backend serves model '{model}'")
+            client = RouterClient(self, model)
+            self._router_clients[model] = client
+        return client
+
+    def compatible(self, model: Optional[str]) -> List[_Backend]:
+        family = model_family(model)
+        return [b for b in self.backends if family is None or b.model is None or model_family(b.model) == family]
+
+    def candidates(self, model: Optional[str]) -> List[_Backend]:
+        """Compatible backends that may take a call now, best first."""
+        ready = []
+        for backend in self.compatible(model):
+            state = backend.state(self.breaker_cooldown)
+            if state == "open":
+                continue
+            if state == "half_open" and backend.trial_in_flight:
+                continue
+            ready.append(backend)
+        return sorted(ready, key=lambda b: b.score())
+
+    def begin(self, backend: _Backend):
+        backend.calls += 1
+        backend.in_flight += 1
+        if backend.state(self.breaker_cooldown) == "half_open":
+            # the one trial call of a half-open circuit
+            backend.trial_in_flight = True
+
+    def end(self, backend: _Backend):
+        backend.in_flight -= 1
+        backend.trial_in_flight = False
+
+    def client(self, backend: _Backend, model: Optional[str]) -> Any:
+        """The client of ``backend`` for the requested model, built once."""
+        served = backend.model or model
+        key = (backend.provider_name, served)
+        client = self._clients.get(key)
+        if client is None:
+            provider = PROVIDERS.get(backend.provider_name)
+            if provider is None:
+                raise ValueError(f"Router backend '{backend.provider_name}' is not a registered provider")
+            client = wrap_client(provider.get_client(model=served), backend.provider_name, model=served, base_url=getattr(provider, "base_url", None))
+            self._clients[key] = client
+        return client
+
+    def hedge_delay(self, backend: _Backend) -> Optional[float]:
+        if not self.hedge_after or self.hedge_after in ("0", "false", "off"):
+            return None
+        if self.hedge_after == "auto":
+            # too few samples for a p95: do not hedge yet
+            return backend.p95() if len(backend.latencies) >= 20 else None
+        return float(self.hedge_after)
+
+    async def close(self):
+        clients, self._clients = self._clients, {}
+        for (name, _), client in clients.items():
+            provider = PROVIDERS.get(name)
+            inner = getattr(client, "wrapped", client)
+            # the providers' own default clients are closed with the providers
+            if inner is provider or inner is getattr(provider, "client", None):
+                continue
+            close = getattr(client, "close", None)
+            if callable(close):
+                try:
+                    result = close()
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception as e:
+                    logger.warning(f"Failed to close router client {name}: {e}")
+
+    def stats(self) -> Dict:
+        return {
+            **self.metrics,
+            "hedge_after": self.hedge_after or None,
+            "backends": [b.to_json(self.breaker_cooldown) for b in self.backends],
+        }
@@ -0,0 +1,72 @@
+# File: providers/single_flight.py
+"""
+Single-flight: concurrent calls with the same key share one execution.
+
+The first caller for a key (the leader) starts the work as a task of its own.
+Callers that arrive while it runs await the same task instead of starting
+another one. Every caller awaits it through ``asyncio.shield`` and may pass
+its own ``CancellationToken``. A caller that is cancelled, by its token or by
+cancelling its task, only stops waiting. The shared task is cancelled only
+once every caller waiting on it has given up.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._metrics = {"leaders": 0, "coalesced": 0, "abandoned": 0}
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]], cancellation_token: Optional[Any] = None) -> Tuple[Any, bool]:
+        """
+        Result of ``factory()`` for ``key``, run once for all concurrent callers.
+        Returns ``(result, shared)``; ``shared`` is False for the leader.
+        """
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self._metrics["leaders"] += 1
+        else:
+            self._metrics["coalesced"] += 1
+        flight.waiters += 1
+        waiter = asyncio.shield(flight.task)
+        if cancellation_token is not None:
+            # cancels this caller's wait only, never the shared task
+            cancellation_token.link_future(waiter)
+        try:
+            return await waiter, shared
+        except asyncio.CancelledError:
+            if not flight.task.done() and flight.waiters == 1:
+                # nobody else is waiting: stop the request
+                self._metrics["abandoned"] += 1
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _forget(self, key: Hashable, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.cancelled() and flight.task.exception() is not None:
+            # retrieved by the waiters; keeps asyncio from logging it when all of them left
+            logger.debug(f"Shared call failed: {flight.task.exception()}")
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def stats(self) -> Dict:
+        return {**self._metrics, "in_flight": len(self._flights)}
@@ -0,0 +1,285 @@
+# File: providers/usage.py
+"""
+Token usage and time accounting for every model call.
+
+``ProviderClientWrapper`` reports each call it forwards to a model (and each
+answer served from the response cache or shared with a coalesced caller) to
+the ``usage`` accountant. The accountant reads the prompt and completion
+tokens from whatever the provider returned:
+
+  * a ``CreateResult`` (autogen clients, the Docker provider, Ollama streams):
+    ``usage``, and for Docker llama.cpp's ``timings`` (prompt and generation
+    milliseconds, prompt tokens reused from the KV cache);
+  * a message such as the ``TextMessage`` of AI Foundry: ``models_usage``;
+  * the dicts of the Ollama provider: ``usage`` in the OpenAI shape (or
+    Ollama's ``prompt_eval_count`` / ``eval_count``).
+
+Wall-clock seconds are measured by the wrapper for every call, streamed or not.
+
+A call is charged to the labels of the context it runs in, keyed by scope.
+``run_session`` binds the session, user and team (``bind``), and the team's
+agents run as tasks started inside it. It binds them fresh and unbinds them
+when it ends: the scheduler starts the next queued run from the task of the
+run that just finished, and that run must not inherit its labels. The agent comes from the client the
+agent was given (``ProviderClientWrapper.with_agent``). Each call is added to
+four scopes: ``agent``, ``session``, ``user`` and ``team``.
+
+Totals since startup stay in memory for ``/usage`` and the SSE stream. The
+increments are also accumulated per (scope, key, provider, model, day) and
+written to the DyoPods_usage collection with ``$inc`` every
+USAGE_FLUSH_INTERVAL seconds (and at shutdown). A failed flush is retried with
+the next one.
+
+Configuration:
+  LLM_USAGE             "false" to disable (default true)
+  USAGE_FLUSH_INTERVAL  seconds between flushes to Mongo (default 30)
+  USAGE_MAX_KEYS        in-memory totals kept per scope, least recently used dropped (default 10000)
+"""
+
+import os
+import time
+import asyncio
+import logging
+import contextvars
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LLM_USAGE = os.getenv("LLM_USAGE", "true").lower() == "true"
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "30"))
+USAGE_MAX_KEYS = int(os.getenv("USAGE_MAX_KEYS", "10000"))
+
+SCOPES = ("agent", "session", "user", "team")
+COUNTERS = (
+    "calls", "cached_calls", "errors",
+    "prompt_tokens", "completion_tokens", "cached_prompt_tokens",
+    "seconds", "prompt_ms", "predicted_ms",
+)
+
+_labels: contextvars.ContextVar = contextvars.ContextVar("llm_usage_labels", default={})
+
+
+def bind(fresh: bool = False, **labels: Optional[str]) -> contextvars.Token:
+    """
+    Charge the model calls made from now on in this context (and the tasks it starts)
+    to ``labels``: scope name -> key, e.g. ``bind(session=..., user=..., team=...)``.
+    The labels are merged into the ones already bound unless ``fresh`` is set.
+    """
+    given = {k: v for k, v in labels.items() if v is not None}
+    return _labels.set(given if fresh else {**_labels.get(), **given})
+
+
+def unbind(token: contextvars.Token):
+    _labels.reset(token)
+
+
+def current_labels() -> Dict[str, str]:
+    return dict(_labels.get())
+
+
+def message_usage(message: Any) -> Optional[Dict[str, int]]:
+    """The ``models_usage`` of an autogen message as a dict, or None."""
+    models_usage = getattr(message, "models_usage", None)
+    if models_usage is None:
+        return None
+    return {
+        "prompt_tokens": getattr(models_usage, "prompt_tokens", 0),
+        "completion_tokens": getattr(models_usage, "completion_tokens", 0),
+    }
+
+
+def _read(source: Any, *names: str) -> Optional[float]:
+    for name in names:
+        value = source.get(name) if isinstance(source, dict) else getattr(source, name, None)
+        if isinstance(value, (int, float)):
+            return value
+    return None
+
+
+def extract_usage(result: Any) -> Dict[str, float]:
+    """Token counts and server timings found in a provider result (missing ones are left out)."""
+    usage = result.get("usage") if isinstance(result, dict) else getattr(result, "usage", None)
+    if usage is None and not isinstance(result, dict):
+        usage = getattr(result, "models_usage", None)
+    if usage is None and isinstance(result, dict) and "eval_count" in result:
+        usage = result  # Ollama's native response
+    counts: Dict[str, float] = {}
+    if usage is not None:
+        prompt = _read(usage, "prompt_tokens", "prompt_eval_count")
+        completion = _read(usage, "completion_tokens", "eval_count")
+        if prompt is not None:
+            counts["prompt_tokens"] = prompt
+        if completion is not None:
+            counts["completion_tokens"] = completion
+    timings = result.get("timings") if isinstance(result, dict) else getattr(result, "timings", None)
+    if isinstance(timings, dict):
+        # llama.cpp: what the GPU spent on the prompt and on the answer
+        for field, name in (("prompt_ms", "prompt_ms"), ("predicted_ms", "predicted_ms"), ("cached_prompt_tokens", "cache_n")):
+            value = _read(timings, name)
+            if value is not None:
+                counts[field] = value
+        if "prompt_tokens" not in counts and _read(timings, "prompt_n") is not None:
+            counts["prompt_tokens"] = _read(timings, "prompt_n")
+        if "completion_tokens" not in counts and _read(timings, "predicted_n") is not None:
+            counts["completion_tokens"] = _read(timings, "predicted_n")
+    return counts
+
+
+def _empty() -> Dict[str, float]:
+    return {name: 0 for name in COUNTERS}
+
+
+def _add(target: Dict[str, float], counts: Dict[str, float]):
+    for name, value in counts.items():
+        target[name] = target.get(name, 0) + value
+
+
+def _rounded(counters: Dict[str, float]) -> Dict[str, float]:
+    return {k: round(v, 3) if isinstance(v, float) else v for k, v in counters.items()}
+
+
+class UsageAccountant:
+    def __init__(self, flush_interval: float = USAGE_FLUSH_INTERVAL, max_keys: int = USAGE_MAX_KEYS, enabled: bool = LLM_USAGE):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.max_keys = max(1, max_keys)
+        self.db = None
+        # totals since startup: scope -> key -> counters (sessions also keep a per-agent breakdown)
+        self._totals: Dict[str, "OrderedDict[str, Dict]"] = {scope: OrderedDict() for scope in SCOPES}
+        # increments not yet in Mongo: (scope, key, provider, model, day) -> counters
+        self._pending: Dict[Tuple, Dict[str, float]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._metrics = {"recorded": 0, "flushes": 0, "documents_written": 0, "flush_failures": 0}
+
+    # ---- recording -------------------------------------------------------------
+    def record(
+        self,
+        provider: str,
+        model: Optional[str],
+        result: Any = None,
+        seconds: float = 0.0,
+        error: Optional[BaseException] = None,
+        cached: bool = False,
+        labels: Optional[Dict[str, str]] = None,
+    ):
+        """Charge one model call to the scopes in ``labels`` (default: the current context)."""
+        if not self.enabled:
+            return
+        labels = current_labels() if labels is None else labels
+        counts: Dict[str, float] = {"calls": 1, "seconds": seconds}
+        if cached:
+            # answered without the model: no tokens were spent on it
+            counts["cached_calls"] = 1
+        elif error is not None:
+            counts["errors"] = 1
+        elif result is not None:
+            counts.update(extract_usage(result))
+        self._metrics["recorded"] += 1
+        day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        for scope in SCOPES:
+            key = labels.get(scope) or "unknown"
+            totals = self._total(scope, key)
+            _add(totals["usage"], counts)
+            if scope == "session":
+                agent = labels.get("agent") or "unknown"
+                _add(totals["agents"].setdefault(agent, _empty()), counts)
+            _add(self._pending.setdefault((scope, key, provider, model or "", day), _empty()), counts)
+
+    def _total(self, scope: str, key: str) -> Dict:
+        totals = self._totals[scope]
+        entry = totals.get(key)
+        if entry is None:
+            entry = {"usage": _empty(), "agents": {}} if scope == "session" else {"usage": _empty()}
+            totals[key] = entry
+            while len(totals) > self.max_keys:
+                # already counted in the pending increments; Mongo keeps the history
+                totals.popitem(last=False)
+        else:
+            totals.move_to_end(key)
+        return entry
+
+    # ---- reading -----------------------------------------------------------------
+    def session(self, session_id: str) -> Optional[Dict]:
+        """Totals of one session with the per-agent breakdown, or None if it made no model calls."""
+        entry = self._totals["session"].get(session_id)
+        if entry is None:
+            return None
+        return {
+            **_rounded(entry["usage"]),
+            "agents": {agent: _rounded(counters) for agent, counters in entry["agents"].items()},
+        }
+
+    def report(self, scope: Optional[str] = None, key: Optional[str] = None) -> Dict:
+        """In-memory totals since startup, for every scope or one scope (and one key)."""
+        scopes = [scope] if scope else list(SCOPES)
+        report = {}
+        for name in scopes:
+            if name not in self._totals:
+                raise KeyError(name)
+            entries = self._totals[name]
+            if key is not None:
+                entries = {key: entries[key]} if key in entries else {}
+            report[name] = {
+                k: self.session(k) if name == "session" else _rounded(entry["usage"])
+                for k, entry in entries.items()
+            }
+        return report
+
+    # ---- persistence -------------------------------------------------------------
+    async def start(self, db: Any = None):
+        self.db = db
+        if self._task is None and self.enabled and db is not None and hasattr(db, "record_usage"):
+            self._task = asyncio.create_task(self._run(), name="usage-flusher")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write the pending increments to Mongo; returns the number of documents updated."""
+        if not self._pending or self.db is None or not hasattr(self.db, "record_usage"):
+            return 0
+        pending, self._pending = self._pending, {}
+        items = [
+            ({"scope": scope, "key": key, "provider": provider, "model": model, "day": day}, counters)
+            for (scope, key, provider, model, day), counters in pending.items()
+        ]
+        started = time.monotonic()
+        try:
+            await self.db.record_usage(items)
+        except Exception as e:
+            # keep the increments for the next flush
+            for group, counters in pending.items():
+                _add(self._pending.setdefault(group, _empty()), counters)
+            self._metrics["flush_failures"] += 1
+            logger.warning(f"Failed to flush LLM usage to Mongo: {e}")
+            return 0
+        self._metrics["flushes"] += 1
+        self._metrics["documents_written"] += len(items)
+        logger.debug(f"Flushed {len(items)} usage documents in {time.monotonic() - started:.3f}s")
+        return len(items)
+
+    def stats(self) -> Dict:
+        return {
+            **self._metrics,
+            "enabled": self.enabled,
+            "pending": len(self._pending),
+            "flush_interval": self.flush_interval,
+            "keys": {scope: len(entries) for scope, entries in self._totals.items()},
+        }
+
+
+usage = UsageAccountant()
@@ -0,0 +1,263 @@
+# File: run_scheduler.py
+"""
+Admission control for team runs.
+
+Each run holds a MagenticOne team, Docker executors and a stream of LLM calls,
+so a burst of ``/chat-stream`` requests used to oversubscribe the local model
+backend and the Docker daemon. Runs are now submitted to a ``RunScheduler``
+that queues them and only starts one when a global slot, a slot for its user
+and a slot for its provider are all free. The queue is FIFO, except that a run
+blocked by its user or provider limit does not hold back runs behind it.
+
+Limits come from the environment:
+  RUN_MAX_CONCURRENT      runs executing at once across the server (default 4)
+  RUN_MAX_PER_USER        runs executing at once per user (default 2, 0 = no limit)
+  RUN_MAX_PER_PROVIDER    default per-provider limit (default 0 = no limit)
+  RUN_PROVIDER_LIMITS     per-provider overrides, e.g. "docker=2,OllamaProvider=1"
+  RUN_MAX_QUEUE           queued runs before submissions are refused (default 100)
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+RUN_MAX_CONCURRENT = int(os.getenv("RUN_MAX_CONCURRENT", "4"))
+RUN_MAX_PER_USER = int(os.getenv("RUN_MAX_PER_USER", "2"))
+RUN_MAX_PER_PROVIDER = int(os.getenv("RUN_MAX_PER_PROVIDER", "0"))
+RUN_PROVIDER_LIMITS = os.getenv("RUN_PROVIDER_LIMITS", "")
+RUN_MAX_QUEUE = int(os.getenv("RUN_MAX_QUEUE", "100"))
+
+
+def parse_limits(spec: str) -> Dict[str, int]:
+    """Parse "name=2,other=1" into a dict; malformed pairs are ignored."""
+    limits = {}
+    for pair in (spec or "").split(","):
+        name, _, value = pair.partition("=")
+        if name.strip() and value.strip().isdigit():
+            limits[name.strip()] = int(value.strip())
+    return limits
+
+
+class SchedulerFull(Exception):
+    """Raised by ``submit`` when the queue is at capacity."""
+
+
+@dataclass
+class ScheduledRun:
+    session_id: str
+    user_id: str
+    provider: str
+    factory: Callable[[], Awaitable[Any]]
+    submitted_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    task: Optional[asyncio.Task] = None
+
+    @property
+    def state(self) -> str:
+        if self.finished_at is not None:
+            return "finished"
+        return "running" if self.started_at is not None else "queued"
+
+    @property
+    def wait_seconds(self) -> float:
+        return (self.started_at or time.monotonic()) - self.submitted_at
+
+
+class RunScheduler:
+    def __init__(
+        self,
+        max_concurrent: int = RUN_MAX_CONCURRENT,
+        max_per_user: int = RUN_MAX_PER_USER,
+        max_per_provider: int = RUN_MAX_PER_PROVIDER,
+        provider_limits: Optional[Dict[str, int]] = None,
+        max_queue: int = RUN_MAX_QUEUE,
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_per_user = max_per_user
+        self.max_per_provider = max_per_provider
+        self.provider_limits = parse_limits(RUN_PROVIDER_LIMITS) if provider_limits is None else provider_limits
+        self.max_queue = max_queue
+        self._queue: Deque[ScheduledRun] = deque()
+        self._running: Dict[str, ScheduledRun] = {}
+        self._by_user: Dict[str, int] = {}
+        self._by_provider: Dict[str, int] = {}
+        self._metrics = {
+            "submitted": 0,
+            "started": 0,
+            "finished": 0,
+            "failed": 0,
+            "rejected": 0,
+            "cancelled": 0,
+            "max_queue_depth": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "total_run_seconds": 0.0,
+        }
+
+    # ---- admission -----------------------------------------------------------
+    def _provider_limit(self, provider: str) -> int:
+        return self.provider_limits.get(provider, self.max_per_provider)
+
+    def _can_start(self, run: ScheduledRun) -> bool:
+        if len(self._running) >= self.max_concurrent:
+            return False
+        if self.max_per_user and self._by_user.get(run.user_id, 0) >= self.max_per_user:
+            return False
+        limit = self._provider_limit(run.provider)
+        if limit and self._by_provider.get(run.provider, 0) >= limit:
+            return False
+        return True
+
+    def _dispatch(self):
+        """Start every queued run that fits, in queue order."""
+        if not self._queue:
+            return
+        waiting: Deque[ScheduledRun] = deque()
+        while self._queue and len(self._running) < self.max_concurrent:
+            run = self._queue.popleft()
+            if self._can_start(run):
+                self._start(run)
+            else:
+                waiting.append(run)
+        waiting.extend(self._queue)
+        self._queue = waiting
+
+    def _start(self, run: ScheduledRun):
+        run.started_at = time.monotonic()
+        self._running[run.session_id] = run
+        self._by_user[run.user_id] = self._by_user.get(run.user_id, 0) + 1
+        self._by_provider[run.provider] = self._by_provider.get(run.provider, 0) + 1
+        wait = run.wait_seconds
+        self._metrics["started"] += 1
+        self._metrics["total_wait_seconds"] += wait
+        self._metrics["max_wait_seconds"] = max(self._metrics["max_wait_seconds"], wait)
+        logger.info(f"Starting run {run.session_id} (user {run.user_id}, provider {run.provider}) after {wait:.1f}s in queue")
+        run.task = asyncio.create_task(self._execute(run), name=f"run-{run.session_id}")
+        # a task cancelled before its first step never runs _execute, so release from the callback
+        run.task.add_done_callback(lambda task: self._finish(run, task))
+
+    async def _execute(self, run: ScheduledRun):
+        try:
+            await run.factory()
+        except Exception as e:
+            self._metrics["failed"] += 1
+            logger.error(f"Run {run.session_id} failed: {e}")
+
+    def _finish(self, run: ScheduledRun, task: asyncio.Task):
+        if task.cancelled():
+            self._metrics["cancelled"] += 1
+        run.finished_at = time.monotonic()
+        self._release(run)
+
+    def _release(self, run: ScheduledRun):
+        if self._running.get(run.session_id) is not run:
+            return
+        del self._running[run.session_id]
+        for counts, key in ((self._by_user, run.user_id), (self._by_provider, run.provider)):
+            counts[key] -= 1
+            if counts[key] <= 0:
+                del counts[key]
+        self._metrics["finished"] += 1
+        self._metrics["total_run_seconds"] += run.finished_at - run.started_at
+        self._dispatch()
+
+    def submit(self, session_id: str, user_id: str, provider: str, factory: Callable[[], Awaitable[Any]]) -> ScheduledRun:
+        """
+        Queue ``factory()`` to run once limits allow. Submitting a session that is
+        already queued or running returns the existing entry.
+        """
+        existing = self.get(session_id)
+        if existing is not None:
+            return existing
+        if len(self._queue) >= self.max_queue:
+            self._metrics["rejected"] += 1
+            raise SchedulerFull(f"Run queue is full ({self.max_queue} sessions waiting).")
+        run = ScheduledRun(session_id=session_id, user_id=user_id, provider=provider, factory=factory)
+        self._queue.append(run)
+        self._metrics["submitted"] += 1
+        self._metrics["max_queue_depth"] = max(self._metrics["max_queue_depth"], len(self._queue))
+        self._dispatch()
+        return run
+
+    def cancel(self, session_id: str) -> bool:
+        """Drop a queued run or cancel a running one."""
+        for run in self._queue:
+            if run.session_id == session_id:
+                self._queue.remove(run)
+                self._metrics["cancelled"] += 1
+                return True
+        run = self._running.get(session_id)
+        if run is not None and run.task is not None:
+            run.task.cancel()
+            return True
+        return False
+
+    async def stop(self):
+        """Forget queued runs and cancel running ones (on shutdown)."""
+        self._queue.clear()
+        tasks = [run.task for run in self._running.values() if run.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # ---- introspection -------------------------------------------------------
+    def get(self, session_id: str) -> Optional[ScheduledRun]:
+        if session_id in self._running:
+            return self._running[session_id]
+        return next((run for run in self._queue if run.session_id == session_id), None)
+
+    def _average_run_seconds(self) -> Optional[float]:
+        finished = self._metrics["finished"]
+        return self._metrics["total_run_seconds"] / finished if finished else None
+
+    def status(self, session_id: str) -> Optional[Dict]:
+        """Queue position (1-based, None once running) and wait times of a session."""
+        run = self.get(session_id)
+        if run is None:
+            return None
+        position = None
+        estimated_start_seconds = None
+        if run.state == "queued":
+            position = next(i for i, queued in enumerate(self._queue, start=1) if queued is run)
+            average = self._average_run_seconds()
+            if average is not None:
+                # rough: the runs ahead drain through max_concurrent slots
+                estimated_start_seconds = round(average * position / self.max_concurrent, 1)
+        return {
+            "session_id": run.session_id,
+            "user_id": run.user_id,
+            "provider": run.provider,
+            "state": run.state,
+            "position": position,
+            "wait_seconds": round(run.wait_seconds, 1),
+            "estimated_start_seconds": estimated_start_seconds,
+        }
+
+    def stats(self) -> Dict:
+        started = self._metrics["started"]
+        return {
+            **self._metrics,
+            "queued": len(self._queue),
+            "running": len(self._running),
+            "running_by_user": dict(self._by_user),
+            "running_by_provider": dict(self._by_provider),
+            "limits": {
+                "max_concurrent": self.max_concurrent,
+                "max_per_user": self.max_per_user,
+                "max_per_provider": self.max_per_provider,
+                "provider_limits": dict(self.provider_limits),
+                "max_queue": self.max_queue,
+            },
+            "average_wait_seconds": self._metrics["total_wait_seconds"] / started if started else 0.0,
+            "average_run_seconds": self._average_run_seconds(),
+        }
+
+    def queue(self) -> List[Dict]:
+        return [self.status(run.session_id) for run in list(self._running.values()) + list(self._queue)]
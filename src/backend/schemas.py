@@ -1,7 +1,7 @@
 # File: schemas.py
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Optional
 from uuid import UUID
 
 class ChatMessageBase(BaseModel):
@@ -16,6 +16,7 @@ class ChatMessageCreate(ChatMessageBase):
     user_id: Optional[str] = None
     provider: Optional[str] = None
     model: Optional[str] = None
+    team_id: Optional[str] = None
 
 class ChatMessageResponse(ChatMessageBase):
     id: UUID
@@ -59,7 +60,7 @@ class AutoGenMessage(BaseModel):
     source:  Optional[str] = None
     content:  Optional[str] = None
     stop_reason:  Optional[str] = None
-    models_usage:  Optional[str] = None
+    models_usage:  Optional[Dict[str, Any]] = None
     content_image:  Optional[str] = None
     session_id:  Optional[str] = None
     session_user:  Optional[str] = None
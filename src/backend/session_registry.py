@@ -0,0 +1,153 @@
+# File: session_registry.py
+"""
+In-process registry of team runs.
+
+Each session started through ``/chat-stream`` gets a ``RunRecord`` holding its
+state, timing, the ``CancellationToken`` of the team stream, the team and
+helper handles, the code executors it started and the asyncio task running
+it. ``/stop`` and the ``max_time`` watchdog cancel a run through
+``SessionRegistry.cancel``. That cancels the token, so the team stops
+requesting completions, and then cancels the task. The run's own cleanup then
+stops its executors.
+
+Finished records are kept for SESSION_REGISTRY_RETENTION seconds so that
+``/sessions`` can report how recent runs ended.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SESSION_REGISTRY_RETENTION = float(os.getenv("SESSION_REGISTRY_RETENTION", "3600"))
+
+ACTIVE_STATES = ("queued", "starting", "running", "cancelling")
+
+
+@dataclass
+class RunRecord:
+    session_id: str
+    user_id: str
+    provider: str
+    model: Optional[str] = None
+    state: str = "queued"
+    created_at: str = field(default_factory=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    queued_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    max_time: Optional[float] = None
+    cancel_reason: Optional[str] = None
+    error: Optional[str] = None
+    task: Optional[asyncio.Task] = None
+    cancellation_token: Any = None
+    team: Any = None
+    helper: Any = None
+    executors: List[Any] = field(default_factory=list)
+
+    @property
+    def active(self) -> bool:
+        return self.state in ACTIVE_STATES
+
+    @property
+    def elapsed_seconds(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def to_json(self) -> Dict:
+        elapsed = self.elapsed_seconds
+        return {
+            "session_id": self.session_id,
+            "user_id": self.user_id,
+            "provider": self.provider,
+            "model": self.model,
+            "state": self.state,
+            "created_at": self.created_at,
+            "elapsed_seconds": round(elapsed, 1) if elapsed is not None else None,
+            "max_time": self.max_time,
+            "cancel_reason": self.cancel_reason,
+            "error": self.error,
+            "executors": len(self.executors),
+        }
+
+
+class SessionRegistry:
+    def __init__(self, retention: float = SESSION_REGISTRY_RETENTION):
+        self.retention = retention
+        self._records: Dict[str, RunRecord] = {}
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.retention
+        for session_id in [s for s, r in self._records.items() if r.finished_at is not None and r.finished_at < cutoff]:
+            del self._records[session_id]
+
+    def register(self, session_id: str, user_id: str, provider: str, model: Optional[str] = None) -> RunRecord:
+        self._prune()
+        record = RunRecord(session_id=session_id, user_id=user_id, provider=provider, model=model)
+        self._records[session_id] = record
+        return record
+
+    def get(self, session_id: str) -> Optional[RunRecord]:
+        return self._records.get(session_id)
+
+    def list(self, user_id: Optional[str] = None, active_only: bool = False) -> List[RunRecord]:
+        self._prune()
+        return [
+            r for r in self._records.values()
+            if (user_id is None or r.user_id == user_id) and (not active_only or r.active)
+        ]
+
+    def started(self, session_id: str, task: Optional[asyncio.Task] = None, max_time: Optional[float] = None):
+        """The run left the queue and is building its team on ``task``."""
+        record = self._records[session_id]
+        record.state = "starting"
+        record.started_at = time.monotonic()
+        record.task = task
+        record.max_time = max_time
+
+    def attach(self, session_id: str, helper: Any = None, team: Any = None, cancellation_token: Any = None):
+        """Record the handles of a run whose team stream is about to be consumed."""
+        record = self._records[session_id]
+        record.helper = helper
+        record.team = team
+        record.cancellation_token = cancellation_token
+        leased = [executor for executor, _ in getattr(helper, "leased_executors", [])]
+        record.executors = getattr(helper, "executors", []) + leased
+        if record.state == "starting":
+            record.state = "running"
+
+    def finish(self, session_id: str, state: str = "finished", error: Optional[str] = None):
+        record = self._records.get(session_id)
+        if record is None:
+            return
+        record.state = state
+        record.error = error
+        record.finished_at = time.monotonic()
+        # drop the heavy handles; the record only serves listings from here on
+        record.task = None
+        record.cancellation_token = None
+        record.team = None
+        record.helper = None
+        record.executors = []
+
+    def cancel(self, session_id: str, reason: str = "cancelled") -> bool:
+        """
+        Cancel a starting or running session: cancel its token, then its task.
+        Returns False if the session is unknown, queued or already over.
+        """
+        record = self._records.get(session_id)
+        if record is None or record.state not in ("starting", "running"):
+            return False
+        logger.info(f"Cancelling session {session_id}: {reason}")
+        record.state = "cancelling"
+        record.cancel_reason = reason
+        if record.cancellation_token is not None:
+            record.cancellation_token.cancel()
+        if record.task is not None and not record.task.done():
+            record.task.cancel()
+        return True
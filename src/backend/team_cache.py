@@ -0,0 +1,201 @@
+# File: team_cache.py
+"""
+Cache of the stateless parts of team agents, shared across sessions.
+
+Every session used to rebuild its agents from the raw ``agents`` JSON. That
+includes the MCP tool adapters, whose construction is a handshake with the MCP
+server, and the dedicated model clients of MCP agents, even when thousands of
+sessions run the same team. A ``TeamTemplate`` is keyed by a hash of the team
+definition, provider and model. It keeps those parts per agent position, and
+``MagenticOneHelper`` stamps fresh agents out of them: agent objects, their
+chat history and tool caches stay per session.
+
+Sharing a model client is safe because the agent passes the whole message list
+on every ``create`` call; the client keeps no conversation. Its only mutable
+state is the ``total_usage``/``actual_usage`` counters, which are updated
+without an ``await`` in between and so never interleave; they sum the usage of
+every session on the template and nothing reads them per session.
+Its HTTP client (``ollama.AsyncClient`` over ``httpx``) is built for concurrent
+requests, which is also what ``ClientCache`` relies on for the main clients.
+
+Sessions ``acquire`` a template and ``release`` it when they end. Templates
+are evicted LRU (TEAM_CACHE_SIZE), skipping the ones running sessions hold.
+``invalidate_agents`` drops every template built from a team definition and is
+called when a team is updated or deleted. A dropped template closes its model
+clients and MCP adapters, like ``ClientCache`` does, once no session holds it.
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import inspect
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from providers.client_cache import close_client
+
+logger = logging.getLogger(__name__)
+
+TEAM_CACHE_SIZE = int(os.getenv("TEAM_CACHE_SIZE", "64"))
+
+
+def agents_hash(agents: Any) -> str:
+    """Stable hash of a team's agents definition (key order does not matter)."""
+    canonical = json.dumps(agents, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def team_key(agents: Any, provider: Optional[str], model: Optional[str]) -> str:
+    return f"{agents_hash(agents)}:{provider or ''}:{model or ''}"
+
+
+class TeamTemplate:
+    def __init__(self, key: str):
+        self.key = key
+        self.created_at = time.time()
+        self._parts: Dict[Tuple[int, str], asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.users = 0
+        # dropped from the cache while in use: closed when the last session releases it
+        self.retired = False
+
+    async def part(self, index: int, kind: str, factory: Callable[[], Any]) -> Any:
+        """
+        The ``kind`` part of the agent at ``index``, built by ``factory`` (sync or async)
+        on first use. Concurrent sessions share one build; a failed build is not cached.
+        """
+        slot = (index, kind)
+        future = self._parts.get(slot)
+        if future is None:
+            self.misses += 1
+
+            async def build():
+                result = factory()
+                return await result if inspect.isawaitable(result) else result
+
+            future = asyncio.ensure_future(build())
+            self._parts[slot] = future
+        else:
+            self.hits += 1
+        try:
+            # shielded: a cancelled session must not cancel a build other sessions wait on
+            return await asyncio.shield(future)
+        except Exception:
+            if self._parts.get(slot) is future:
+                del self._parts[slot]
+            raise
+
+    async def aclose(self) -> int:
+        """Close the parts built so far (model clients, MCP adapters); returns how many failed."""
+        parts, self._parts = self._parts, {}
+        failures = 0
+        results = await asyncio.gather(*parts.values(), return_exceptions=True)
+        for (index, kind), result in zip(parts, results):
+            if isinstance(result, BaseException):
+                continue
+            for obj in result if isinstance(result, (list, tuple)) else (result,):
+                try:
+                    await close_client(obj)
+                except Exception as e:
+                    failures += 1
+                    logger.warning(f"Failed to close {kind} of agent {index} in team template {self.key}: {e}")
+        return failures
+
+    def __len__(self) -> int:
+        return len(self._parts)
+
+
+class TeamTemplateCache:
+    def __init__(self, max_entries: int = TEAM_CACHE_SIZE):
+        self.max_entries = max(1, max_entries)
+        self._templates: "OrderedDict[str, TeamTemplate]" = OrderedDict()
+        self._by_agents: Dict[str, Set[str]] = {}
+        self._metrics = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "closed": 0, "close_errors": 0}
+
+    async def acquire(self, agents: Any, provider: Optional[str], model: Optional[str]) -> TeamTemplate:
+        """The template of a team; it is not closed until the session releases it."""
+        key = team_key(agents, provider, model)
+        template = self._templates.get(key)
+        if template is not None:
+            self._metrics["hits"] += 1
+            self._templates.move_to_end(key)
+        else:
+            self._metrics["misses"] += 1
+            template = TeamTemplate(key)
+            self._templates[key] = template
+            self._by_agents.setdefault(key.split(":", 1)[0], set()).add(key)
+        template.users += 1
+        await self._evict()
+        return template
+
+    async def release(self, template: TeamTemplate):
+        if template.users > 0:
+            template.users -= 1
+        if template.retired and not template.users:
+            await self._close(template)
+
+    async def _evict(self):
+        # oldest first, skipping templates that running sessions hold
+        for key in list(self._templates):
+            if len(self._templates) <= self.max_entries:
+                return
+            template = self._templates[key]
+            if template.users:
+                continue
+            del self._templates[key]
+            self._forget(key)
+            self._metrics["evictions"] += 1
+            await self._close(template)
+
+    def _forget(self, key: str):
+        digest = key.split(":", 1)[0]
+        keys = self._by_agents.get(digest)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_agents[digest]
+
+    async def _drop(self, template: TeamTemplate):
+        if template.users:
+            template.retired = True
+        else:
+            await self._close(template)
+
+    async def _close(self, template: TeamTemplate):
+        template.retired = False
+        self._metrics["close_errors"] += await template.aclose()
+        self._metrics["closed"] += 1
+
+    async def invalidate_agents(self, agents: Any) -> int:
+        """Drop the templates built from this agents definition, for any provider and model."""
+        if not agents:
+            return 0
+        keys = self._by_agents.pop(agents_hash(agents), set())
+        for key in keys:
+            template = self._templates.pop(key, None)
+            if template is not None:
+                await self._drop(template)
+        if keys:
+            self._metrics["invalidations"] += len(keys)
+            logger.info(f"Invalidated {len(keys)} cached team template(s).")
+        return len(keys)
+
+    async def aclose(self):
+        templates, self._templates = self._templates, OrderedDict()
+        self._by_agents.clear()
+        for template in templates.values():
+            await self._close(template)
+
+    def stats(self) -> Dict:
+        return {
+            **self._metrics,
+            "templates": len(self._templates),
+            "max_entries": self.max_entries,
+            "in_use": sum(1 for t in self._templates.values() if t.users),
+            "part_hits": sum(t.hits for t in self._templates.values()),
+            "part_misses": sum(t.misses for t in self._templates.values()),
+        }
@@ -0,0 +1,20 @@
+# File: tests/conftest.py
+"""
+Shared test setup: the backend modules are imported the way main.py imports
+them (flat modules, ``providers.x``), and ``async def`` tests run on a fresh
+event loop.
+"""
+import os
+import sys
+import asyncio
+import inspect
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def pytest_pyfunc_call(pyfuncitem):
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    arguments = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    asyncio.run(pyfuncitem.obj(**arguments))
+    return True
@@ -0,0 +1,56 @@
+# File: tests/test_client_wrapper.py
+from providers.client_wrapper import ProviderClientWrapper, ResponseCache, is_deterministic
+from providers.usage import UsageAccountant
+
+
+class Result:
+    def __init__(self, content):
+        self.content = content
+        self.cached = False
+
+
+class CountingClient:
+    default_temperature = None
+
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, messages, **kwargs):
+        self.calls += 1
+        return Result(f"answer {self.calls}")
+
+
+def _wrapper(client):
+    return ProviderClientWrapper(
+        client, "docker", model="ai/llama3.2", cache=ResponseCache(path=None),
+        caching=True, coalesce=False, limiting=False, accountant=UsageAccountant(enabled=False),
+    )
+
+
+def test_only_seeded_or_zero_temperature_requests_are_deterministic():
+    assert is_deterministic({"seed": 7, "temperature": 0.9})
+    assert is_deterministic({"extra_create_args": {"temperature": 0}})
+    assert is_deterministic({}, default=0.0)
+    assert not is_deterministic({})
+    assert not is_deterministic({"temperature": 0.7})
+
+
+async def test_deterministic_request_is_answered_from_the_cache():
+    client = CountingClient()
+    wrapper = _wrapper(client)
+    messages = [{"role": "user", "content": "plan"}]
+    first = await wrapper.create(messages, temperature=0)
+    second = await wrapper.create(messages, temperature=0)
+    assert client.calls == 1
+    assert second.content == first.content and second.cached and not first.cached
+    assert wrapper.cache.stats()["memory_hits"] == 1
+
+
+async def test_sampled_request_bypasses_the_cache():
+    client = CountingClient()
+    wrapper = _wrapper(client)
+    messages = [{"role": "user", "content": "write a poem"}]
+    await wrapper.create(messages, temperature=0.7)
+    second = await wrapper.create(messages, temperature=0.7)
+    assert client.calls == 2 and second.content == "answer 2"
+    assert wrapper.cache.stats()["bypassed"] == 2
@@ -0,0 +1,55 @@
+# File: tests/test_concurrency_limiter.py
+from providers.concurrency_limiter import AdaptiveLimiter, work_tokens
+
+
+class Overloaded(Exception):
+    status_code = 503
+
+
+def _limiter(**kwargs):
+    # no spacing between decreases, so every slow call counts
+    limiter = AdaptiveLimiter("test", initial=8, minimum=1, maximum=16, tolerance=2.0, **kwargs)
+    limiter.ewma_latency = 0.0
+    return limiter
+
+
+def _complete(limiter, seconds, completion_tokens, prompt_tokens=0):
+    limiter.in_flight += 1
+    limiter.release(latency=seconds, tokens=work_tokens({"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}))
+    limiter.ewma_latency = 0.0
+
+
+def test_long_answers_at_the_same_speed_are_not_congestion():
+    limiter = _limiter()
+    # 20ms per generated token, answers from 10 to 500 tokens
+    for tokens in (10, 500, 12, 300, 40, 500) * 3:
+        _complete(limiter, 0.02 * tokens + 0.01, tokens, prompt_tokens=100)
+    assert limiter.stats()["decreases"] == 0
+    assert limiter.limit > 8
+
+
+def test_slower_tokens_shrink_the_limit():
+    limiter = _limiter()
+    for _ in range(5):
+        _complete(limiter, 0.02 * 100, 100)
+    _complete(limiter, 0.1 * 100, 100)
+    assert limiter.stats()["decreases"] == 1
+    assert limiter.limit < 9
+
+
+def test_short_or_unmeasured_calls_leave_the_limit_alone():
+    limiter = _limiter()
+    _complete(limiter, 5.0, 2)
+    limiter.in_flight += 1
+    limiter.release(latency=5.0, tokens=None)
+    assert limiter.limit == 8 and limiter.stats()["unmeasured"] == 2
+
+
+async def test_overload_halves_the_limit_and_slot_reports_errors():
+    limiter = _limiter()
+    try:
+        async with limiter.slot():
+            raise Overloaded()
+    except Overloaded:
+        pass
+    assert limiter.limit == 4 and limiter.in_flight == 0
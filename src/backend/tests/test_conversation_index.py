@@ -0,0 +1,42 @@
+# File: tests/test_conversation_index.py
+import json
+
+from conversation_store import JsonlConversationStore
+from conversation_index import ConversationIndex
+
+
+def _save(store, index, user_id, session_id, messages, header=None):
+    # what crud.save_messages does
+    index.record_append(store.append(user_id, session_id, messages, header=header), len(messages))
+
+
+def test_append_then_list_counts_new_messages(tmp_path):
+    store = JsonlConversationStore(str(tmp_path))
+    index = ConversationIndex(store)
+    index.load()
+    _save(store, index, "u", "s", [{"content": "task"}], header={"timestamp": "2026-01-01 00:00:00"})
+    assert index.list(user_id="u")["conversations"][0]["message_count"] == 1
+    _save(store, index, "u", "s", [{"content": "a"}, {"content": "b"}])
+    assert index.list(user_id="u")["conversations"][0]["message_count"] == 3
+    store.close()
+    index.close()
+
+
+def test_paths_follow_legacy_migration(tmp_path):
+    legacy = tmp_path / "u_s.json"
+    legacy.write_text(json.dumps({
+        "id": "1", "user_id": "u", "session_id": "s", "messages": [{"content": "task"}],
+        "agents": [], "run_mode_locally": False, "timestamp": "2026-01-01 00:00:00",
+    }))
+    store = JsonlConversationStore(str(tmp_path))
+    index = ConversationIndex(store)
+    index.load()
+    assert index.paths() == [str(legacy)]
+    # the first append migrates the .json file to .jsonl and removes it
+    _save(store, index, "u", "s", [{"content": "a"}])
+    paths = index.paths(user_id="u")
+    assert paths == [store.path_for("u", "s")]
+    assert len(store.read_path(paths[0])["messages"]) == 2
+    assert index.get("u", "s")["message_count"] == 2
+    store.close()
+    index.close()
@@ -0,0 +1,58 @@
+# File: tests/test_docker_provider.py
+import pytest
+
+pytest.importorskip("autogen_core")
+pytest.importorskip("httpx")
+
+from providers import docker_provider
+from providers.docker_provider import DockerProvider
+from providers.usage import extract_usage
+
+
+class StubResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class StubClient:
+    def __init__(self, data):
+        self.data = data
+
+    async def post(self, url, **kwargs):
+        return StubResponse(self.data)
+
+
+def _provider(monkeypatch, data):
+    monkeypatch.setattr(docker_provider.http_clients, "client_for", lambda url: StubClient(data))
+    return DockerProvider(default_model="ai/llama3.2")
+
+
+async def test_create_returns_a_create_result_with_usage_and_timings(monkeypatch):
+    provider = _provider(monkeypatch, {
+        "choices": [{"message": {"content": " Done. "}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 12, "completion_tokens": 3},
+        "timings": {"prompt_ms": 40.0, "predicted_ms": 9.5, "cache_n": 8},
+    })
+    result = await provider.create([{"role": "user", "content": "hi"}])
+    assert result.content == "Done."
+    assert result.finish_reason == "stop"
+    assert (result.usage.prompt_tokens, result.usage.completion_tokens) == (12, 3)
+    counts = extract_usage(result)
+    assert counts["prompt_tokens"] == 12 and counts["cached_prompt_tokens"] == 8 and counts["prompt_ms"] == 40.0
+
+
+async def test_create_returns_tool_calls_as_function_calls(monkeypatch):
+    provider = _provider(monkeypatch, {
+        "choices": [{"message": {"content": None, "tool_calls": [
+            {"id": "call_1", "type": "function", "function": {"name": "search", "arguments": {"q": "x"}}},
+        ]}}],
+    })
+    result = await provider.create([{"role": "user", "content": "hi"}])
+    assert result.finish_reason == "function_calls"
+    assert [(c.id, c.name, c.arguments) for c in result.content] == [("call_1", "search", '{"q": "x"}')]
@@ -0,0 +1,27 @@
+# File: tests/test_executor_pool.py
+import os
+
+from executor_pool import ExecutorPool
+
+
+class StubExecutor:
+    def __init__(self, work_dir):
+        self.work_dir = work_dir
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+async def test_release_copies_the_work_dir_before_removing_it(tmp_path):
+    pool = ExecutorPool(size=0, root=str(tmp_path / "executors"), factory=StubExecutor)
+    executor = await pool.acquire()
+    with open(f"{executor.work_dir}/plot.png", "w") as f:
+        f.write("png")
+    logs_dir = tmp_path / "logs"
+    await pool.release(executor, save_to=str(logs_dir))
+    assert (logs_dir / "plot.png").read_text() == "png"
+    assert not os.path.exists(executor.work_dir)
+    assert pool.stats()["recycled"] == 1
@@ -0,0 +1,38 @@
+# File: tests/test_mcp_worker_pool.py
+import sys
+import asyncio
+
+import pytest
+
+from providers.mcp_worker_pool import MCPWorkerPool, MCPWorkerTimeout
+
+# answers pings inline and never finishes a tool call, like a worker whose threads are all stuck
+HUNG_WORKER = """
+import sys, json
+for line in sys.stdin:
+    request = json.loads(line)
+    if request["method"] == "ping":
+        sys.stdout.write(json.dumps({"id": request["id"], "result": "pong"}) + "\\n")
+        sys.stdout.flush()
+"""
+
+
+async def test_worker_with_every_thread_hung_is_restarted(tmp_path):
+    script = tmp_path / "worker.py"
+    script.write_text(HUNG_WORKER)
+    pool = MCPWorkerPool(
+        size=1, command=[sys.executable, str(script)], call_timeout=0.2,
+        health_interval=3600, worker_threads=2, max_timeouts=10,
+    )
+    await pool.start()
+    try:
+        for _ in range(2):
+            with pytest.raises(MCPWorkerTimeout):
+                await pool.call_tool("slow", {})
+        while pool._checks:
+            await asyncio.gather(*pool._checks)
+        stats = pool.stats()
+    finally:
+        await pool.stop()
+    assert stats["restarts"] == 1 and stats["hung_restarts"] == 1
+    assert stats["workers"][0]["abandoned"] == 0
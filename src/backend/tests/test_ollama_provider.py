@@ -0,0 +1,36 @@
+# File: tests/test_ollama_provider.py
+import pytest
+
+pytest.importorskip("autogen_ext.models.ollama")
+
+from providers.ollama_provider import OllamaProvider
+
+
+class StubClient:
+    """Takes exactly the keyword arguments of OllamaChatCompletionClient.create_stream."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def create_stream(self, messages, *, tools=(), tool_choice="auto", json_output=None, extra_create_args={}, cancellation_token=None):
+        self.calls.append({"tools": tools, "tool_choice": tool_choice, "extra_create_args": extra_create_args})
+        for chunk in ("Hel", "lo", "RESULT"):
+            yield chunk
+
+
+async def test_create_stream_sends_sampling_settings_as_ollama_options():
+    provider = OllamaProvider(model="llama3")
+    provider.client = StubClient()
+    chunks = [chunk async for chunk in provider.create_stream(["hi"], temperature=0.1)]
+    assert chunks == ["Hel", "lo", "RESULT"]
+    call = provider.client.calls[0]
+    assert call["extra_create_args"] == {"options": {"temperature": 0.1, "top_p": 0.8}}
+    assert call["tool_choice"] == "auto"
+
+
+async def test_create_stream_defaults_to_the_provider_temperature():
+    provider = OllamaProvider(model="llama3")
+    provider.client = StubClient()
+    [chunk async for chunk in provider.create_stream(["hi"], extra_create_args={"options": {"top_p": 0.5}})]
+    options = provider.client.calls[0]["extra_create_args"]["options"]
+    assert options == {"temperature": OllamaProvider.default_temperature, "top_p": 0.5}
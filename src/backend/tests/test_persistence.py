@@ -0,0 +1,58 @@
+# File: tests/test_persistence.py
+from persistence import PersistenceWriter
+
+
+class FlakyMongo:
+    incremental = True
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.appended = []
+
+    async def start_conversation(self, *args):
+        pass
+
+    async def append_messages(self, items):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("mongo down")
+        self.appended.extend(items)
+
+
+async def _save_all(writer, items):
+    await writer.start()
+    for user_id, session_id, message in items:
+        await writer.save_message(user_id, session_id, message)
+    await writer.queue.join()
+    writer._task.cancel()
+
+
+async def test_failed_write_is_retried_without_repeating_the_others(monkeypatch):
+    saved = []
+    monkeypatch.setattr(PersistenceWriter, "_write_messages", lambda self, items: saved.extend(items))
+    db = FlakyMongo(failures=2)
+    writer = PersistenceWriter(db=db, retries=3, retry_delay=0)
+    await _save_all(writer, [("u", "s", {"content": "a"}), ("u", "s", {"content": "b"})])
+    assert len(saved) == 2
+    assert len(db.appended) == 2
+    stats = writer.stats()
+    assert stats["failures"] == 2 and stats["dropped"] == 0
+
+
+async def test_items_are_counted_as_dropped_once_retries_run_out(monkeypatch):
+    monkeypatch.setattr(PersistenceWriter, "_write_messages", lambda self, items: None)
+    db = FlakyMongo(failures=10)
+    writer = PersistenceWriter(db=db, retries=1, retry_delay=0)
+    await _save_all(writer, [("u", "s", {"content": "a"})])
+    assert db.appended == []
+    assert writer.stats()["dropped"] == 1
+
+
+async def test_write_message_waits_for_the_file_and_keeps_the_header(monkeypatch):
+    saved = []
+    monkeypatch.setattr(PersistenceWriter, "_write_messages", lambda self, items: saved.extend(items))
+    writer = PersistenceWriter(db=None, retries=1, retry_delay=0)
+    await writer.start()
+    await writer.write_message("u", "s", {"content": "a"}, header={"team_id": "t"})
+    writer._task.cancel()
+    assert [item[3:5] for item in saved] == [({"content": "a"}, {"team_id": "t"})]
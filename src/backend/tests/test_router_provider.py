@@ -0,0 +1,61 @@
+# File: tests/test_router_provider.py
+import pytest
+
+from providers.router_provider import RouterProvider, model_family
+
+
+class StubClient:
+    def __init__(self, answer=None, error=None):
+        self.answer = answer
+        self.error = error
+        self.calls = 0
+
+    async def create(self, messages, **kwargs):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.answer
+
+    async def create_stream(self, messages, **kwargs):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        for chunk in self.answer:
+            yield chunk
+
+
+def _router(down, up, **kwargs):
+    router = RouterProvider(backends=[("docker", "ai/mistral"), ("OllamaProvider", "mistral:instruct")], **kwargs)
+    router._clients = {("docker", "ai/mistral"): down, ("OllamaProvider", "mistral:instruct"): up}
+    return router
+
+
+def test_model_family_ignores_namespace_and_tag():
+    assert model_family("ai/mistral") == model_family("mistral:instruct") == "mistral"
+
+
+async def test_failed_backend_fails_over_and_opens_its_circuit():
+    down, up = StubClient(error=ConnectionError("refused")), StubClient(answer="ok")
+    router = _router(down, up, breaker_failures=1, breaker_cooldown=3600)
+    client = router.get_client("mistral")
+    assert await client.create([]) == "ok"
+    assert router.metrics["failovers"] == 1
+    assert router.backends[0].state(router.breaker_cooldown) == "open"
+    # the open backend is skipped from now on
+    assert await client.create([]) == "ok"
+    assert down.calls == 1 and up.calls == 2
+
+
+async def test_request_errors_are_not_failed_over():
+    down, up = StubClient(error=ValueError("prompt too long")), StubClient(answer="ok")
+    router = _router(down, up)
+    with pytest.raises(ValueError):
+        await router.get_client("mistral").create([])
+    assert up.calls == 0 and router.backends[0].failures == 0
+
+
+async def test_stream_fails_over_before_the_first_chunk():
+    down, up = StubClient(error=TimeoutError()), StubClient(answer=["Hel", "lo"])
+    router = _router(down, up)
+    chunks = [chunk async for chunk in router.get_client("mistral").create_stream([])]
+    assert chunks == ["Hel", "lo"] and router.metrics["failovers"] == 1
@@ -0,0 +1,23 @@
+# File: tests/test_run_scheduler.py
+import asyncio
+
+from run_scheduler import RunScheduler
+
+
+async def test_cancel_before_first_step_releases_slots():
+    scheduler = RunScheduler(max_concurrent=1, max_per_user=1, provider_limits={})
+    started = []
+
+    async def run(name):
+        started.append(name)
+
+    scheduler.submit("a", "u", "p", lambda: run("a"))
+    # cancelled before the task had a chance to start
+    assert scheduler.cancel("a")
+    scheduler.submit("b", "u", "p", lambda: run("b"))
+    for _ in range(5):
+        await asyncio.sleep(0)
+    assert started == ["b"]
+    stats = scheduler.stats()
+    assert stats["running"] == 0 and stats["running_by_user"] == {}
+    assert stats["finished"] == 2 and stats["cancelled"] == 1
@@ -0,0 +1,62 @@
+# File: tests/test_single_flight.py
+import asyncio
+
+from providers.single_flight import SingleFlight
+
+
+async def test_concurrent_callers_share_one_call():
+    flights = SingleFlight()
+    calls = []
+    release = asyncio.Event()
+
+    async def request():
+        calls.append(1)
+        await release.wait()
+        return "plan"
+
+    callers = [asyncio.create_task(flights.do("key", request)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*callers)
+    assert len(calls) == 1
+    assert [shared for _, shared in results].count(False) == 1
+    assert all(result == "plan" for result, _ in results)
+    assert flights.stats() == {"leaders": 1, "coalesced": 4, "abandoned": 0, "in_flight": 0}
+
+
+async def test_cancelled_caller_leaves_the_others_waiting():
+    flights = SingleFlight()
+    release = asyncio.Event()
+
+    async def request():
+        await release.wait()
+        return "plan"
+
+    leader = asyncio.create_task(flights.do("key", request))
+    follower = asyncio.create_task(flights.do("key", request))
+    await asyncio.sleep(0)
+    leader.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    assert await follower == ("plan", True)
+    assert leader.cancelled() and flights.stats()["abandoned"] == 0
+
+
+async def test_request_is_cancelled_once_every_caller_gave_up():
+    flights = SingleFlight()
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def request():
+        started.set()
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    caller = asyncio.create_task(flights.do("key", request))
+    await started.wait()
+    caller.cancel()
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert flights.stats()["abandoned"] == 1
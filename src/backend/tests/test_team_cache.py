@@ -0,0 +1,38 @@
+# File: tests/test_team_cache.py
+from team_cache import TeamTemplateCache
+
+
+class Closeable:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+async def test_invalidated_template_closes_its_parts_once_released():
+    agents = [{"name": "mcp", "type": "Custom MCP"}]
+    cache = TeamTemplateCache()
+    template = await cache.acquire(agents, "ollama", "llama3")
+    client = await template.part(0, "model_client", Closeable)
+    adapters = await template.part(0, "mcp_adapters", lambda: [Closeable(), Closeable()])
+    await cache.invalidate_agents(agents)
+    # still in use by the running session
+    assert not client.closed
+    await cache.release(template)
+    assert client.closed and all(adapter.closed for adapter in adapters)
+    stats = cache.stats()
+    assert stats["templates"] == 0 and stats["closed"] == 1
+
+
+async def test_eviction_skips_templates_in_use_and_closes_the_others():
+    cache = TeamTemplateCache(max_entries=1)
+    held = await cache.acquire(["a"], None, None)
+    held_client = await held.part(0, "model_client", Closeable)
+    idle = await cache.acquire(["b"], None, None)
+    idle_client = await idle.part(0, "model_client", Closeable)
+    await cache.release(idle)
+    await cache.acquire(["c"], None, None)
+    assert idle_client.closed and not held_client.closed
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["in_use"] == 2
@@ -0,0 +1,42 @@
+# File: tests/test_usage.py
+from providers.usage import UsageAccountant, extract_usage
+
+
+class Store:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.items = []
+
+    async def record_usage(self, items):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("mongo down")
+        self.items.extend(items)
+
+
+def test_extract_usage_reads_openai_and_ollama_shapes():
+    assert extract_usage({"usage": {"prompt_tokens": 10, "completion_tokens": 4}}) == {"prompt_tokens": 10, "completion_tokens": 4}
+    assert extract_usage({"prompt_eval_count": 7, "eval_count": 3}) == {"prompt_tokens": 7, "completion_tokens": 3}
+    assert extract_usage("plain text") == {}
+
+
+def test_calls_are_charged_to_every_scope_and_the_agent():
+    accountant = UsageAccountant(enabled=True)
+    labels = {"session": "s1", "user": "u1", "team": "t1", "agent": "Coder"}
+    accountant.record("docker", "ai/llama3.2", result={"usage": {"prompt_tokens": 10, "completion_tokens": 4}}, seconds=0.5, labels=labels)
+    accountant.record("docker", "ai/llama3.2", cached=True, labels=labels)
+    session = accountant.session("s1")
+    assert (session["calls"], session["cached_calls"], session["prompt_tokens"]) == (2, 1, 10)
+    assert session["agents"]["Coder"]["completion_tokens"] == 4
+    assert accountant.report("user")["user"]["u1"]["calls"] == 2
+    assert accountant.report("agent")["agent"]["Coder"]["seconds"] == 0.5
+
+
+async def test_failed_flush_keeps_the_increments_for_the_next_one():
+    accountant = UsageAccountant(enabled=True)
+    accountant.db = Store(failures=1)
+    accountant.record("docker", "ai/llama3.2", result={"usage": {"prompt_tokens": 10, "completion_tokens": 4}}, labels={"session": "s1"})
+    assert await accountant.flush() == 0
+    assert await accountant.flush() == 4
+    sessions = [counters for group, counters in accountant.db.items if group["scope"] == "session"]
+    assert sessions[0]["prompt_tokens"] == 10 and accountant.stats()["flush_failures"] == 1
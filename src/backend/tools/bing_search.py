@@ -57,41 +57,49 @@ async def bing_search(
     if response_filter.lower() not in valid_filters:
         raise ValueError(f"Invalid response_filter value. Must be one of: {', '.join(valid_filters)}")
 
+    async def http_get(url: str, **kwargs) -> httpx.Response:
+        """GET through the backend's pooled web client, or a one-off client outside the backend"""
+        try:
+            from providers.http_pool import http_clients
+        except ImportError:
+            async with httpx.AsyncClient() as client:
+                return await client.get(url, **kwargs)
+        return await http_clients.web_client().get(url, **kwargs)
+
     async def fetch_page_content(url: str, max_length: Optional[int] = 50000) -> str:
         """Helper function to fetch and convert webpage content to markdown"""
         headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, headers=headers, timeout=10)
-                response.raise_for_status()
+            response = await http_get(url, headers=headers, timeout=10)
+            response.raise_for_status()
 
-                soup = BeautifulSoup(response.text, "html.parser")
+            soup = BeautifulSoup(response.text, "html.parser")
 
-                # Remove script and style elements
-                for script in soup(["script", "style"]):
-                    script.decompose()
+            # Remove script and style elements
+            for script in soup(["script", "style"]):
+                script.decompose()
 
-                # Convert relative URLs to absolute
-                for tag in soup.find_all(["a", "img"]):
-                    if tag.get("href"):
-                        tag["href"] = urljoin(url, tag["href"])
-                    if tag.get("src"):
-                        tag["src"] = urljoin(url, tag["src"])
+            # Convert relative URLs to absolute
+            for tag in soup.find_all(["a", "img"]):
+                if tag.get("href"):
+                    tag["href"] = urljoin(url, tag["href"])
+                if tag.get("src"):
+                    tag["src"] = urljoin(url, tag["src"])
 
-                h2t = html2text.HTML2Text()
-                h2t.body_width = 0
-                h2t.ignore_images = False
-                h2t.ignore_emphasis = False
-                h2t.ignore_links = False
-                h2t.ignore_tables = False
+            h2t = html2text.HTML2Text()
+            h2t.body_width = 0
+            h2t.ignore_images = False
+            h2t.ignore_emphasis = False
+            h2t.ignore_links = False
+            h2t.ignore_tables = False
 
-                markdown = h2t.handle(str(soup))
+            markdown = h2t.handle(str(soup))
 
-                if max_length and len(markdown) > max_length:
-                    markdown = markdown[:max_length] + "\n...(truncated)"
+            if max_length and len(markdown) > max_length:
+                markdown = markdown[:max_length] + "\n...(truncated)"
 
-                return markdown.strip()
+            return markdown.strip()
 
         except Exception as e:
             return f"Error fetching content: {str(e)}"
@@ -109,30 +117,30 @@ async def bing_search(
     }
 
     # Make the request
+    search_url = "https://api.bing.microsoft.com/v7.0/search"
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                "https://api.bing.microsoft.com/v7.0/search",
-                headers=headers,
-                params=params,
-                timeout=10,
+        response = await http_get(
+            search_url,
+            headers=headers,
+            params=params,
+            timeout=10,
+        )
+
+        # Handle common error cases
+        if response.status_code == 401:
+            raise ValueError("Authentication failed. Please verify your Bing Search API key.")
+        elif response.status_code == 403:
+            raise ValueError(
+                "Access forbidden. This could mean:\n"
+                "1. The API key is invalid\n"
+                "2. The API key has expired\n"
+                "3. You've exceeded your API quota"
             )
+        elif response.status_code == 429:
+            raise ValueError("API quota exceeded. Please try again later.")
 
-            # Handle common error cases
-            if response.status_code == 401:
-                raise ValueError("Authentication failed. Please verify your Bing Search API key.")
-            elif response.status_code == 403:
-                raise ValueError(
-                    "Access forbidden. This could mean:\n"
-                    "1. The API key is invalid\n"
-                    "2. The API key has expired\n"
-                    "3. You've exceeded your API quota"
-                )
-            elif response.status_code == 429:
-                raise ValueError("API quota exceeded. Please try again later.")
-
-            response.raise_for_status()
-            data = response.json()
+        response.raise_for_status()
+        data = response.json()
 
         # Process results based on response_filter
         results = []
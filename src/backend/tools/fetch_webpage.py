@@ -28,46 +28,54 @@ async def fetch_webpage(
     Raises:
         ValueError: If the URL is invalid or the page can't be fetched
     """
+    async def http_get(url: str, **kwargs) -> httpx.Response:
+        """GET through the backend's pooled web client, or a one-off client outside the backend"""
+        try:
+            from providers.http_pool import http_clients
+        except ImportError:
+            async with httpx.AsyncClient() as client:
+                return await client.get(url, **kwargs)
+        return await http_clients.web_client().get(url, **kwargs)
+
     # Use default headers if none provided
     if headers is None:
         headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
 
     try:
         # Fetch the webpage
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-
-            # Parse HTML
-            soup = BeautifulSoup(response.text, "html.parser")
-
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-
-            # Convert relative URLs to absolute
-            for tag in soup.find_all(["a", "img"]):
-                if tag.get("href"):
-                    tag["href"] = urljoin(url, tag["href"])
-                if tag.get("src"):
-                    tag["src"] = urljoin(url, tag["src"])
-
-            # Configure HTML to Markdown converter
-            h2t = html2text.HTML2Text()
-            h2t.body_width = 0  # No line wrapping
-            h2t.ignore_images = not include_images
-            h2t.ignore_emphasis = False
-            h2t.ignore_links = False
-            h2t.ignore_tables = False
-
-            # Convert to markdown
-            markdown = h2t.handle(str(soup))
-
-            # Trim if max_length is specified
-            if max_length and len(markdown) > max_length:
-                markdown = markdown[:max_length] + "\n...(truncated)"
-
-            return markdown.strip()
+        response = await http_get(url, headers=headers, timeout=10)
+        response.raise_for_status()
+
+        # Parse HTML
+        soup = BeautifulSoup(response.text, "html.parser")
+
+        # Remove script and style elements
+        for script in soup(["script", "style"]):
+            script.decompose()
+
+        # Convert relative URLs to absolute
+        for tag in soup.find_all(["a", "img"]):
+            if tag.get("href"):
+                tag["href"] = urljoin(url, tag["href"])
+            if tag.get("src"):
+                tag["src"] = urljoin(url, tag["src"])
+
+        # Configure HTML to Markdown converter
+        h2t = html2text.HTML2Text()
+        h2t.body_width = 0  # No line wrapping
+        h2t.ignore_images = not include_images
+        h2t.ignore_emphasis = False
+        h2t.ignore_links = False
+        h2t.ignore_tables = False
+
+        # Convert to markdown
+        markdown = h2t.handle(str(soup))
+
+        # Trim if max_length is specified
+        if max_length and len(markdown) > max_length:
+            markdown = markdown[:max_length] + "\n...(truncated)"
+
+        return markdown.strip()
 
     except httpx.RequestError as e:
         raise ValueError(f"Failed to fetch webpage: {str(e)}") from e
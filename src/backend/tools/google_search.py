@@ -47,41 +47,49 @@ async def google_search(
 
     num_results = min(max(1, num_results), 10)
 
+    async def http_get(url: str, **kwargs) -> httpx.Response:
+        """GET through the backend's pooled web client, or a one-off client outside the backend"""
+        try:
+            from providers.http_pool import http_clients
+        except ImportError:
+            async with httpx.AsyncClient() as client:
+                return await client.get(url, **kwargs)
+        return await http_clients.web_client().get(url, **kwargs)
+
     async def fetch_page_content(url: str, max_length: Optional[int] = 50000) -> str:
         """Helper function to fetch and convert webpage content to markdown"""
         headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, headers=headers, timeout=10)
-                response.raise_for_status()
+            response = await http_get(url, headers=headers, timeout=10)
+            response.raise_for_status()
 
-                soup = BeautifulSoup(response.text, "html.parser")
+            soup = BeautifulSoup(response.text, "html.parser")
 
-                # Remove script and style elements
-                for script in soup(["script", "style"]):
-                    script.decompose()
+            # Remove script and style elements
+            for script in soup(["script", "style"]):
+                script.decompose()
 
-                # Convert relative URLs to absolute
-                for tag in soup.find_all(["a", "img"]):
-                    if tag.get("href"):
-                        tag["href"] = urljoin(url, tag["href"])
-                    if tag.get("src"):
-                        tag["src"] = urljoin(url, tag["src"])
+            # Convert relative URLs to absolute
+            for tag in soup.find_all(["a", "img"]):
+                if tag.get("href"):
+                    tag["href"] = urljoin(url, tag["href"])
+                if tag.get("src"):
+                    tag["src"] = urljoin(url, tag["src"])
 
-                h2t = html2text.HTML2Text()
-                h2t.body_width = 0
-                h2t.ignore_images = False
-                h2t.ignore_emphasis = False
-                h2t.ignore_links = False
-                h2t.ignore_tables = False
+            h2t = html2text.HTML2Text()
+            h2t.body_width = 0
+            h2t.ignore_images = False
+            h2t.ignore_emphasis = False
+            h2t.ignore_links = False
+            h2t.ignore_tables = False
 
-                markdown = h2t.handle(str(soup))
+            markdown = h2t.handle(str(soup))
 
-                if max_length and len(markdown) > max_length:
-                    markdown = markdown[:max_length] + "\n...(truncated)"
+            if max_length and len(markdown) > max_length:
+                markdown = markdown[:max_length] + "\n...(truncated)"
 
-                return markdown.strip()
+            return markdown.strip()
 
         except Exception as e:
             return f"Error fetching content: {str(e)}"
@@ -98,25 +106,25 @@ async def google_search(
     if country:
         params["gl"] = country
 
+    search_url = "https://www.googleapis.com/customsearch/v1"
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get("https://www.googleapis.com/customsearch/v1", params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+        response = await http_get(search_url, params=params, timeout=10)
+        response.raise_for_status()
+        data = response.json()
 
-            results = []
-            if "items" in data:
-                for item in data["items"]:
-                    result = {"title": item.get("title", ""), "link": item.get("link", "")}
-                    if include_snippets:
-                        result["snippet"] = item.get("snippet", "")
+        results = []
+        if "items" in data:
+            for item in data["items"]:
+                result = {"title": item.get("title", ""), "link": item.get("link", "")}
+                if include_snippets:
+                    result["snippet"] = item.get("snippet", "")
 
-                    if include_content:
-                        result["content"] = await fetch_page_content(result["link"], max_length=content_max_length)
+                if include_content:
+                    result["content"] = await fetch_page_content(result["link"], max_length=content_max_length)
 
-                    results.append(result)
+                results.append(result)
 
-            return results
+        return results
 
     except httpx.RequestError as e:
         raise ValueError(f"Failed to perform search: {str(e)}") from e
@@ -53,6 +53,20 @@ console.log('BASE_URL:', BASE_URL);
 console.log('ALLWAYS_LOGGED_IN:', ALLWAYS_LOGGED_IN);
 // console.log('ACTIVATION_CODE:', ACTIVATION_CODE);
 
+// token counts of a message, or the usage totals of the session for the final TaskResult
+interface ModelsUsage {
+  prompt_tokens: number;
+  completion_tokens: number;
+  calls?: number;
+  cached_calls?: number;
+  errors?: number;
+  cached_prompt_tokens?: number;
+  seconds?: number;
+  prompt_ms?: number;
+  predicted_ms?: number;
+  agents?: Record<string, Omit<ModelsUsage, 'agents'>>;
+}
+
 interface ChatMessage {
   user: string;
   message: string;
@@ -61,10 +75,11 @@ interface ChatMessage {
   source?: string;
   content?: string;
   stop_reason?: string;
-  models_usage?: string;
+  models_usage?: ModelsUsage | null;
   content_image?: string;
   session_id?: string;
   elapsed_time?: number;
+  partial?: boolean;
 }
 
 export default function App() {
@@ -172,7 +187,8 @@ export default function App() {
       const response = await axios.post(`${BASE_URL}/start`, { 
         content: userMessage, 
         user_id: userInfo.email, // Use directly from context
-        agents: JSON.stringify(selectedAgents)
+        agents: JSON.stringify(selectedAgents),
+        team_id: selectedTeam?.team_id // usage is accounted per team
       });
       const sessionId = response.data.response;  // Get the session ID from the response
       setSessionID(sessionId);
@@ -180,6 +196,17 @@ export default function App() {
       eventSource.onmessage = (event) => {
         // console.log('EventSource message:', event.data);
         const data = JSON.parse(event.data);
+        if (data.partial) {
+          // token delta: grow the in-progress message of this agent
+          setChatHistory((prev) => {
+            const last = prev[prev.length - 1];
+            if (last && last.partial && last.source === data.source) {
+              return [...prev.slice(0, -1), { ...last, message: last.message + data.content }];
+            }
+            return [...prev, { user: data.source, source: data.source, message: data.content, session_id: data.session_id, partial: true }];
+          });
+          return;
+        }
         if (data.stop_reason) {
           setIsTyping(false);
           // Measure elapsed time and set sessionTime (assumes sessionTime state exists)
@@ -187,7 +214,8 @@ export default function App() {
           const minutes = Math.floor(elapsedTime / 60000);
           const seconds = Math.floor((elapsedTime % 60000) / 1000);
           setSessionTime(`${minutes}:${seconds < 10 ? '0' : ''}${seconds}`);
-          // eventSource.close();
+          // the run is over; otherwise the browser would reconnect when the server ends the stream
+          eventSource.close();
         }
 
 
@@ -204,13 +232,16 @@ export default function App() {
           elapsed_time: data.elapsed_time,
         };
   
-        setChatHistory((prev) => [...prev, aiMessage]);
+        // the complete message replaces the deltas streamed for it
+        setChatHistory((prev) => [...prev.filter((m) => !m.partial), aiMessage]);
       };
   
       eventSource.onerror = (error) => {
-        setIsTyping(false);
         console.error('EventSource error:', error);
-        eventSource.close();
+        // while CONNECTING the browser retries with Last-Event-ID and the server resumes the stream
+        if (eventSource.readyState === EventSource.CLOSED) {
+          setIsTyping(false);
+        }
       };
     } catch (error) {
       console.error('Chat error:', error);
@@ -469,7 +500,7 @@ export default function App() {
                               <MarkdownRenderer markdownText={message.message} />
                               {/* Display image if available */}
                               {message.content_image && (
-                                <img src={`${message.content_image}`} alt="content" className="mt-2 max-w-[625px]" />
+                                <img src={message.content_image.startsWith("/blobs/") ? `${BASE_URL}${message.content_image}` : message.content_image} alt="content" className="mt-2 max-w-[625px]" />
                               )}
                               {/* <MarkdownRenderer>{message.message}</MarkdownRenderer> */}
                               <p className="text-xs text-muted-foreground">{message.time && new Date(message.time).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit', second: '2-digit',hour12: false })}</p>